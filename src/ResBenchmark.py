@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import multiprocessing
+import tempfile
+import argparse
+import json
+import subprocess
+import hashlib
+try:
+    import resource
+except ImportError:
+    # resource is not available on Windows, the peak RSS is not reported there
+    resource = None
+
+import ResCleaner
+from ResCleaner import RClassName
+
+valueTypes = ('dimen', 'string', 'color', 'style', 'array', 'bool', 'integer')
+fileTypes = ('drawable', 'layout', 'anim', 'animator')
+allTypes = valueTypes + fileTypes
+
+
+# Write a file, create the parent folder if necessary
+def writeFile(fileFullPath, content):
+    parent = os.path.dirname(fileFullPath)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    fp = open(fileFullPath, 'w')
+    fp.write(content)
+    fp.close()
+
+
+# Generate a synthetic Eclipse project full of references, return the res folder and the src folder
+def generateRefProject(projectDir, xmlCount, javaCount, refsPerFile, seed=0):
+    rand = random.Random(seed)
+    resPath = os.path.join(projectDir, 'res')
+    srcPath = os.path.join(projectDir, 'src')
+    writeFile(os.path.join(projectDir, 'AndroidManifest.xml'), '<manifest/>\n')
+    names = ['res_%d' % i for i in range(1000)]
+    for i in range(xmlCount):
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<LinearLayout xmlns:android="http://schemas.android.com/apk/res/android"']
+        for _ in range(refsPerFile):
+            resType = rand.choice(allTypes)
+            lines.append('    android:attr_%d="@%s/%s"' % (rand.randint(0, 99), resType, rand.choice(names)))
+        lines.append('    android:orientation="vertical">')
+        lines.append('    <TextView android:text="plain text without references" />')
+        lines.append('    <item>@android:%s/%s</item>' % (rand.choice(allTypes), rand.choice(names)))
+        lines.append('</LinearLayout>')
+        writeFile(os.path.join(resPath, 'layout', 'layout_%d.xml' % i), '\n'.join(lines) + '\n')
+    for i in range(javaCount):
+        lines = ['package com.example;', '', 'public class Class%d {' % i, '    void run() {']
+        for _ in range(refsPerFile):
+            choice = rand.randint(0, 3)
+            first = '%s.%s.%s' % (RClassName, rand.choice(allTypes), rand.choice(names))
+            second = '%s.%s.%s' % (RClassName, rand.choice(allTypes), rand.choice(names))
+            if choice == 0:
+                lines.append('        setValue(%s);' % first)
+            elif choice == 1:
+                lines.append('        int id = flag ? %s : %s;' % (first, second))
+            elif choice == 2:
+                lines.append('        int[] ids = new int[]{%s, %s};' % (first, second))
+            else:
+                lines.append('        call(%s,%s);' % (first, second))
+        lines.append('        String text = "no references here";')
+        lines.append('    }')
+        lines.append('}')
+        writeFile(os.path.join(srcPath, 'com', 'example', 'Class%d.java' % i), '\n'.join(lines) + '\n')
+    return resPath, srcPath
+
+
+# The old implementation of ResCleaner.getUsedRes(), which compiles the patterns for every type and every file.
+# It is kept here as the reference of the results and the speed.
+def getUsedResPerType(resPathList, srcPathList, resTypes):
+    resDic = {resType: [] for resType in resTypes}
+    for resPath in resPathList:
+        for (parent, _, fileNames) in os.walk(resPath):
+            for fileName in fileNames:
+                if not fileName.endswith('.xml'):
+                    continue
+                fp = open(os.path.join(parent, fileName), 'r')
+                fileContent = fp.read()
+                fp.close()
+                for resType in resTypes:
+                    resUsedList = resDic[resType]
+                    regex = re.compile(r'"@([\w.]+:)?%s/(\S+)"|>@([\w.]+:)?%s/(\S+)<' % (resType, resType))
+                    for findItem in regex.findall(fileContent):
+                        if findItem[1] != '':
+                            resUsedList.append(findItem[1])
+                        if findItem[3] != '':
+                            resUsedList.append(findItem[3])
+    for srcPath in srcPathList:
+        for (parent, _, fileNames) in os.walk(srcPath):
+            for fileName in fileNames:
+                if not fileName.endswith('.java'):
+                    continue
+                fp = open(os.path.join(parent, fileName), 'r')
+                fileContent = fp.read()
+                fp.close()
+                for resType in resTypes:
+                    resUsedList = resDic[resType]
+                    regex = re.compile(r'[(+,=.?:]\s*%s\.%s\.(\S+?)\s*[+),;:]' % (RClassName, resType))
+                    for findItem in regex.findall(fileContent):
+                        if findItem != '':
+                            resUsedList.append(findItem)
+                    regex = re.compile(r'\?\s*%s\.%s\.\S+\s*:\s*%s\.%s\.(\S+?)\s*[+),;:]'
+                                       % (RClassName, resType, RClassName, resType))
+                    for findItem in regex.findall(fileContent):
+                        if findItem != '':
+                            resUsedList.append(findItem)
+                    regex = re.compile(r'new\s+int\s*\[\s*\]\s*\{(.+)\}')
+                    for findItem in regex.findall(fileContent):
+                        for arrayItem in findItem.split(','):
+                            arrayRegex = re.compile(r'%s\.%s\.(\S+)' % (RClassName, resType))
+                            for arrayFindItem in arrayRegex.findall(arrayItem):
+                                if arrayFindItem != '':
+                                    resUsedList.append(arrayFindItem)
+    return resDic
+
+
+# Get the names of the used resources found by ResCleaner.getUsedRes(), as a set of names for every type
+def getUsedNames(inventory, usedResDict):
+    symbolTable = inventory['symbols']
+    return dict([(resType, set([ResCleaner.getSymbolName(symbolTable, symbolId) for symbolId in idSet]))
+                 for (resType, idSet) in usedResDict.items()])
+
+
+# Run the function several times and return the best time
+def timeIt(func, repeat):
+    bestTime = None
+    result = None
+    for _ in range(repeat):
+        startTime = time.time()
+        result = func()
+        usedTime = time.time() - startTime
+        if bestTime is None or usedTime < bestTime:
+            bestTime = usedTime
+    return bestTime, result
+
+
+def benchmarkUsedRes(xmlCount, javaCount, refsPerFile, repeat):
+    projectDir = tempfile.mkdtemp(prefix='ResBenchmark')
+    try:
+        resPath, srcPath = generateRefProject(projectDir, xmlCount, javaCount, refsPerFile)
+        (oldTime, oldResult) = timeIt(lambda: getUsedResPerType([resPath], [srcPath], allTypes), repeat)
+        inventory = ResCleaner.buildInventory([resPath], [srcPath])
+        (newTime, newResult) = timeIt(lambda: ResCleaner.getUsedRes(inventory, allTypes), repeat)
+        # getUsedRes() only keeps the distinct names. The java lexer finds every reference of the old patterns,
+        # without the '}' of the array initializers they took into the name, and also the references they missed,
+        # e.g. in a ternary expression of two types.
+        newNames = getUsedNames(inventory, newResult)
+        missedCount = 0
+        for (resType, refs) in oldResult.items():
+            oldNames = set([resName.rstrip('}') for resName in refs])
+            if not oldNames <= newNames.get(resType, set()):
+                raise RuntimeError('the combined scanner missed references found by the per-type scanner')
+            missedCount += len(newNames.get(resType, set()) - oldNames)
+        refCount = sum([len(refs) for refs in oldResult.values()])
+        print 'getUsedRes: %d xml files, %d java files, %d references' % (xmlCount, javaCount, refCount)
+        print '  per-type scanner: %.3fs' % oldTime
+        print '  combined scanner: %.3fs, %d names missed by the per-type scanner' % (newTime, missedCount)
+        print '  speedup: %.1fx' % (oldTime / newTime)
+    finally:
+        shutil.rmtree(projectDir)
+
+
+def benchmarkWorkers(xmlCount, javaCount, refsPerFile, repeat, workerCounts):
+    projectDir = tempfile.mkdtemp(prefix='ResBenchmark')
+    try:
+        resPath, srcPath = generateRefProject(projectDir, xmlCount, javaCount, refsPerFile)
+        inventory = ResCleaner.buildInventory([resPath], [srcPath])
+        (serialTime, serialResult) = timeIt(lambda: ResCleaner.getUsedRes(inventory, allTypes), repeat)
+        print 'getUsedRes with worker processes:'
+        print '  serial: %.3fs' % serialTime
+        for workers in workerCounts:
+            (usedTime, result) = timeIt(lambda: ResCleaner.getUsedRes(inventory, allTypes, workers), repeat)
+            if result != serialResult:
+                raise RuntimeError('the parallel scan found different references from the serial scan')
+            print '  %d workers: %.3fs, speedup %.1fx' % (workers, usedTime, serialTime / usedTime)
+    finally:
+        shutil.rmtree(projectDir)
+
+
+# Scan the used resources of a project in this process, the files of at least minSize bytes are memory mapped.
+# Print the best time, the peak RSS and a digest of the result as json, for benchmarkMemoryMap().
+def runScanPath(resPath, srcPath, minSize, repeat):
+    ResCleaner.MemoryMapMinSize = minSize
+    inventory = ResCleaner.buildInventory([resPath], [srcPath])
+    (usedTime, result) = timeIt(lambda: ResCleaner.getUsedRes(inventory, allTypes), repeat)
+    usedNames = dict([(resType, sorted(names)) for (resType, names) in getUsedNames(inventory, result).items()])
+    digest = hashlib.sha1(json.dumps(usedNames, sort_keys=True)).hexdigest()
+    print json.dumps({'seconds': usedTime, 'peakRssKB': getPeakRss(), 'digest': digest})
+
+
+# Compare scanning big files read into strings with scanning them memory mapped
+def benchmarkMemoryMap(fileCount, refsPerFile, repeat):
+    projectDir = tempfile.mkdtemp(prefix='ResBenchmark')
+    try:
+        resPath, srcPath = generateRefProject(projectDir, fileCount, fileCount, refsPerFile)
+        totalSize = 0
+        for folder in (resPath, srcPath):
+            for (parent, _, fileNames) in os.walk(folder):
+                totalSize += sum([os.path.getsize(os.path.join(parent, fileName)) for fileName in fileNames])
+        print 'getUsedRes: %d xml files, %d java files, %.1f MB' % (fileCount, fileCount, totalSize / 1048576.0)
+        digests = set()
+        # every path runs in a new process, so the peak RSS of one path doesn't hide the peak RSS of the other
+        for (name, minSize) in (('read', sys.maxint), ('mmap', 0)):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), 'scanpath', resPath, srcPath,
+                                              '--min-size', str(minSize), '--repeat', str(repeat)])
+            result = json.loads(output.strip().splitlines()[-1])
+            digests.add(result['digest'])
+            peakRss = '-' if result['peakRssKB'] is None else '%d KB' % result['peakRssKB']
+            print '  %s: %.3fs, peak RSS %s' % (name, result['seconds'], peakRss)
+        if len(digests) != 1:
+            raise RuntimeError('the memory mapped scan found different references from the read scan')
+    finally:
+        shutil.rmtree(projectDir)
+
+
+# Generate a synthetic Android project. unusedRatio of every kind of resources is not referenced anywhere,
+# the others are referenced from the java files and the layouts. Return the number of unused resources.
+def generateAndroidProject(projectDir, isEclipse, layouts, drawables, values, locales, javaFiles, unusedRatio,
+                           seed=0):
+    rand = random.Random(seed)
+    if isEclipse:
+        resPath = os.path.join(projectDir, 'res')
+        srcPath = os.path.join(projectDir, 'src')
+        writeFile(os.path.join(projectDir, 'AndroidManifest.xml'), '<manifest package="com.example"/>\n')
+    else:
+        resPath = os.path.join(projectDir, 'src', 'main', 'res')
+        srcPath = os.path.join(projectDir, 'src', 'main', 'java')
+        writeFile(os.path.join(projectDir, 'build.gradle'), "apply plugin: 'com.android.application'\n")
+        writeFile(os.path.join(projectDir, 'src', 'main', 'AndroidManifest.xml'), '<manifest package="com.example"/>\n')
+    # every kind of resources, split into the used and the unused names
+    kinds = {
+        'layout': ['layout_%d' % i for i in range(layouts)],
+        'drawable': ['ic_%d' % i for i in range(drawables)],
+        'string': ['str_%d' % i for i in range(values)],
+        'dimen': ['dim_%d' % i for i in range(values / 4)],
+        'color': ['col_%d' % i for i in range(values / 4)],
+    }
+    usedKinds = {}
+    unusedCount = 0
+    for (resType, names) in kinds.items():
+        shuffled = list(names)
+        rand.shuffle(shuffled)
+        usedCount = len(names) - int(len(names) * unusedRatio)
+        usedKinds[resType] = shuffled[:usedCount]
+        unusedCount += len(names) - usedCount
+
+    for name in kinds['drawable']:
+        for folder in ('drawable-hdpi', 'drawable-xhdpi'):
+            writeFile(os.path.join(resPath, folder, name + '.png'), '\x89PNG' + '\0' * 64)
+    for locale in [''] + ['-l%d' % i for i in range(locales)]:
+        lines = ['<?xml version="1.0" encoding="utf-8"?>', '<resources>']
+        for name in kinds['string']:
+            lines.append('    <string name="%s">Text of %s%s</string>' % (name, name, locale))
+        lines.append('</resources>')
+        writeFile(os.path.join(resPath, 'values' + locale, 'strings.xml'), '\n'.join(lines) + '\n')
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', '<resources>']
+    lines.extend(['    <dimen name="%s">%ddp</dimen>' % (name, i) for (i, name) in enumerate(kinds['dimen'])])
+    lines.extend(['    <color name="%s">#ff%06x</color>' % (name, i) for (i, name) in enumerate(kinds['color'])])
+    lines.append('</resources>')
+    writeFile(os.path.join(resPath, 'values', 'dimens.xml'), '\n'.join(lines) + '\n')
+
+    for name in kinds['layout']:
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<LinearLayout xmlns:android="http://schemas.android.com/apk/res/android"',
+                 '    android:layout_width="match_parent"', '    android:layout_height="match_parent">']
+        for _ in range(5):
+            for resType in ('string', 'drawable', 'color', 'dimen'):
+                if len(usedKinds[resType]) != 0:
+                    lines.append('    <TextView android:attr="@%s/%s" />' % (resType, rand.choice(usedKinds[resType])))
+        lines.append('</LinearLayout>')
+        writeFile(os.path.join(resPath, 'layout', name + '.xml'), '\n'.join(lines) + '\n')
+
+    # every used resource is referenced once from a java file, the java files without references are plain code
+    javaLines = [[] for _ in range(max(javaFiles, 1))]
+    for (resType, names) in usedKinds.items():
+        for name in names:
+            javaLines[rand.randint(0, len(javaLines) - 1)].append(
+                '        use(%s.%s.%s);' % (RClassName, resType, name))
+    for (i, refLines) in enumerate(javaLines[:javaFiles]):
+        lines = ['package com.example;', '', 'public class Class%d {' % i, '    void run() {']
+        lines.extend(refLines)
+        lines.extend(['        int value%d = compute(%d, "text");' % (j, j) for j in range(20)])
+        lines.extend(['    }', '}'])
+        writeFile(os.path.join(srcPath, 'com', 'example', 'Class%d.java' % i), '\n'.join(lines) + '\n')
+    return unusedCount
+
+
+# Get the peak RSS of this process in KB, or None if it is not available
+def getPeakRss():
+    if resource is None:
+        return None
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on Mac OS X, and in KB on Linux
+    if sys.platform == 'darwin':
+        peakRss /= 1024
+    return peakRss
+
+
+# Run the phases of ResCleaner.process() one by one on the project, and time every phase.
+# Return the list of phase results and the number of unused resources found.
+def runPhases(projectDir, workers):
+    isEclipse = ResCleaner.isEclipseProject(projectDir)
+    resPathList = ResCleaner.getResPathList(isEclipse, projectDir)
+    srcPathList = ResCleaner.getSrcPathList(isEclipse, projectDir)
+    manifestPathList = ResCleaner.getManifestPathList(isEclipse, projectDir)
+    phases = []
+    state = {}
+
+    def runPhase(name, func):
+        startTime = time.time()
+        fileCount = func()
+        usedTime = time.time() - startTime
+        filesPerSec = None
+        if fileCount is not None and usedTime > 0:
+            filesPerSec = fileCount / usedTime
+        phases.append({'name': name, 'seconds': usedTime, 'files': fileCount, 'filesPerSec': filesPerSec,
+                       'peakRssKB': getPeakRss()})
+
+    def inventoryPhase():
+        state['inventory'] = ResCleaner.buildInventory(resPathList, srcPathList, manifestPathList)
+        return len(state['inventory']['res']) + len(state['inventory']['src'])
+
+    def declarationPhase():
+        inventory = state['inventory']
+        state['values'] = ResCleaner.getConfiguredValueRes(inventory, ResCleaner.ValueTypes, workers)
+        ResCleaner.mergeArrayRes(state['values'])
+        state['files'] = ResCleaner.getConfiguredFileRes(inventory, ResCleaner.FileTypes)
+        valueFiles = [entry for entry in inventory['res'] if 'declarations' in entry]
+        typedFiles = [entry for entry in inventory['res'] if entry['folderType'] in ResCleaner.FileTypes]
+        return len(valueFiles) + len(typedFiles)
+
+    def usagePhase():
+        inventory = state['inventory']
+        state['used'] = ResCleaner.getUsedRes(inventory, ResCleaner.AllTypes, workers, isDeepSearch=True)
+        xmlFiles = [entry for entry in inventory['res'] if entry['fileName'].endswith('.xml')]
+        javaFiles = [entry for entry in inventory['src'] if entry['fileName'].endswith('.java')]
+        return len(xmlFiles) + len(javaFiles)
+
+    def diffPhase():
+        state['unusedValues'] = ResCleaner.getUnusedRes(state['values'], state['used'])
+        state['unusedFiles'] = ResCleaner.getUnusedRes(state['files'], state['used'])
+        return None
+
+    def removalPhase():
+        inventory = state['inventory']
+        ResCleaner.openWriteBack(os.path.join(projectDir, '.AndroidResCleaner.staging'))
+        try:
+            ResCleaner.removeUnusedValueRes(inventory, state['unusedValues'], 0, workers)
+            ResCleaner.removeUnusedFileRes(inventory, state['unusedFiles'])
+            ResCleaner.commitWriteBack()
+        finally:
+            ResCleaner.closeWriteBack()
+        valueFiles = [entry for entry in inventory['res'] if 'declarations' in entry]
+        typedFiles = [entry for entry in inventory['res'] if entry['folderType'] in ResCleaner.FileTypes]
+        return len(valueFiles) + len(typedFiles)
+
+    runPhase('inventory', inventoryPhase)
+    runPhase('declarations', declarationPhase)
+    runPhase('usage', usagePhase)
+    runPhase('diff', diffPhase)
+    runPhase('removal', removalPhase)
+    unusedCount = 0
+    for unusedDict in (state['unusedValues'], state['unusedFiles']):
+        unusedCount += sum([len(unusedList) for unusedList in unusedDict.values()])
+    return phases, unusedCount
+
+
+# Get the current commit of the repository, or None if it is not a git repository
+def getCommit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.STDOUT)
+        return output.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmarkPhases(args):
+    params = {'eclipse': args.eclipse, 'layouts': args.layouts, 'drawables': args.drawables, 'values': args.values,
+              'locales': args.locales, 'javaFiles': args.java, 'unusedRatio': args.unused, 'workers': args.workers}
+    tempDir = tempfile.mkdtemp(prefix='ResBenchmark')
+    try:
+        sourceDir = os.path.join(tempDir, 'source')
+        expectedUnused = generateAndroidProject(sourceDir, args.eclipse, args.layouts, args.drawables, args.values,
+                                                args.locales, args.java, args.unused)
+        bestPhases = None
+        for index in range(args.repeat):
+            # removal changes the project, so every run works on a fresh copy
+            projectDir = os.path.join(tempDir, 'run%d' % index)
+            shutil.copytree(sourceDir, projectDir)
+            (phases, unusedCount) = runPhases(projectDir, args.workers)
+            if unusedCount != expectedUnused:
+                raise RuntimeError('found %d unused resources, %d expected' % (unusedCount, expectedUnused))
+            if bestPhases is None:
+                bestPhases = phases
+            else:
+                for (bestPhase, phase) in zip(bestPhases, phases):
+                    if phase['seconds'] < bestPhase['seconds']:
+                        bestPhase.update(phase)
+    finally:
+        shutil.rmtree(tempDir)
+    record = {'commit': getCommit(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'params': params,
+              'unused': expectedUnused, 'phases': bestPhases}
+    print 'commit %s, %s' % (record['commit'], ', '.join(['%s=%s' % item for item in sorted(params.items())]))
+    for phase in bestPhases:
+        filesPerSec = '-' if phase['filesPerSec'] is None else '%.0f' % phase['filesPerSec']
+        peakRss = '-' if phase['peakRssKB'] is None else '%d' % phase['peakRssKB']
+        print '  %-14s %8.3fs %8s files %10s files/s %10s KB peak RSS' % (
+            phase['name'], phase['seconds'], phase['files'] if phase['files'] is not None else '-', filesPerSec,
+            peakRss)
+    if args.output is not None:
+        # one json record per line, so the results of different commits can be compared
+        fp = open(args.output, 'a')
+        fp.write(json.dumps(record, sort_keys=True) + '\n')
+        fp.close()
+
+
+# Compare two records of a result file, by default the last two
+def comparePhases(args):
+    fp = open(args.file, 'r')
+    records = [json.loads(line) for line in fp if line.strip() != '']
+    fp.close()
+    baseRecord = records[args.base]
+    headRecord = records[args.head]
+    if baseRecord['params'] != headRecord['params']:
+        print 'warning: the records were run with different parameters'
+    print 'base %s (%s) -> head %s (%s)' % (baseRecord['commit'], baseRecord['date'],
+                                          headRecord['commit'], headRecord['date'])
+    basePhases = dict([(phase['name'], phase) for phase in baseRecord['phases']])
+    for headPhase in headRecord['phases']:
+        basePhase = basePhases.get(headPhase['name'])
+        if basePhase is None:
+            print '  %-14s %8s -> %8.3fs' % (headPhase['name'], '-', headPhase['seconds'])
+            continue
+        change = ''
+        if basePhase['seconds'] > 0:
+            change = '%+.1f%%' % ((headPhase['seconds'] - basePhase['seconds']) * 100 / basePhase['seconds'])
+        print '  %-14s %8.3fs -> %8.3fs %8s' % (headPhase['name'], basePhase['seconds'], headPhase['seconds'], change)
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description='Benchmarks of AndroidResCleaner')
+    subParsers = argParser.add_subparsers(dest='command')
+    phasesParser = subParsers.add_parser('phases', help='time every phase on a synthetic project')
+    phasesParser.add_argument('--eclipse', action='store_true', help='generate an Eclipse project')
+    phasesParser.add_argument('--layouts', type=int, default=500)
+    phasesParser.add_argument('--drawables', type=int, default=500)
+    phasesParser.add_argument('--values', type=int, default=2000, help='the number of strings')
+    phasesParser.add_argument('--locales', type=int, default=10)
+    phasesParser.add_argument('--java', type=int, default=1000, help='the number of java files')
+    phasesParser.add_argument('--unused', type=float, default=0.2, help='the ratio of unused resources')
+    phasesParser.add_argument('--workers', type=int, default=1)
+    phasesParser.add_argument('--repeat', type=int, default=3)
+    phasesParser.add_argument('--output', help='append the result to this file as a json line')
+    compareParser = subParsers.add_parser('compare', help='compare two results of the phases benchmark')
+    compareParser.add_argument('file')
+    compareParser.add_argument('--base', type=int, default=-2, help='the index of the base record')
+    compareParser.add_argument('--head', type=int, default=-1, help='the index of the head record')
+    scannerParser = subParsers.add_parser('scanner', help='compare the combined scanner with the per-type scanner')
+    scannerParser.add_argument('--xml', type=int, default=3000)
+    scannerParser.add_argument('--java', type=int, default=8000)
+    workersParser = subParsers.add_parser('workers', help='compare the serial scan with the worker processes')
+    workersParser.add_argument('--xml', type=int, default=3000)
+    workersParser.add_argument('--java', type=int, default=8000)
+    mmapParser = subParsers.add_parser('mmap', help='compare reading big files with memory mapping them')
+    mmapParser.add_argument('--files', type=int, default=40, help='the number of xml files and of java files')
+    mmapParser.add_argument('--refs', type=int, default=10000, help='the number of references in every file')
+    mmapParser.add_argument('--repeat', type=int, default=3)
+    scanPathParser = subParsers.add_parser('scanpath', help='used by the mmap benchmark, scan in a new process')
+    scanPathParser.add_argument('res')
+    scanPathParser.add_argument('src')
+    scanPathParser.add_argument('--min-size', type=int, required=True)
+    scanPathParser.add_argument('--repeat', type=int, default=3)
+    cmdArgs = argParser.parse_args()
+    if cmdArgs.command == 'phases':
+        benchmarkPhases(cmdArgs)
+    elif cmdArgs.command == 'compare':
+        comparePhases(cmdArgs)
+    elif cmdArgs.command == 'scanner':
+        benchmarkUsedRes(cmdArgs.xml, cmdArgs.java, 10, 3)
+    elif cmdArgs.command == 'workers':
+        cpuCount = multiprocessing.cpu_count()
+        benchmarkWorkers(cmdArgs.xml, cmdArgs.java, 10, 3, sorted(set([2, cpuCount])))
+    elif cmdArgs.command == 'mmap':
+        benchmarkMemoryMap(cmdArgs.files, cmdArgs.refs, cmdArgs.repeat)
+    elif cmdArgs.command == 'scanpath':
+        runScanPath(cmdArgs.res, cmdArgs.src, cmdArgs.min_size, cmdArgs.repeat)
@@ -4,12 +4,51 @@
 import os
 import ConfigParser
 import xml.dom.minidom
+import xml.parsers.expat
+import xml.sax.saxutils
 import codecs
 import re
+import multiprocessing
+import hashlib
+import json
 from exceptions import RuntimeError
 import time
+import stat
+import bisect
+import itertools
+import cProfile
+import pstats
+import StringIO
+import argparse
+import SocketServer
+import threading
+import subprocess
+import tempfile
+import shutil
+import sys
+import mmap
+import tarfile
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on Windows, the backups are hard links or copies there
+    fcntl = None
+try:
+    from os import scandir
+except ImportError:
+    # scandir is only in the standard library since python 3.5, use the backport if it is installed
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 RClassName = 'NewR'
+# The supported resource types. Value resources are declared in values xml files, file resources are files.
+ValueTypes = ('dimen', 'string', 'color', 'style', 'array', 'bool', 'integer', 'string-array', 'integer-array')
+FileTypes = ('drawable', 'layout', 'anim', 'animator')
+# string-array and integer-array are referenced as array
+AllTypes = tuple(set(ValueTypes + FileTypes) - {'string-array', 'integer-array'})
+
 # Check whether the drawable file name is valid
 def isValidDrawableFileName(fileName):
     # The extension of drawable file must be png, xml or jpg.
@@ -73,6 +112,13 @@ def getConfigParser():
         return parser
 
 
+# Get an optional option from the config, return the default value if the option is not set
+def getConfigOption(configParser, section, option, default):
+    if configParser.has_option(section, option):
+        return configParser.get(section, option)
+    return default
+
+
 # Check whether the project is an Eclipse project
 def isEclipseProject(projectDir):
     manifestFile = os.path.join(projectDir, 'AndroidManifest.xml')
@@ -86,7 +132,7 @@ def isAndroidStudioProject(projectDir):
     if os.path.exists(manifestFile):
         return False
     else:
-        return os.path.exists(gradleFile)
+        return os.path.exists(gradleFile) or os.path.exists(gradleFile + '.kts')
 
 
 # Get the resource folder path
@@ -197,495 +243,3094 @@ def getSrcPathList(isEclipse, projectDir):
             return srcPath
 
 
-# Get all configured resources in resources folder
-def getConfiguredValueRes(resPathList, resTypes):
-    resDic = {resType: [] for resType in resTypes}
-    for resPath in resPathList:
-        # Iterate through all the files in resources folder.
-        for (parent, _, fileNames) in os.walk(resPath):
-            for fileName in fileNames:
-                # If the file is not an xml file
-                if not fileName.endswith('.xml'):
-                    continue
-                # Parse the xml
-                fileFullPath = os.path.join(parent, fileName)
-                dom = xml.dom.minidom.parse(fileFullPath)
-                root = dom.documentElement
-                # Iterate through all resource types. Find the type nodes in the file.
-                for resType in resTypes:
-                    resTypedList = resDic[resType]
-                    items = root.getElementsByTagName(resType)
-                    for item in items:
-                        itemName = item.getAttribute('name')
-                        if itemName is not None and itemName != '':
-                            resTypedList.append(itemName)
-                    #  Find the item nodes in the file.
-                    itemItems = root.getElementsByTagName('item')
-                    for item in itemItems:
-                        # record the name if the type equals with the resource type
-                        if item.getAttribute('type') == resType:
-                            itemName = item.getAttribute('name')
-                            if itemName is not None and itemName != '':
-                                resTypedList.append(itemName)
-    return resDic
+# The log file and the report file are written line by line while the script runs, so the lines are not kept in
+# memory, and the lines written before the script dies are not lost.
+# The report has a json record on every line, to be read by other tools.
+outputStreams = {'log': None, 'report': None}
 
 
-def getConfiguredFileRes(resPathList, resTypes):
-    resDic = {resType: [] for resType in resTypes}
-    for resType in resTypes:
-        resFolders = []
-        for resPath in resPathList:
-            (_, folders, _) = os.walk(resPath).next()
-            for folder in folders:
-                if folder == resType or folder.startswith(resType + '-'):
-                    resFolders.append(os.path.join(resPath, folder))
-        # Iterate through all folders
-        resNameList = resDic[resType]
-        for folder in resFolders:
-            # Iterate through all files in the folder
-            (_, _, fileNames) = os.walk(folder).next()
-            for fileName in fileNames:
-                # Check whether the file name is valid
-                if resType == 'drawable':
-                    if not isValidDrawableFileName(fileName):
-                        continue
-                else:
-                    if not isValidResFileName(fileName):
-                        continue
-                # remove file extension
-                dotPos = fileName.find('.')
-                fileName = fileName[0:dotPos]
-                # add the file name to the list
-                resNameList.append(fileName)
-    return resDic
+# Open the log file, the lines of this run are appended to the old log
+def openLog(logFile):
+    # log file exists and not empty, open file with append mode
+    if os.path.exists(logFile) and os.path.getsize(logFile) != 0:
+        logFp = open(logFile, 'a', 1)
+        logFp.write('\n')   # 追加模式下需要一个额外的换行，和上方的log分隔开
+    # log file does not exist or empty, open file with write mode
+    else:
+        logFp = open(logFile, 'w', 1)
+    outputStreams['log'] = logFp
 
 
-def getUsedRes(resPathList, srcPathList, resTypes):
-    resDic = {resType: [] for resType in resTypes}
-    # Iterate through all resource folders
-    for resPath in resPathList:
-        for (parent, _, fileNames) in os.walk(resPath):
-            for fileName in fileNames:
-                # Ignore non xml file
-                if not fileName.endswith('.xml'):
-                    continue
-                # Parser xml file
-                fileFullPath = os.path.join(parent, fileName)
-                fp = open(fileFullPath, 'r')
-                fileContent = fp.read()
-                fp.close()
-                for resType in resTypes:
-                    resUsedList = resDic[resType]
-                    regex = re.compile(r'"@([\w.]+:)?%s/(\S+)"|>@([\w.]+:)?%s/(\S+)<' % (resType, resType))
-                    findResults = regex.findall(fileContent)
-                    for findItem in findResults:
-                        if findItem[1] != '':
-                            resUsedList.append(findItem[1])
-                        if findItem[3] != '':
-                            resUsedList.append(findItem[3])
-
-    # Iterate through all source code folders
-    for srcPath in srcPathList:
-        for (parent, _, fileNames) in os.walk(srcPath):
-            for fileName in fileNames:
-                # Ignore non java code
-                if not fileName.endswith('.java'):
-                    continue
-                # read java code to find used resource
-                fileFullPath = os.path.join(parent, fileName)
-                fp = open(fileFullPath, 'r')
-                fileContent = fp.read()
-                fp.close()
-                for resType in resTypes:
-                    resUsedList = resDic[resType]
-                    # 匹配代码中对资源的引用
-                    # 前面是+,=.?:中的任意一个，中间是R类名.资源类型.资源名，后面以+),;:结尾
-                    # 将R类名和类型带入以及去掉空格等约束后得到：[(+,=.?:]R.layout.(\S+?)[+),;:]
-                    regex = re.compile(r'[(+,=.?:]\s*%s\.%s\.(\S+?)\s*[+),;:]' % (RClassName, resType))
-                    findResults = regex.findall(fileContent)
-                    for findItem in findResults:
-                        if findItem != '':
-                            resUsedList.append(findItem)
-                    # 解决问号表达式的匹配问题，在做r'[(+,=.?:]\s*R\.%s\.(\S+?)\s*[+),;:]' % resType的匹配的时候，
-                    # 如果恰好问号表达式前后都是同一个资源类型，则只能匹配到第一个，这是因为第一个匹配的时候会用掉
-                    # 问号表达式中的 : ，这导致第二个匹配的时候无法匹配成功，这里需要重新对第二个资源进行匹配
-                    # 例如：int layoutId = haveImage ? R.layout.layout_with_image : R.layout.layout_no_image;
-                    # 将R类名和类型带入以及去掉空格等约束后得到：? R.layout.\S+ : R.layout.(\S+?)[+),;:]
-                    regex = re.compile(r'\?\s*%s\.%s\.\S+\s*:\s*%s\.%s\.(\S+?)\s*[+),;:]' % (RClassName, resType, RClassName, resType))
-                    findResults = regex.findall(fileContent)
-                    for findItem in findResults:
-                        if findItem != '':
-                            resUsedList.append(findItem)
-                    # 对数组的匹配，例如：new int[]{R.drawable.indicator1, R.drawable.indicator2}
-                    # 先将所有的new int[]{}形式的数组中的内容匹配出来，然后按照逗号分割，最后再匹配资源
-                    # 去掉空格等约束和转义后得到：new int[] {(.+)}
-                    regex = re.compile(r'new\s+int\s*\[\s*\]\s*\{(.+)\}')
-                    findResults = regex.findall(fileContent)
-                    for findItem in findResults:
-                        itemList = findItem.split(',')
-                        for arrayItem in itemList:
-                            # 用来匹配R.xx.xxx的xxx，正则很简单，就不解释了
-                            arrayRegex = re.compile(r'%s\.%s\.(\S+)' % (RClassName, resType))
-                            arrayFindResults = arrayRegex.findall(arrayItem)
-                            for arrayFindItem in arrayFindResults:
-                                if arrayFindItem != '':
-                                    resUsedList.append(arrayFindItem)
-    return resDic
+# Open the report file, the report of the last run is replaced
+def openReport(reportFile):
+    outputStreams['report'] = open(reportFile, 'w', 1)
 
 
-def addUnsedToLog(unusedList):
-    for (resType, resList) in unusedList.items():
-        logContent.append('unused %s :' % resType)
-        for item in resList:
-            logContent.append('  ' + item)
+# Close the log file and the report file
+def closeOutputs():
+    for (name, fp) in outputStreams.items():
+        if fp is not None:
+            fp.close()
+            outputStreams[name] = None
 
 
-def getReadableTime():
-    curTime = time.localtime()
-    year = curTime[0]
-    month = curTime[1]
-    day = curTime[2]
-    hour = curTime[3]
-    minute = curTime[4]
-    second = curTime[5]
-    readableTime = '%d-%d-%d %d:%d:%d' % (year, month, day, hour, minute, second)
-    return readableTime
+# Write a line to the log
+def addLog(line):
+    logFp = outputStreams['log']
+    if logFp is not None:
+        logFp.write(line + '\n')
 
 
-def removeUnusedValueRes(resPathList, unusedDict):
-    # Iterate through all resource folders
-    for resPath in resPathList:
-        for (parent, _, fileNames) in os.walk(resPath):
-            for fileName in fileNames:
-                # Ignore non xml file
-                if not fileName.endswith('.xml'):
-                    continue
-                isChanged = False
-                # Parser xml file
-                fileFullPath = os.path.join(parent, fileName)
-                dom = xml.dom.minidom.parse(fileFullPath)
-                root = dom.documentElement
-                for (unusedType, unusedList) in unusedDict.items():
-                    # Find all nodes in xml with specific types
-                    dimenItems = root.getElementsByTagName(unusedType)
-                    for item in dimenItems:
-                        itemName = item.getAttribute('name')
-                        if itemName is not None and itemName in unusedList:
-                            root.removeChild(item)
-                            if not isChanged:
-                                logContent.append('processing file ' + fileFullPath[len(resPath)+1:])
-                                isChanged = True
-                            logContent.append(' remove item ' + itemName)
-                    # Find all item nodes in xml
-                    itemItems = root.getElementsByTagName('item')
-                    for item in itemItems:
-                        # record the name if the type equals with the resource type
-                        if item.getAttribute('type') == unusedType:
-                            itemName = item.getAttribute('name')
-                            if itemName is not None and itemName in unusedList:
-                                root.removeChild(item)
-                                if not isChanged:
-                                    logContent.append('processing file ' + fileFullPath[len(resPath)+1:])
-                                    isChanged = True
-                                logContent.append(' remove item ' + itemName)
-                # If the file is changed, we should save it.
-                if isChanged:
-                    # Three steps:
-                    # 1. save the changed xml to a temp file
-                    # 2. format the temp file
-                    # 3. rename the temp file to orginal file
-                    tempFile = fileFullPath + 'temp'
-                    destFile = codecs.open(tempFile, 'w', 'utf-8')
-                    dom.writexml(destFile, encoding='utf-8')
-                    destFile.close()
-                    dom.unlink()
-                    replaceNewline(fileFullPath, tempFile)
-                    os.remove(fileFullPath)
-                    os.rename(tempFile, fileFullPath)
-                    logContent.append(' save file')
-                else:
-                    dom.unlink()
-                # If the file is empty, remove the file
-                if isEmptyXML(fileFullPath):
-                    os.remove(fileFullPath)
-                    logContent.append(fileFullPath[len(resPath)+1:] + ' is empty and has been removed')
+# Write a record to the report. The kind of the record, such as unused, removed or error, is in its record field.
+def addReport(record, **fields):
+    reportFp = outputStreams['report']
+    if reportFp is not None:
+        fields['record'] = record
+        reportFp.write(json.dumps(fields, sort_keys=True) + '\n')
 
 
-def removeUnusedFileRes(resPathList, unusedDict):
-    for (unusedType, unusedList) in unusedDict.items():
-        typedFolders = []
-        for resPath in resPathList:
-            (_, folders, _) = os.walk(resPath).next()
-            # find all folders that matched the type
-            for folder in folders:
-                if folder == unusedType or folder.startswith(unusedType + '-'):
-                    typedFolders.append(folder)
-            # Iterate through all folders
-            for folder in typedFolders:
-                # Iterate through all files in the folder
-                (parent, _, fileNames) = os.walk(os.path.join(resPath, folder)).next()
-                for fileName in fileNames:
-                    # Check whether the file name is valid
-                    if unusedType == 'drawable':
-                        isValidFile = isValidDrawableFileName(fileName)
-                    else:
-                        isValidFile = isValidResFileName(fileName)
+# The metrics of the current run: the wall time and the counters of every phase, and the work done for every
+# res/src root and every resource folder. The counters of the files scanned by worker processes are added here
+# by the main process.
+MetricNames = ('files', 'bytes', 'matches', 'xmlParses', 'skipped', 'seconds')
+runMetrics = {'phases': [], 'roots': {}, 'current': None}
 
-                    if not isValidFile:
-                            os.remove(os.path.join(parent, fileName))
-                            logContent.append(fileName + ' is invalid ' + unusedType + ', and has been removed')
-                            continue
-                    # Remove the file extension
-                    dotPos = fileName.find('.')
-                    striptFileName = fileName[0:dotPos]
-                    # Remove if the file is unused
-                    if striptFileName in unusedList:
-                        os.remove(os.path.join(parent, fileName))
-                        logContent.append(fileName + ' is unused drawable, and has been removed')
 
+# Create a new set of counters
+def newMetrics():
+    metrics = dict.fromkeys(MetricNames, 0)
+    metrics['seconds'] = 0.0
+    return metrics
 
-# minidom have three problems after removeChild and writexml
-# 1. the file encoding statement and the first item are at the same line
-# 2. the file newline would be \n, no matter what the original file newline is
-# 3. the position at the remove node would retain an empty line
-# this function is used to solve the three problems
-def replaceNewline(srcFile, destFile):
-    if os.path.exists(srcFile) and os.path.exists(destFile):
-        srcfp = open(srcFile, 'rU')
-        srcLines = srcfp.readlines()
-        srcNewl = srcfp.newlines
-        srcfp.close()
 
-        destfp = open(destFile, 'rU')
-        destLines = destfp.readlines()
-        destNewl = destfp.newlines
-        destfp.close()
-        # split the first line at ?> to two lines，or remove the encoding part if the original file haven't this
-        if len(destLines) != 0:
-            line0 = destLines[0]
-            index = line0.find('?>')
-            if index != -1 and index != len(line0) - 2:
-                assert len(srcLines) != 0
-                if srcLines[0].strip().startswith('<?xml version'):
-                    destLines[0] = line0[:index+2] + destNewl
-                    destLines.insert(1, line0[index+2:])
-                else:
-                    destLines[0] = line0[index+2:]
-        srcLineCount = len(srcLines)
-        destLineCount = len(destLines)
-        removedLines = []
-        if srcLineCount == destLineCount:
-            for index in range(srcLineCount):
-                srcLine = srcLines[index].strip()
-                destLine = destLines[index].strip()
-                if destLine == "" and srcLine != "":
-                    removedLines.append(index)
-        elif srcLineCount > destLineCount:
-            srcIndex = 0
-            destIndex = 0
-            while True:
-                if srcIndex >= srcLineCount or destIndex >= destLineCount:
-                    break
-                srcLine = srcLines[srcIndex].strip()
-                destLine = destLines[destIndex].strip()
-                # line equals, continue to next line
-                if srcLine == destLine:
-                    srcIndex += 1
-                    destIndex += 1
-                    continue
-                # If the lines are not equal, check whether the dest line is empty,
-                # if so, this is an empty line in dest file, caused by removeChild
-                if destLine != "":
-                    # get the names from the line at both files, then check whether the names are equal
-                    # If names equal, the lines are the same.
-                    # Because minidom has a bug, if an item has more than one properties,
-                    # the sequence of properties would rearranged when saving
-                    regex = re.compile('\s+name\s*=\s*"(\w+)"')
-                    srcSearch = regex.search(srcLine)
-                    destSearch = regex.search(destLine)
-                    if srcSearch is not None and destSearch is not None:
-                        srcName = srcSearch.group()[0]
-                        destName = destSearch.group()[0]
-                        if srcName == destName:
-                            srcIndex += 1
-                            destIndex += 1
-                            continue
-                    # names are not equals, raise exception
-                    raise RuntimeError('destination file have unexpected differences with the original file')
-                # find the first not empty line in the dest file after the current line
-                for endEmptyLine in range(destIndex, destLineCount):
-                    if destLines[endEmptyLine].strip() != "":
-                        break
-                # the no empty line number must be greate than the current dest line number
-                if endEmptyLine == destIndex:
-                    raise RuntimeError('this should not be happened')
-                if endEmptyLine == destLineCount - 1 and destLines[endEmptyLine].strip() == "":
-                    raise RuntimeError('this should not be happened')
-
-                # get the line number in original file that equals the line in the next not empty line of dest file
-                thisDestLine = destLines[endEmptyLine]
-                for nextEqualLine in range(srcIndex, srcLineCount):
-                    if srcLines[nextEqualLine] == thisDestLine:
-                        break
-                # the next equal line number must greate than the current line number
-                if nextEqualLine == srcIndex:
-                    raise RuntimeError('this should not be happened')
-                # the next equal line number must less than the original file line count
-                if nextEqualLine == srcLineCount - 1 and srcLines[nextEqualLine].strip() != thisDestLine:
-                    raise RuntimeError('this should not be happened')
-                # find the empty line in the original file and record the count
-                srcEmptyCount = 0
-                for tempLine in srcLines[nextEqualLine-1:srcIndex-1:-1]:
-                    if tempLine.strip() != "":
-                        break
-                    srcEmptyCount += 1
+# Clear the metrics, before a new run
+def resetMetrics():
+    runMetrics['phases'] = []
+    runMetrics['roots'] = {}
+    runMetrics['current'] = None
 
-                # record the line that should be removed
-                for tempLineNum in range(destIndex, endEmptyLine - srcEmptyCount):
-                    removedLines.append(tempLineNum)
 
-                destIndex = endEmptyLine
-                srcIndex = nextEqualLine
-        else:
-            raise RuntimeError('destination file have more lines than the original file')
+# Start a new phase, the file counters are added to it until the phase ends
+def beginPhase(name):
+    phase = newMetrics()
+    phase['name'] = name
+    phase['startTime'] = time.time()
+    runMetrics['phases'].append(phase)
+    runMetrics['current'] = phase
 
-        for lineNum in removedLines[::-1]:
-            del destLines[lineNum]
 
-        if srcNewl is not None and destNewl is not None and srcNewl != destNewl:
-            for lineStr in destLines:
-                lineStr = lineStr.rstrip(destNewl) + srcNewl
+# End the current phase and record its wall time
+def endPhase():
+    phase = runMetrics['current']
+    if phase is None:
+        return
+    phase['seconds'] = time.time() - phase.pop('startTime')
+    runMetrics['current'] = None
+    addReport('phase', **phase)
 
-        destfp = open(destFile, 'w')
-        destfp.writelines(destLines)
-        destfp.close()
 
+# Add the work done on a file of the inventory to the current phase, its root and its resource folder.
+# seconds is the time used on the file, it is only added to the root and the folder,
+# the time of the phase is its wall time.
+# skipped is 1 if the file is not scanned by the patterns, because the literal prefilter found no reference in it.
+def addFileMetrics(entry, seconds, bytesRead=None, matches=0, xmlParses=0, skipped=0):
+    if bytesRead is None:
+        bytesRead = entry['size']
+    fileMetrics = {'files': 1, 'bytes': bytesRead, 'matches': matches, 'xmlParses': xmlParses, 'skipped': skipped,
+                   'seconds': seconds}
+    rootMetrics = runMetrics['roots'].get(entry['root'])
+    if rootMetrics is None:
+        rootMetrics = newMetrics()
+        rootMetrics['folders'] = {}
+        runMetrics['roots'][entry['root']] = rootMetrics
+    targets = [rootMetrics]
+    # The source code roots have no resource folders
+    folder = entry.get('folder')
+    if folder is not None:
+        folderMetrics = rootMetrics['folders'].get(folder)
+        if folderMetrics is None:
+            folderMetrics = newMetrics()
+            rootMetrics['folders'][folder] = folderMetrics
+        targets.append(folderMetrics)
+    for metrics in targets:
+        for name in MetricNames:
+            metrics[name] += fileMetrics[name]
+    phase = runMetrics['current']
+    if phase is not None:
+        for name in ('files', 'bytes', 'matches', 'xmlParses', 'skipped'):
+            phase[name] += fileMetrics[name]
 
-def isEmptyXML(xmlFileName):
-    fp = open(xmlFileName, 'r')
-    isEmpty = True
-    for fileLine in fp:
-        stripedLine = fileLine.strip()
-        if stripedLine != "" \
-                and not stripedLine.startswith('<?xml version')\
-                and not stripedLine.startswith('<resources')\
-                and not stripedLine.startswith('</resources>')\
-                and not stripedLine.startswith('<!--'):
-            isEmpty = False
-            break
-    return isEmpty
 
+# Add counters to the current phase only, for the work which is not done on a file of a root,
+# such as listing the folders
+def addPhaseMetrics(**counters):
+    phase = runMetrics['current']
+    if phase is None:
+        return
+    for (name, value) in counters.items():
+        phase[name] += value
 
-def process():
-    configParser = getConfigParser()
+
+# Format a set of counters for the log
+def formatMetrics(metrics):
+    return '%.3fs, %d files, %d bytes, %d matches, %d xml parses, %d skipped' % (
+        metrics['seconds'], metrics['files'], metrics['bytes'], metrics['matches'], metrics['xmlParses'],
+        metrics['skipped'])
+
+
+# Append the metrics to the log. Only the slowest resource folders are listed, all of them are in the metrics file.
+def addMetricsToLog(folderCount=10):
+    addLog('metrics:')
+    for phase in runMetrics['phases']:
+        addLog('  phase %s: %s' % (phase['name'], formatMetrics(phase)))
+    folderList = []
+    for (root, rootMetrics) in sorted(runMetrics['roots'].items()):
+        addLog('  root %s: %s' % (root, formatMetrics(rootMetrics)))
+        for (folder, folderMetrics) in rootMetrics['folders'].items():
+            folderList.append((folderMetrics['seconds'], os.path.join(root, folder), folderMetrics))
+    folderList.sort(reverse=True)
+    for (_, folderPath, folderMetrics) in folderList[:folderCount]:
+        addLog('  folder %s: %s' % (folderPath, formatMetrics(folderMetrics)))
+
+
+# Save the metrics to a json file, one json document for every run
+def saveMetrics(metricsFile):
+    metrics = {'time': getReadableTime(), 'phases': runMetrics['phases'], 'roots': runMetrics['roots']}
+    fp = open(metricsFile, 'w')
+    try:
+        fp.write(json.dumps(metrics, indent=2, sort_keys=True))
+    finally:
+        fp.close()
+
+
+# Start the profiler if it is enabled in the config, return None if it is not enabled
+def startProfiler(configParser):
     if configParser is None:
-        return
-    # Get the configurations
-    projectDir = configParser.get('Dir', 'ProjectDir')
-    isRemove = configParser.get('AndroidClean', 'RemoveUnused')
-    isBackup = configParser.get('AndroidClean', 'Backup')
-    if isRemove.lower() == 'true':
-        isRemove = True
+        return None
+    if getConfigOption(configParser, 'Performance', 'Profile', 'false').lower() != 'true':
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+# Stop the profiler, save the stats to the profile file and append the slowest functions to the log.
+# The worker processes are not profiled.
+def stopProfiler(profiler, profileFile, functionCount=20):
+    profiler.disable()
+    if profileFile != '':
+        profiler.dump_stats(profileFile)
+    stream = StringIO.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(functionCount)
+    addLog('profile:')
+    for line in stream.getvalue().splitlines():
+        if line.strip() != '':
+            addLog('  ' + line.rstrip())
+
+
+# Get the AndroidManifest.xml files of the project, the resources referenced by them are always used
+def getManifestPathList(isEclipse, projectDir):
+    if isEclipse:
+        manifestFile = os.path.join(projectDir, 'AndroidManifest.xml')
     else:
-        isRemove = False
-    if isBackup.lower() == 'true':
-        isBackup = True
+        manifestFile = os.path.join(projectDir, 'src' + os.path.sep + 'main' + os.path.sep + 'AndroidManifest.xml')
+    if os.path.exists(manifestFile):
+        return [manifestFile]
+    return []
+
+
+# Get the entries of a folder as (name, full path, is folder, is link, size, mtime).
+# scandir() gets the file type from the folder listing itself, which saves a lot of calls on network file systems.
+# An entry which cannot be stat'ed, e.g. a dangling symlink, is skipped.
+def listFolderEntries(folder):
+    entries = []
+    if scandir is not None:
+        for dirEntry in scandir(folder):
+            isFolder = dirEntry.is_dir()
+            if isFolder:
+                entries.append((dirEntry.name, dirEntry.path, True, dirEntry.is_symlink(), 0, 0))
+                continue
+            try:
+                fileStat = dirEntry.stat()
+            except OSError as e:
+                addLog('skip %s, it cannot be read: %s' % (dirEntry.path, e.strerror))
+                continue
+            entries.append((dirEntry.name, dirEntry.path, False, False, fileStat.st_size, fileStat.st_mtime))
     else:
-        isBackup = False
+        for name in os.listdir(folder):
+            fullPath = os.path.join(folder, name)
+            try:
+                fileStat = os.stat(fullPath)
+            except OSError as e:
+                addLog('skip %s, it cannot be read: %s' % (fullPath, e.strerror))
+                continue
+            if stat.S_ISDIR(fileStat.st_mode):
+                entries.append((name, fullPath, True, os.path.islink(fullPath), 0, 0))
+            else:
+                entries.append((name, fullPath, False, False, fileStat.st_size, fileStat.st_mtime))
+    return entries
 
-    # project dir is not exist, raise exception
-    if not os.path.exists(projectDir):
-        raise RuntimeError('Invalid project directory')
-    # Check whether the project is Eclipse or Android Studio
-    isEclipse = isEclipseProject(projectDir)
-    isAndroidStudio = isAndroidStudioProject(projectDir)
-    # not Eclipse project，and not Android Studio project, raise exception
-    if not isEclipse and not isAndroidStudio:
-        raise RuntimeError('Unknown project type')
 
-    # get the resource folder and source code folder in the project
-    resPathList = getResPathList(isEclipse, projectDir)
-    srcPathList = getSrcPathList(isEclipse, projectDir)
-    for resPath in resPathList:
-        if not os.path.exists(resPath):
-            raise RuntimeError('Cannot find resPath ' + resPath)
-    for srcPath in srcPathList:
-        if not os.path.exists(srcPath):
-            raise RuntimeError('Cannot find src path ' + srcPath)
+# Walk through a folder and append an entry for every file to the list, in the same order as os.walk.
+# Like os.walk, the linked folders are not followed. The skipped folders are other roots, which are walked by
+# themselves, so their files are only in the inventory once.
+def walkFolder(folder, entryList, root, relFolder, skippedFolders=()):
+    subFolders = []
+    for (name, fullPath, isFolder, isLink, size, mtime) in listFolderEntries(folder):
+        if isFolder:
+            if not isLink and fullPath not in skippedFolders:
+                subFolders.append((name, fullPath))
+            continue
+        entryList.append({'path': fullPath, 'root': root, 'relPath': os.path.join(relFolder, name),
+                          'fileName': name, 'size': size, 'mtime': mtime})
+    for (name, fullPath) in subFolders:
+        walkFolder(fullPath, entryList, root, os.path.join(relFolder, name), skippedFolders)
+
+
+# Get the other roots inside a root, as paths under the root, so walking the root can skip them.
+# realRoots has the real path of every root, a root may be linked into another one.
+def getNestedRoots(root, realRoots):
+    realRoot = realRoots[root]
+    nestedRoots = set()
+    for realOther in realRoots.values():
+        if realOther.startswith(realRoot + os.path.sep):
+            nestedRoots.add(root + realOther[len(realRoot):])
+    return nestedRoots
+
+
+# Classify a file in the resource folder. The folder is the first level folder under res, such as drawable-hdpi,
+# its type is drawable and its qualifier is hdpi. The name is the resource name if the file name is valid.
+def classifyResEntry(entry):
+    relParts = entry['relPath'].split(os.path.sep)
+    fileName = entry['fileName']
+    dotPos = fileName.find('.')
+    if dotPos == -1:
+        entry['name'] = fileName
+        entry['ext'] = ''
+    else:
+        entry['name'] = fileName[0:dotPos]
+        entry['ext'] = fileName[dotPos:]
+    if len(relParts) == 1:
+        # files in the res folder itself don't belong to any resource folder
+        entry['folder'] = ''
+        entry['folderType'] = ''
+        entry['qualifier'] = ''
+    else:
+        folder = relParts[0]
+        dashPos = folder.find('-')
+        entry['folder'] = folder
+        entry['folderType'] = folder if dashPos == -1 else folder[0:dashPos]
+        entry['qualifier'] = '' if dashPos == -1 else folder[dashPos + 1:]
+    # Only the files directly in the resource folders are resources
+    entry['isResFile'] = len(relParts) == 2
+    if entry['folderType'] == 'drawable':
+        entry['isValid'] = isValidDrawableFileName(fileName)
+    else:
+        entry['isValid'] = isValidResFileName(fileName)
+
+
+# Create an empty symbol table. The symbol table interns the (type, name) pair of every resource into a small
+# integer id, so the declared, used and unused resources are kept as sets of ids.
+# Every distinct name is stored only once, no matter how many times it is declared or referenced.
+def newSymbolTable():
+    return {'ids': {}, 'symbols': []}
 
-    logContent.append('Project dir: ' + projectDir)
+
+# Get the id of a resource, a new id is assigned if the resource is not in the symbol table yet
+def internSymbol(symbolTable, resType, name):
+    key = (resType, name)
+    symbolId = symbolTable['ids'].get(key)
+    if symbolId is None:
+        symbolId = len(symbolTable['symbols'])
+        symbolTable['ids'][key] = symbolId
+        symbolTable['symbols'].append(key)
+    return symbolId
+
+
+# Get the id of a resource, return None if the resource is not in the symbol table
+def findSymbol(symbolTable, resType, name):
+    return symbolTable['ids'].get((resType, name))
+
+
+# Get the name of a resource by its id
+def getSymbolName(symbolTable, symbolId):
+    return symbolTable['symbols'][symbolId][1]
+
+
+# Walk through the resource folders and the source code folders once, and classify every file.
+# All phases use this inventory instead of walking the folders again. The inventory also keeps the symbol table
+# of the resources found by the phases.
+def buildInventory(resPathList, srcPathList, manifestPathList=()):
+    inventory = {'res': [], 'src': [], 'manifest': [], 'symbols': newSymbolTable()}
+    for manifestFile in manifestPathList:
+        fileStat = os.stat(manifestFile)
+        fileName = os.path.basename(manifestFile)
+        inventory['manifest'].append({'path': manifestFile, 'root': os.path.dirname(manifestFile),
+                                      'relPath': fileName, 'fileName': fileName, 'size': fileStat.st_size,
+                                      'mtime': fileStat.st_mtime})
+    realRoots = dict([(root, os.path.realpath(root)) for root in list(resPathList) + list(srcPathList)])
     for resPath in resPathList:
-        logContent.append('res dir: ' + resPath)
+        entryList = []
+        walkFolder(resPath, entryList, resPath, '', getNestedRoots(resPath, realRoots))
+        for entry in entryList:
+            classifyResEntry(entry)
+        inventory['res'].extend(entryList)
     for srcPath in srcPathList:
-        logContent.append('src dir: ' + srcPath)
+        walkFolder(srcPath, inventory['src'], srcPath, '', getNestedRoots(srcPath, realRoots))
+    # the files of the inventory are listed, not read, so the bytes are their sizes
+    entries = inventory['res'] + inventory['src'] + inventory['manifest']
+    addPhaseMetrics(files=len(entries), bytes=sum([entry['size'] for entry in entries]))
+    return inventory
 
-    # get configed resource
-    valueTypes = ('dimen', 'string', 'color', 'style', 'array', 'bool', 'integer', 'string-array', 'integer-array')
-    fileTypes = ('drawable', 'layout', 'anim', 'animator')
-    configuredValueRes = getConfiguredValueRes(resPathList, valueTypes)
-    configuredFileRes = getConfiguredFileRes(resPathList, fileTypes)
 
-    # merge integer-array list and string-array list with array list
-    configuredValueRes['array'] = configuredValueRes['array'] + configuredValueRes['string-array'] + configuredValueRes['integer-array']
-    del configuredValueRes['string-array']
-    del configuredValueRes['integer-array']
+# Get the resource files of a type of resource folder from the inventory, such as all files in drawable-* folders
+def getTypedResEntries(inventory, folderType):
+    return [entry for entry in inventory['res'] if entry['isResFile'] and entry['folderType'] == folderType]
 
-    # get use resource
-    allTypes = tuple(set(valueTypes + fileTypes) - {'string-array', 'integer-array'})
-    usedResDict = getUsedRes(resPathList, srcPathList, allTypes)
 
-    # get unused resources
-    unusedValueResDict = {}
-    for (resType, typeList) in configuredValueRes.items():
-        unusedValueResDict[resType] = list(set(typeList) - set(usedResDict[resType]))
-    unusedFileResDict = {}
-    for (resType, typeList) in configuredFileRes.items():
-        unusedFileResDict[resType] = list(set(typeList) - set(usedResDict[resType]))
+# Get the resources declared in a values xml file, as a list of (type, name, start, end).
+# start and end are the byte offsets of the declaration element in the file, which are used to remove it.
+# Only the direct children of <resources> are declarations. The file is parsed by expat as a stream,
+# so the memory used doesn't grow with the size of the file. If the content of the file is prefetched, it is parsed
+# from the content instead.
+def parseValueDeclarations(fileFullPath, resTypes, content=None):
+    declarations = []
+    # python 2 closures cannot rebind outer variables, so the state is kept in a list:
+    # the depth, the root name, the start offset of the current declaration,
+    # and the declaration whose end offset is not known yet
+    state = [0, None, None, None]
 
-    # append the unused resources to log
-    addUnsedToLog(unusedValueResDict)
-    addUnsedToLog(unusedFileResDict)
+    # expat reports the offset of the current event. A declaration ends where the next event starts,
+    # the next event is always there, at least the end of <resources>
+    def closePending():
+        if state[3] is not None:
+            state[3][3] = parser.CurrentByteIndex
+            state[3] = None
 
-    # remove unused resources in the project
-    if isRemove:
-        tempDict = {}
-        for (unusedType, unusedList) in unusedValueResDict.items():
-            if len(unusedList) != 0:
-                tempDict[unusedType] = unusedList
-        if len(tempDict) != 0:
-            removeUnusedValueRes(resPathList, unusedValueResDict)
-
-        tempDict.clear()
-        for (unusedType, unusedList) in unusedFileResDict.items():
-            if len(unusedList) != 0:
-                tempDict[unusedType] = unusedList
-        if len(tempDict) != 0:
-            removeUnusedFileRes(resPathList, unusedFileResDict)
-
-
-def saveToLog():
-    logFile = 'AndroidResCleaner.log'
-    # log file exists and not empty, open file with append mode
-    if os.path.exists(logFile) and os.path.getsize(logFile) != 0:
-        logFp = open(logFile, 'a+')
-        logFp.write('\n')   # 追加模式下需要一个额外的换行，和上方的log分隔开
-        logFp.writelines([i + '\n' for i in logContent])
-    # log file does not exist or empty, open file with write mode
+    def startElement(name, attrs):
+        closePending()
+        state[0] += 1
+        if state[0] == 1:
+            state[1] = name
+        if state[0] != 2 or state[1] != 'resources':
+            return
+        state[2] = None
+        # <item type="dimen" name="xxx"> is the same as <dimen name="xxx">
+        if name == 'item':
+            resType = attrs.get('type')
+        else:
+            resType = name
+        if resType in resTypes:
+            itemName = attrs.get('name')
+            if itemName is not None and itemName != '':
+                state[2] = [resType, itemName, parser.CurrentByteIndex, None]
+                declarations.append(state[2])
+
+    def endElement(_):
+        closePending()
+        if state[0] == 2 and state[2] is not None:
+            state[3] = state[2]
+            state[2] = None
+        state[0] -= 1
+
+    def otherEvent(*_):
+        closePending()
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+    parser.CharacterDataHandler = otherEvent
+    parser.CommentHandler = otherEvent
+    parser.ProcessingInstructionHandler = otherEvent
+    parser.StartCdataSectionHandler = otherEvent
+    if content is not None:
+        parser.Parse(content, True)
+        return declarations
+    fp = open(fileFullPath, 'rb')
+    try:
+        parser.ParseFile(fp)
+    finally:
+        fp.close()
+    return declarations
+
+
+# Get the files of the task of a worker process, as a list of (file path, content). The task is (args, file list)
+# or (args, file list, content list), the content is None if the file is not prefetched.
+def getTaskFiles(task):
+    if len(task) == 3:
+        return zip(task[1], task[2])
+    return [(fileFullPath, None) for fileFullPath in task[1]]
+
+
+# Parse a list of values xml files for declarations, used as the task of a worker process.
+# Return the list of declarations for every file.
+def parseValueFiles(task):
+    resTypes = task[0]
+    return [parseValueDeclarations(fileFullPath, resTypes, content) for (fileFullPath, content) in getTaskFiles(task)]
+
+
+# Get all configured resources in resources folder, as a set of symbol ids for every type.
+# The declarations of every values file are also kept in its inventory entry, for removing them later.
+def getConfiguredValueRes(inventory, resTypes, workers=1, scanIndex=None, readers=0):
+    symbolTable = inventory['symbols']
+    resDic = {resType: set() for resType in resTypes}
+    # Value resources can only be declared in the xml files of the values folders
+    valueEntries = [entry for entry in getTypedResEntries(inventory, 'values') if entry['ext'] == '.xml']
+    fileResults = getFileResults(parseValueFiles, resTypes, valueEntries, workers, scanIndex, 'declared', readers)
+    for (entry, declarations) in zip(valueEntries, fileResults):
+        entry['declarations'] = declarations
+        for (resType, itemName, _, _) in declarations:
+            # string-array and integer-array are referenced as array, so they share the ids of array
+            resDic[resType].add(internSymbol(symbolTable, getMergedResType(resType), itemName))
+    return resDic
+
+
+def getConfiguredFileRes(inventory, resTypes):
+    symbolTable = inventory['symbols']
+    resDic = {resType: set() for resType in resTypes}
+    for resType in resTypes:
+        resIdSet = resDic[resType]
+        # Iterate through all files in the folders of the type, the file name must be valid
+        for entry in getTypedResEntries(inventory, resType):
+            if entry['isValid']:
+                resIdSet.add(internSymbol(symbolTable, resType, entry['name']))
+    return resDic
+
+
+# The compiled patterns of compileRefPatterns() for every tuple of resource types. The files are scanned one at
+# a time, so the patterns are only compiled once in every process instead of once for every file.
+refPatternCache = {}
+
+
+# Compile the patterns which find resource references, for all the resource types at once.
+# The xml pattern is wrapped in a lookahead, so the regex engine tries every position of the content and
+# the matches of different types can overlap, exactly like the matches of the old one-pattern-per-type loop.
+# Its first group is always the whole match, then (type, name) group pairs follow.
+# The java pattern is a lexer, see scanJavaRefs().
+# The literals are the strings which every match contains, used by the prefilter before the patterns run.
+def compileRefPatterns(resTypes):
+    patterns = refPatternCache.get(resTypes)
+    if patterns is not None:
+        return patterns
+    typeAlt = '|'.join([re.escape(resType) for resType in resTypes])
+    patterns = {
+        # "@type/name" or >@type/name< in xml files
+        'xml': re.compile(r'(?=("@(?:[\w.]+:)?(%s)/(\S+)"|>@(?:[\w.]+:)?(%s)/(\S+)<))' % (typeAlt, typeAlt)),
+        # 代码中的注释、字符串和字符常量被整个匹配并跳过，其余位置上的 R类名.资源类型.资源名 都是对资源的引用，
+        # 不管前后是什么语法，例如：问号表达式、数组、注解。资源类型不在正则中，所以扫描时间和类型的数量无关
+        'java': re.compile(r'//[^\n]*|/\*.*?\*/|"""(?:\\.|[^\\])*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+                           r'|(?<![\w$])%s\s*\.\s*([A-Za-z_$][\w$]*)\s*\.\s*([A-Za-z_$][\w$]*)' % RClassName,
+                           re.DOTALL),
+        'xmlLiterals': ('@', [resType + '/' for resType in resTypes]),
+        # whitespace is allowed around the dots in java, so only the words are literals
+        'javaLiterals': (RClassName, list(resTypes)),
+    }
+    refPatternCache[resTypes] = patterns
+    return patterns
+
+
+# Find all references in the content with a pattern from compileRefPatterns(), and append them to the typed lists.
+# A match of a type is only accepted if it starts after the end of the previous match of the same type.
+# This is how findall() with a single type pattern works, so the result is the same as scanning type by type.
+# If withOffset is True, (name, offset of the match) is appended instead of the name.
+# If the sorted offsets where a match can start are known, the pattern is only tried at these offsets. Every pattern
+# is a lookahead, so the matches are the same as the matches of finditer(), which tries every offset.
+def findOverlappedRefs(regex, content, resDic, withOffset=False, starts=None):
+    lastEndDic = {}
+    if starts is None:
+        matches = regex.finditer(content)
     else:
-        logFp = open(logFile, 'w+')
-        logFp.writelines([i + '\n' for i in logContent])
-    logFp.close()
+        matches = [match for match in [regex.match(content, start) for start in starts] if match is not None]
+    for match in matches:
+        groups = match.groups()
+        for index in range(1, len(groups), 2):
+            resType = groups[index]
+            if resType is None:
+                continue
+            start = match.start()
+            if start < lastEndDic.get(resType, 0):
+                break
+            lastEndDic[resType] = start + len(groups[0])
+            if groups[index + 1] != '':
+                if withOffset:
+                    resDic[resType].append((groups[index + 1], start))
+                else:
+                    resDic[resType].append(groups[index + 1])
+            break
 
-if __name__ == '__main__':
-    logContent = []
+
+# The prefilter of the scan. Check if the content contains the prefix and one of the literals, which every reference
+# contains. find() runs a fast search in C, which is much cheaper than the patterns, and it also works on the
+# memory mapped and the decoded content. Most java files never use the R class, and many xml files have no '@'.
+def hasRefLiterals(content, literals):
+    (prefix, typedLiterals) = literals
+    if content.find(prefix) == -1:
+        return False
+    for literal in typedLiterals:
+        if content.find(literal) != -1:
+            return True
+    return False
+
+
+# Get the offsets where a xml reference can start, the '"' or '>' right before every '@'
+def findXmlRefStarts(content):
+    starts = []
+    pos = content.find('@', 1)
+    while pos != -1:
+        if content[pos - 1] in '">':
+            starts.append(pos - 1)
+        pos = content.find('@', pos + 1)
+    return starts
+
+
+# Find the references in the content of a xml file, with their offsets.
+# Return False if the file is skipped by the prefilter.
+def scanXmlRefs(patterns, fileContent, resDic):
+    if not hasRefLiterals(fileContent, patterns['xmlLiterals']):
+        return False
+    findOverlappedRefs(patterns['xml'], fileContent, resDic, True, findXmlRefStarts(fileContent))
+    return True
+
+
+# Find the references in the content of a java file, in a single pass of the lexer pattern.
+# The comments and the string literals are matched as a whole, and their (type, name) groups are empty.
+# Every other "R class . type . name" is a reference of the type.
+# Return False if the file is skipped by the prefilter.
+def scanJavaRefs(patterns, fileContent, resDic):
+    if not hasRefLiterals(fileContent, patterns['javaLiterals']):
+        return False
+    for (resType, resName) in patterns['java'].findall(fileContent):
+        resUsedList = resDic.get(resType)
+        if resUsedList is not None:
+            resUsedList.append(resName)
+    return True
+
+
+# Files of at least this size are memory mapped for scanning, the smaller files are read, which is faster for them
+MemoryMapMinSize = 65536
+
+
+# Call scanFunc(content, isWide) with the content of a file. Big files are memory mapped, and the patterns run on the
+# mapping directly instead of a copy of the file. UTF-16 files are decoded to unicode and isWide is True,
+# because the patterns only match ASCII compatible bytes. UTF-8 files are scanned as they are, with or without BOM.
+# If the content of the file is prefetched, the file is not opened again. Return the result of scanFunc.
+def scanFileContent(fileFullPath, scanFunc, content=None):
+    if content is None:
+        fp = open(fileFullPath, 'rb')
+        try:
+            # mmap cannot map an empty file
+            if os.fstat(fp.fileno()).st_size >= max(MemoryMapMinSize, 1):
+                content = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                content = fp.read()
+        finally:
+            fp.close()
     try:
-        # start clean process
-        logContent.append('------------------------------ ' + getReadableTime() + ' ------------------------------')
-        process()
+        bom = content[0:2]
+        if bom == codecs.BOM_UTF16_LE or bom == codecs.BOM_UTF16_BE:
+            return scanFunc(content[:].decode('utf-16'), True)
+        return scanFunc(content, False)
+    finally:
+        if isinstance(content, mmap.mmap):
+            content.close()
+
+
+# Convert the offsets of the references found in a decoded UTF-16 file to the byte offsets in the file.
+# The references are in the order of their offsets.
+def getWideByteOffsets(text, refList):
+    byteRefList = []
+    lastOffset = 0
+    lastByteOffset = len(codecs.BOM_UTF16_LE)
+    for (resName, offset) in refList:
+        lastByteOffset += len(text[lastOffset:offset].encode('utf-16-le'))
+        lastOffset = offset
+        byteRefList.append((resName, lastByteOffset))
+    return byteRefList
+
+
+# The number of files skipped by the prefilter in this process, timeFileChunk() reads it for the metrics of every file
+prefilterCounts = {'skipped': 0}
+
+
+# Remove the empty lists and the duplicated names from a dict of typed lists, to keep the per file results small
+def compactResDic(resDic):
+    return dict([(resType, sorted(set(resList))) for (resType, resList) in resDic.items() if len(resList) != 0])
+
+
+# Scan a list of xml files for references, used as the task of a worker process.
+# Return a dict of {name: offsets} for every type for every file. The offsets are used to find the declarations
+# which contain the references in the values files.
+def scanXmlFiles(task):
+    resTypes = task[0]
+    fileResults = []
+    patterns = compileRefPatterns(resTypes)
+    for (fileFullPath, content) in getTaskFiles(task):
+        resDic = {resType: [] for resType in resTypes}
+
+        def scanXmlContent(text, isWide):
+            isScanned = scanXmlRefs(patterns, text, resDic)
+            # The offsets must be byte offsets, like the offsets of the declarations
+            if isWide:
+                for (resType, refList) in resDic.items():
+                    resDic[resType] = getWideByteOffsets(text, refList)
+            return isScanned
+
+        if not scanFileContent(fileFullPath, scanXmlContent, content):
+            prefilterCounts['skipped'] += 1
+        fileResult = {}
+        for (resType, refList) in resDic.items():
+            if len(refList) == 0:
+                continue
+            offsetDic = fileResult[resType] = {}
+            for (resName, offset) in refList:
+                offsetDic.setdefault(resName, []).append(offset)
+        fileResults.append(fileResult)
+    return fileResults
+
+
+# Scan a list of java files for references, used as the task of a worker process.
+# Return a dict of typed name lists for every file.
+def scanJavaFiles(task):
+    resTypes = task[0]
+    fileResults = []
+    patterns = compileRefPatterns(resTypes)
+    for (fileFullPath, content) in getTaskFiles(task):
+        resDic = {resType: [] for resType in resTypes}
+        if not scanFileContent(fileFullPath, lambda text, isWide: scanJavaRefs(patterns, text, resDic), content):
+            prefilterCounts['skipped'] += 1
+        fileResults.append(compactResDic(resDic))
+    return fileResults
+
+
+# Run the func of a chunk file by file, and time every file. Used as the func of mapFileChunks(),
+# its args are (func, args of func). Return (result, seconds, whether it is skipped by the prefilter) for every file.
+def timeFileChunk(task):
+    (func, args) = task[0]
+    timedResults = []
+    for (fileFullPath, content) in getTaskFiles(task):
+        startTime = time.time()
+        skippedCount = prefilterCounts['skipped']
+        fileResult = func((args, [fileFullPath], [content]))[0]
+        timedResults.append((fileResult, time.time() - startTime, prefilterCounts['skipped'] != skippedCount))
+    return timedResults
+
+
+# Run func on the file list split into chunks. func receives (args, chunk) and returns a result for every file.
+# If workers is greater than 1, the chunks are processed by a pool of worker processes.
+# The chunks are contiguous and joined in order, so the results are in the same order as the file list.
+# If a pool is given, it is used instead of a new pool, and it is not closed.
+def mapFileChunks(func, args, fileList, workers, pool=None):
+    if len(fileList) == 0:
+        return []
+    if workers <= 1 or len(fileList) == 1:
+        return func((args, fileList))
+    chunkCount = min(len(fileList), workers * 4)
+    chunkSize = (len(fileList) + chunkCount - 1) / chunkCount
+    chunks = [(args, fileList[i:i + chunkSize]) for i in range(0, len(fileList), chunkSize)]
+    if pool is not None:
+        chunkResults = pool.map(func, chunks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            chunkResults = pool.map(func, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    fileResults = []
+    for chunkResult in chunkResults:
+        fileResults.extend(chunkResult)
+    return fileResults
+
+
+# The limits of the files read ahead by the reader threads and not processed yet. A file bigger than the limit is
+# still read when nothing else is waiting, so the memory used stays below the limit or the biggest file.
+PrefetchMaxFiles = 64
+PrefetchMaxBytes = 32 * 1024 * 1024
+
+
+# Read the files of the list by a pool of reader threads, and yield the content of every file in the order of the list.
+# The readers only read ahead up to the prefetch limits, then they wait until the files are processed, which happens
+# when the next content is asked for. sizeList is the size of every file in the inventory, used for the limits.
+# A file that cannot be read raises its error when its content is asked for, like opening it would.
+def prefetchFiles(fileList, sizeList, readers):
+    # the next file to read, the count and the bytes of the files read ahead, and whether the consumer is gone
+    state = {'next': 0, 'files': 0, 'bytes': 0, 'isStopped': False}
+    contents = {}
+    condition = threading.Condition()
+
+    def isFull():
+        if state['files'] == 0:
+            return False
+        return state['files'] >= PrefetchMaxFiles or state['bytes'] + sizeList[state['next']] > PrefetchMaxBytes
+
+    def readFiles():
+        while True:
+            # the files are taken in the order of the list, so the next file to process is always being read
+            with condition:
+                while not state['isStopped'] and state['next'] < len(fileList) and isFull():
+                    condition.wait()
+                if state['isStopped'] or state['next'] >= len(fileList):
+                    return
+                index = state['next']
+                state['next'] += 1
+                state['files'] += 1
+                state['bytes'] += sizeList[index]
+            try:
+                fp = open(fileList[index], 'rb')
+                try:
+                    result = (fp.read(), None)
+                finally:
+                    fp.close()
+            except (IOError, OSError) as e:
+                result = (None, e)
+            with condition:
+                contents[index] = result
+                condition.notify_all()
+
+    threads = [threading.Thread(target=readFiles) for _ in range(min(readers, len(fileList)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        for index in range(len(fileList)):
+            with condition:
+                while index not in contents:
+                    condition.wait()
+                (content, error) = contents.pop(index)
+            if error is not None:
+                raise error
+            yield content
+            with condition:
+                state['files'] -= 1
+                state['bytes'] -= sizeList[index]
+                condition.notify_all()
+    finally:
+        with condition:
+            state['isStopped'] = True
+            condition.notify_all()
+        # the readers stop after the files they are reading
+        for thread in threads:
+            thread.join()
+
+
+# Run func of a task and return (result, None), or (None, error) if it fails, used as the task of a worker process.
+# The errors are returned instead of raised, so a failed task still frees its slot in mapPrefetchedFiles().
+def runCatchingTask(task):
+    (func, funcTask) = task
+    try:
+        return (func(funcTask), None)
+    except Exception as e:
+        return (None, e)
+
+
+# Run func on every file of the list with the content prefetched by reader threads, so reading the next files
+# overlaps with processing the current ones. Like mapFileChunks(), func receives (args, file list, content list),
+# and the results are in the same order as the file list. If workers is greater than 1, the files are processed
+# by a pool of worker processes, at most two files for every worker are waiting in the pool. If a pool is given,
+# it is used instead of a new pool, and it is not closed.
+def mapPrefetchedFiles(func, args, fileList, sizeList, workers, readers, pool=None):
+    contents = prefetchFiles(fileList, sizeList, readers)
+    if workers <= 1:
+        fileResults = []
+        # izip takes the contents one by one, zip would read all files before the first one is processed
+        for (fileFullPath, content) in itertools.izip(fileList, contents):
+            fileResults.extend(func((args, [fileFullPath], [content])))
+        return fileResults
+    isOwnPool = pool is None
+    if isOwnPool:
+        pool = multiprocessing.Pool(workers)
+    slots = threading.Semaphore(workers * 2)
+    try:
+        asyncResults = []
+        for (index, content) in enumerate(contents):
+            slots.acquire()
+            asyncResults.append(pool.apply_async(runCatchingTask, ((func, (args, [fileList[index]], [content])),),
+                                                 callback=lambda _: slots.release()))
+        fileResults = []
+        for asyncResult in asyncResults:
+            (result, error) = asyncResult.get()
+            if error is not None:
+                raise error
+            fileResults.extend(result)
+    finally:
+        contents.close()
+        if isOwnPool:
+            pool.close()
+            pool.join()
+    return fileResults
+
+
+# Get the results of func for every inventory entry in the list. Unchanged files are taken from the scan index,
+# only the new and changed files are processed, and their results are saved into the index.
+# If readers is greater than 0, the files are read by that many reader threads ahead of processing them.
+# If a pool of worker processes is given, it is used instead of a new pool.
+def getFileResults(func, args, entryList, workers, scanIndex, field, readers=0, pool=None):
+    fileResults = [None] * len(entryList)
+    staleIndexes = []
+    for (index, entry) in enumerate(entryList):
+        fileResults[index] = lookupScanIndex(scanIndex, entry, field)
+        if fileResults[index] is None:
+            staleIndexes.append(index)
+    staleFiles = [entryList[index]['path'] for index in staleIndexes]
+    if readers > 0:
+        staleResults = mapPrefetchedFiles(timeFileChunk, (func, args), staleFiles,
+                                          [entryList[index]['size'] for index in staleIndexes], workers, readers, pool)
+    else:
+        staleResults = mapFileChunks(timeFileChunk, (func, args), staleFiles, workers, pool)
+    for (index, (fileResult, seconds, isSkipped)) in zip(staleIndexes, staleResults):
+        fileResults[index] = fileResult
+        updateScanIndex(scanIndex, entryList[index]['path'], field, fileResult)
+        # The declarations are parsed by expat, the references are found by regex
+        if field == 'declared':
+            addFileMetrics(entryList[index], seconds, xmlParses=1)
+        else:
+            matches = sum([len(resList) for resList in fileResult.values()])
+            addFileMetrics(entryList[index], seconds, matches=matches, skipped=int(isSkipped))
+    return fileResults
+
+
+# Create an empty reference graph. The nodes are the symbol ids of the resources, an edge goes from a resource to
+# a resource referenced by it. The roots are the resources referenced from the places which are always used:
+# the java files, the manifest, and the xml files and declarations which are not removed by AndroidResCleaner.
+def newRefGraph():
+    return {'roots': set(), 'edges': {}}
+
+
+# Add a reference to the reference graph. sourceId is the resource which contains the reference,
+# or None if the reference is a root.
+def addRef(refGraph, sourceId, targetId):
+    if sourceId is None:
+        refGraph['roots'].add(targetId)
+    elif sourceId != targetId:
+        refGraph['edges'].setdefault(sourceId, set()).add(targetId)
+
+
+# Get the symbol id of the declaration in the values file which contains the offset.
+# Return None if the offset is not in any declaration, e.g. in a declaration of an unsupported type.
+def findDeclarationAt(symbolTable, declarations, declarationStarts, offset):
+    index = bisect.bisect_right(declarationStarts, offset) - 1
+    if index < 0:
+        return None
+    (resType, itemName, _, end) = declarations[index]
+    if end is None or offset >= end:
+        return None
+    return internSymbol(symbolTable, getMergedResType(resType), itemName)
+
+
+# Add the references found in a xml file to the reference graph.
+# The references in a file resource, such as a layout, belong to the resource.
+# The references in a values file belong to the declaration which contains them.
+# All other references are roots.
+def addXmlFileRefs(refGraph, symbolTable, entry, fileResult):
+    sourceId = None
+    declarations = entry.get('declarations')
+    if entry.get('isResFile') and entry.get('isValid') and entry['folderType'] in FileTypes:
+        sourceId = internSymbol(symbolTable, entry['folderType'], entry['name'])
+    if declarations:
+        declarationStarts = [start for (_, _, start, _) in declarations]
+    for (resType, offsetDic) in fileResult.items():
+        for (resName, offsets) in offsetDic.items():
+            targetId = internSymbol(symbolTable, resType, resName)
+            if not declarations:
+                addRef(refGraph, sourceId, targetId)
+                continue
+            for offset in offsets:
+                addRef(refGraph, findDeclarationAt(symbolTable, declarations, declarationStarts, offset), targetId)
+
+
+# Get the resources which are used, as a set of symbol ids for every type.
+# In deep search the used resources are the resources reachable from the roots, so a resource which is only
+# referenced by unused resources is also unused. Otherwise every referenced resource is used.
+def getReachableRes(refGraph, symbolTable, resTypes, isDeepSearch):
+    reached = set(refGraph['roots'])
+    if isDeepSearch:
+        pending = list(reached)
+        while len(pending) != 0:
+            for targetId in refGraph['edges'].get(pending.pop(), ()):
+                if targetId not in reached:
+                    reached.add(targetId)
+                    pending.append(targetId)
+    else:
+        for targetIds in refGraph['edges'].values():
+            reached.update(targetIds)
+    resDic = {resType: set() for resType in resTypes}
+    symbols = symbolTable['symbols']
+    for symbolId in reached:
+        resType = symbols[symbolId][0]
+        if resType in resDic:
+            resDic[resType].add(symbolId)
+    return resDic
+
+
+# Get all used resources, as a set of symbol ids for every type.
+# The reference graph is kept in the inventory. The declarations of the values files should be found before,
+# or all references in the values files are roots.
+def getUsedRes(inventory, resTypes, workers=1, scanIndex=None, isDeepSearch=False, readers=0):
+    symbolTable = inventory['symbols']
+    refGraph = inventory['refGraph'] = newRefGraph()
+    # Scan all xml files in the resource folders and the manifest, then all java files in the source code folders
+    xmlEntries = [entry for entry in inventory['res'] if entry['fileName'].endswith('.xml')] + inventory['manifest']
+    xmlResults = getFileResults(scanXmlFiles, resTypes, xmlEntries, workers, scanIndex, 'used', readers)
+    for (entry, fileResult) in zip(xmlEntries, xmlResults):
+        addXmlFileRefs(refGraph, symbolTable, entry, fileResult)
+    javaEntries = [entry for entry in inventory['src'] if entry['fileName'].endswith('.java')]
+    javaResults = getFileResults(scanJavaFiles, resTypes, javaEntries, workers, scanIndex, 'used', readers)
+    for fileResult in javaResults:
+        for (resType, resList) in fileResult.items():
+            for resName in resList:
+                addRef(refGraph, None, internSymbol(symbolTable, resType, resName))
+    return getReachableRes(refGraph, symbolTable, resTypes, isDeepSearch)
+
+
+# The number of files scanned between two checks of the types whose declared resources are all used
+DemandBatchFiles = 256
+
+
+# Get the used resources like getUsedRes() without deep search, but only scan for the types which still have
+# declared resources that are not referenced yet. configuredDicts are the declared resources from
+# getConfiguredValueRes() and getConfiguredFileRes(). The unchanged files are taken from the scan index first, from
+# their results of all types, or from the results of an earlier demand-driven scan if those have all types which are
+# still searched. Then the other files are scanned in batches, the resource files and the manifest before
+# the java files, they reference most of the resources. Once every declared resource of a type is referenced, the
+# type is dropped from the patterns, and the scan stops when no type is left.
+# The result is only complete for the declared resources, which is all that getUnusedRes() needs.
+def getUsedResOnDemand(inventory, resTypes, configuredDicts, workers=1, scanIndex=None, readers=0):
+    symbolTable = inventory['symbols']
+    refGraph = inventory['refGraph'] = newRefGraph()
+    candidates = {}
+    for resType in resTypes:
+        candidateIds = set()
+        for configuredDict in configuredDicts:
+            candidateIds.update(configuredDict.get(resType, ()))
+        if len(candidateIds) != 0:
+            candidates[resType] = candidateIds
+
+    def addFileResult(func, entry, fileResult):
+        if func is scanXmlFiles:
+            addXmlFileRefs(refGraph, symbolTable, entry, fileResult)
+        else:
+            for (resType, resList) in fileResult.items():
+                for resName in resList:
+                    addRef(refGraph, None, internSymbol(symbolTable, resType, resName))
+        # the xml results are {name: offsets}, the java results are lists of names
+        for (resType, resNames) in fileResult.items():
+            candidateIds = candidates.get(resType)
+            if candidateIds is not None:
+                candidateIds.difference_update([findSymbol(symbolTable, resType, resName) for resName in resNames])
+        for resType in [resType for (resType, candidateIds) in candidates.items() if len(candidateIds) == 0]:
+            del candidates[resType]
+
+    xmlEntries = [entry for entry in inventory['res'] if entry['fileName'].endswith('.xml')] + inventory['manifest']
+    javaEntries = [entry for entry in inventory['src'] if entry['fileName'].endswith('.java')]
+    staleTasks = []
+    candidateTypes = set(candidates.keys())
+    for task in [(scanXmlFiles, entry) for entry in xmlEntries] + [(scanJavaFiles, entry) for entry in javaEntries]:
+        fileResult = lookupScanIndex(scanIndex, task[1], 'used')
+        if fileResult is None:
+            # (types, result) of an earlier demand-driven scan
+            demandResult = lookupScanIndex(scanIndex, task[1], 'demandUsed')
+            if demandResult is not None and set(demandResult[0]) >= candidateTypes:
+                fileResult = demandResult[1]
+        if fileResult is None:
+            staleTasks.append(task)
+        else:
+            addFileResult(task[0], task[1], fileResult)
+    cachedCount = len(xmlEntries) + len(javaEntries) - len(staleTasks)
+    batchFiles = DemandBatchFiles * max(workers, 1)
+    savedScans = 0
+    scannedCount = 0
+    # one pool of worker processes for all batches
+    pool = None
+    if workers > 1 and len(staleTasks) > 1 and len(candidates) != 0:
+        pool = multiprocessing.Pool(workers)
+    try:
+        while scannedCount < len(staleTasks) and len(candidates) != 0:
+            liveTypes = tuple([resType for resType in resTypes if resType in candidates])
+            batch = staleTasks[scannedCount:scannedCount + batchFiles]
+            scannedCount += len(batch)
+            savedScans += len(batch) * (len(resTypes) - len(liveTypes))
+            for func in (scanXmlFiles, scanJavaFiles):
+                entryList = [entry for (taskFunc, entry) in batch if taskFunc is func]
+                if len(entryList) == 0:
+                    continue
+                fileResults = getFileResults(func, liveTypes, entryList, workers, None, 'used', readers, pool)
+                for (entry, fileResult) in zip(entryList, fileResults):
+                    # The results for a part of the types are kept apart, they are only used by demand-driven scans
+                    if len(liveTypes) == len(resTypes):
+                        updateScanIndex(scanIndex, entry['path'], 'used', fileResult)
+                    else:
+                        updateScanIndex(scanIndex, entry['path'], 'demandUsed', [liveTypes, fileResult])
+                    addFileResult(func, entry, fileResult)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    savedScans += (len(staleTasks) - scannedCount) * len(resTypes)
+    addLog('demand-driven scan: %d files from the scan index, %d of %d other files scanned, %d type scans of %d saved'
+           % (cachedCount, scannedCount, len(staleTasks), savedScans, len(staleTasks) * len(resTypes)))
+    addReport('demand', cachedFiles=cachedCount, scannedFiles=scannedCount, files=len(staleTasks),
+              savedTypeScans=savedScans, typeScans=len(staleTasks) * len(resTypes))
+    return getReachableRes(refGraph, symbolTable, resTypes, False)
+
+
+# The version of the scan index format. Increase it when the content of the index changes.
+ScanIndexVersion = 4
+
+
+# Get the encoding of the paths in the scan index file. json keeps the paths as unicode, so the paths of the
+# inventory, which are byte strings, are decoded by the encoding of the file system when the index is saved and
+# encoded again when it is loaded. A C locale reports ascii, the paths are utf-8 then.
+def getIndexPathEncoding():
+    encoding = sys.getfilesystemencoding()
+    if encoding is None or codecs.lookup(encoding).name == 'ascii':
+        return 'utf-8'
+    return encoding
+
+
+IndexPathEncoding = getIndexPathEncoding()
+
+
+# Get the path of the scan index file of the project. The index is saved in cacheDir,
+# or in the current folder (next to the log file) if cacheDir is empty.
+def getScanIndexFile(cacheDir, projectDir):
+    projectKey = hashlib.sha1(os.path.abspath(projectDir)).hexdigest()[:12]
+    return os.path.join(cacheDir, 'AndroidResCleaner-%s.index' % projectKey)
+
+
+# Get the sha1 of a file content
+def getFileHash(fileFullPath):
+    sha1 = hashlib.sha1()
+    fp = open(fileFullPath, 'rb')
+    try:
+        while True:
+            block = fp.read(65536)
+            if len(block) == 0:
+                break
+            sha1.update(block)
+    finally:
+        fp.close()
+    return sha1.hexdigest()
+
+
+# Load the scan index. The signature describes how the files were scanned (the resource types, R class name).
+# If the index file is None, doesn't exist, has another format version or another signature, return an empty index.
+def loadScanIndex(indexFile, signature, useHash):
+    scanIndex = None
+    if indexFile is not None and os.path.exists(indexFile):
+        try:
+            fp = open(indexFile, 'r')
+            try:
+                scanIndex = json.load(fp)
+            finally:
+                fp.close()
+        except ValueError:
+            scanIndex = None
+    if scanIndex is None or scanIndex.get('version') != ScanIndexVersion or scanIndex.get('signature') != signature:
+        scanIndex = {'version': ScanIndexVersion, 'signature': signature, 'files': {}}
+    # The keys are the same byte strings as the paths of the inventory
+    scanIndex['files'] = dict([(fileFullPath.encode(IndexPathEncoding), indexEntry)
+                               for (fileFullPath, indexEntry) in scanIndex['files'].items()])
+    # These keys are only used in this run, and are not saved
+    scanIndex['useHash'] = useHash
+    scanIndex['seen'] = set()
+    scanIndex['changed'] = set()
+    return scanIndex
+
+
+# Get the result of a field of the file from the scan index. Return None if the file is new or changed.
+# A changed file gets a new empty entry, so that the fields will be updated by the new results.
+def lookupScanIndex(scanIndex, entry, field):
+    if scanIndex is None:
+        return None
+    files = scanIndex['files']
+    fileFullPath = entry['path']
+    scanIndex['seen'].add(fileFullPath)
+    # The fingerprint is the size and mtime, which are read while building the inventory
+    size = entry['size']
+    mtime = entry['mtime']
+    indexEntry = files.get(fileFullPath)
+    if indexEntry is not None and (indexEntry['size'] != size or indexEntry['mtime'] != mtime):
+        # Size or mtime changed, the content may be the same, e.g. after a checkout
+        fileHash = indexEntry.get('hash')
+        if scanIndex['useHash'] and fileHash is not None and fileHash == getFileHash(fileFullPath):
+            indexEntry['size'] = size
+            indexEntry['mtime'] = mtime
+        else:
+            indexEntry = None
+    if indexEntry is None:
+        scanIndex['changed'].add(fileFullPath)
+        indexEntry = {'size': size, 'mtime': mtime}
+        if scanIndex['useHash']:
+            indexEntry['hash'] = getFileHash(fileFullPath)
+        files[fileFullPath] = indexEntry
+    return indexEntry.get(field)
+
+
+# Save the result of a field of the file to the scan index
+def updateScanIndex(scanIndex, fileFullPath, field, fileResult):
+    if scanIndex is None:
+        return
+    scanIndex['files'][fileFullPath][field] = fileResult
+
+
+# Evict the entries of the files which were not seen in this run (deleted files) from the scan index.
+# Return True if the index has changed in this run.
+def evictScanIndex(scanIndex):
+    files = scanIndex['files']
+    isChanged = len(scanIndex['changed']) != 0
+    for fileFullPath in files.keys():
+        if fileFullPath not in scanIndex['seen']:
+            del files[fileFullPath]
+            isChanged = True
+    return isChanged
+
+
+# Save the scan index, the entries of the deleted files are evicted.
+# The index file is not rewritten if nothing has changed.
+def saveScanIndex(scanIndex, indexFile):
+    files = scanIndex['files']
+    isChanged = evictScanIndex(scanIndex) or not os.path.exists(indexFile)
+    if not isChanged:
+        return
+    savedFiles = {}
+    for (fileFullPath, indexEntry) in files.items():
+        try:
+            savedFiles[fileFullPath.decode(IndexPathEncoding)] = indexEntry
+        except UnicodeDecodeError:
+            # A path which is not in the encoding of the file system is not kept, the file is scanned again
+            continue
+    savedIndex = {'version': scanIndex['version'], 'signature': scanIndex['signature'], 'files': savedFiles}
+    indexDir = os.path.dirname(indexFile)
+    if indexDir != '' and not os.path.exists(indexDir):
+        os.makedirs(indexDir)
+    tempFile = indexFile + 'temp'
+    fp = open(tempFile, 'w')
+    try:
+        # dumps() uses the C encoder, which is much faster than dump() to a file
+        fp.write(json.dumps(savedIndex, separators=(',', ':')))
+    finally:
+        fp.close()
+    if os.path.exists(indexFile):
+        os.remove(indexFile)
+    os.rename(tempFile, indexFile)
+
+
+# Merge the string-array and integer-array sets into the array set, they are all referenced as array
+def mergeArrayRes(configuredValueRes):
+    configuredValueRes['array'] = configuredValueRes['array'] | configuredValueRes['string-array'] | configuredValueRes['integer-array']
+    del configuredValueRes['string-array']
+    del configuredValueRes['integer-array']
+
+
+# Get the configured resources which are not used, as a set of symbol ids for every type
+def getUnusedRes(configuredRes, usedResDict):
+    unusedResDict = {}
+    for (resType, idSet) in configuredRes.items():
+        unusedResDict[resType] = idSet - usedResDict[resType]
+    return unusedResDict
+
+
+# Write a record to the report for every declaration and every file of the unused resources,
+# so the report tells where the resources are, e.g. in which locales a string is unused
+def addUnusedToReport(inventory, unusedValueDict, unusedFileDict):
+    symbolTable = inventory['symbols']
+    for entry in inventory['res']:
+        for (resType, itemName, _, _) in entry.get('declarations', ()):
+            mergedType = getMergedResType(resType)
+            if findSymbol(symbolTable, mergedType, itemName) in unusedValueDict.get(mergedType, ()):
+                addReport('unused', type=mergedType, name=itemName, file=entry['relPath'], root=entry['root'],
+                          qualifier=entry['qualifier'])
+        folderType = entry.get('folderType')
+        if entry['isResFile'] and entry['isValid'] and folderType in unusedFileDict:
+            if findSymbol(symbolTable, folderType, entry['name']) in unusedFileDict[folderType]:
+                addReport('unused', type=folderType, name=entry['name'], file=entry['relPath'], root=entry['root'],
+                          qualifier=entry['qualifier'])
+
+
+# Append the unused resources to the log, in the order they were found
+def addUnsedToLog(symbolTable, unusedDict):
+    for (resType, idSet) in unusedDict.items():
+        addLog('unused %s :' % resType)
+        for symbolId in sorted(idSet):
+            addLog('  ' + getSymbolName(symbolTable, symbolId))
+
+
+def getReadableTime():
+    curTime = time.localtime()
+    year = curTime[0]
+    month = curTime[1]
+    day = curTime[2]
+    hour = curTime[3]
+    minute = curTime[4]
+    second = curTime[5]
+    readableTime = '%d-%d-%d %d:%d:%d' % (year, month, day, hour, minute, second)
+    return readableTime
+
+
+# Get the resource type used in the unused dict for a declared type, string-array and integer-array are arrays
+def getMergedResType(resType):
+    if resType == 'string-array' or resType == 'integer-array':
+        return 'array'
+    return resType
+
+
+# The ioctl which clones a file on the Linux file systems with reflinks, such as btrfs and xfs
+FICLONE = 0x40049409
+# The name of the manifest in a backup snapshot, it has the original path of every file in the snapshot
+BackupManifestName = 'backup.json'
+# The backup snapshot of this run, the original of every changed or removed file is kept in it
+backupState = {'dir': None, 'projectDir': None, 'isArchive': False, 'files': {}, 'methods': {}}
+
+
+# Start the backup snapshot of this run, in a new folder under backupDir named by the time.
+# If isArchive is True, the snapshot is packed into a compressed archive when it is closed.
+def openBackup(backupDir, projectDir, isArchive):
+    name = time.strftime('%Y%m%d-%H%M%S')
+    snapshotDir = os.path.join(backupDir, name)
+    suffix = 1
+    while os.path.exists(snapshotDir) or os.path.exists(snapshotDir + '.tar.gz'):
+        suffix += 1
+        snapshotDir = os.path.join(backupDir, '%s-%d' % (name, suffix))
+    os.makedirs(snapshotDir)
+    backupState.update({'dir': snapshotDir, 'projectDir': projectDir, 'isArchive': isArchive, 'files': {},
+                        'methods': {}})
+
+
+# Get the path of a file in the snapshot. The files in the project keep their path relative to the project,
+# the files of the other roots, e.g. a library module, are kept under the hash of their root.
+def getBackupPath(entry):
+    relPath = os.path.relpath(entry['path'], backupState['projectDir'])
+    if relPath.startswith(os.pardir):
+        relPath = os.path.join('_external', hashlib.sha1(entry['root']).hexdigest()[:8], entry['relPath'])
+    return relPath
+
+
+# Clone a file by a reflink, the clone shares the blocks of the file until one of them is changed.
+# Return False if the file system doesn't support it.
+def cloneFile(srcFile, destFile):
+    if fcntl is None:
+        return False
+    srcFp = open(srcFile, 'rb')
+    try:
+        destFp = open(destFile, 'wb')
+        try:
+            fcntl.ioctl(destFp.fileno(), FICLONE, srcFp.fileno())
+            return True
+        except IOError:
+            return False
+        finally:
+            destFp.close()
+    finally:
+        srcFp.close()
+
+
+# Link a file to a new path, or clone it by a reflink or copy it if it cannot be linked, e.g. on another file system.
+# Return how the file is linked.
+def linkFile(srcFile, destFile):
+    try:
+        os.link(srcFile, destFile)
+        return 'link'
+    except (OSError, AttributeError):
+        # os.link is not available on Windows in python 2
+        if cloneFile(srcFile, destFile):
+            return 'reflink'
+        shutil.copy2(srcFile, destFile)
+        return 'copy'
+
+
+# Keep the original of a file in the snapshot before the file is changed or removed. The changed files are written
+# to a temp file which is renamed to the original file, so neither removing nor changing a file touches its inode,
+# and a hard link keeps the original without copying it. If the snapshot is on another file system, a reflink or
+# at last a copy is used. Only the first backup of a file is kept, later it is already changed by this run.
+def backupFile(entry):
+    fileFullPath = entry['path']
+    if backupState['dir'] is None or fileFullPath in backupState['files']:
+        return
+    relPath = getBackupPath(entry)
+    backupPath = os.path.join(backupState['dir'], relPath)
+    backupFolder = os.path.dirname(backupPath)
+    if not os.path.isdir(backupFolder):
+        os.makedirs(backupFolder)
+    method = linkFile(fileFullPath, backupPath)
+    backupState['files'][fileFullPath] = relPath
+    backupState['methods'][method] = backupState['methods'].get(method, 0) + 1
+
+
+# Finish the snapshot of this run: write its manifest, and pack it into a compressed archive if it is enabled.
+# Return the path of the snapshot, or None if nothing has been backed up.
+def closeBackup():
+    snapshotDir = backupState['dir']
+    if snapshotDir is None:
+        return None
+    backupState['dir'] = None
+    if len(backupState['files']) == 0:
+        shutil.rmtree(snapshotDir)
+        return None
+    manifest = {'time': getReadableTime(), 'projectDir': backupState['projectDir'],
+                'files': [{'path': path, 'file': relPath} for (path, relPath) in sorted(backupState['files'].items())]}
+    manifestFile = os.path.join(snapshotDir, BackupManifestName)
+    fp = open(manifestFile, 'w')
+    try:
+        fp.write(json.dumps(manifest, indent=2, sort_keys=True))
+    finally:
+        fp.close()
+    snapshot = snapshotDir
+    if backupState['isArchive']:
+        snapshot = snapshotDir + '.tar.gz'
+        archive = tarfile.open(snapshot, 'w:gz')
+        try:
+            # the manifest is the first member, so restoring can read it without reading the whole archive
+            archive.add(manifestFile, BackupManifestName)
+            for relPath in sorted(backupState['files'].values()):
+                archive.add(os.path.join(snapshotDir, relPath), relPath)
+        finally:
+            archive.close()
+        shutil.rmtree(snapshotDir)
+    methods = sorted(backupState['methods'].items())
+    addLog('backup: %d files in %s (%s)' % (len(backupState['files']), snapshot,
+                                            ', '.join(['%d %s' % (count, method) for (method, count) in methods])))
+    addReport('backup', snapshot=snapshot, files=len(backupState['files']), methods=backupState['methods'])
+    return snapshot
+
+
+# Find the latest snapshot in the backup folder, return None if there is none
+def findLatestBackup(backupDir):
+    if not os.path.isdir(backupDir):
+        return None
+    snapshots = []
+    for name in os.listdir(backupDir):
+        snapshot = os.path.join(backupDir, name)
+        if name.endswith('.tar.gz') or os.path.isfile(os.path.join(snapshot, BackupManifestName)):
+            snapshots.append((os.path.getmtime(snapshot), snapshot))
+    if len(snapshots) == 0:
+        return None
+    return max(snapshots)[1]
+
+
+# Replace a file of the project by a temp file, the temp file is renamed if it is on the same file system
+def replaceWithTempFile(tempFile, fileFullPath):
+    if os.path.exists(fileFullPath):
+        os.remove(fileFullPath)
+    shutil.move(tempFile, fileFullPath)
+
+
+# Put the files of a snapshot back to their original paths. The files of a snapshot folder are moved back by rename,
+# nothing is copied if the snapshot is on the same file system as the project, and the used snapshot is removed.
+# The files of an archive are extracted, and the archive is kept.
+def restoreBackup(snapshot):
+    addLog('restore backup ' + snapshot)
+    isArchive = snapshot.endswith('.tar.gz')
+    archive = None
+    if isArchive:
+        archive = tarfile.open(snapshot, 'r:gz')
+        manifest = json.load(archive.extractfile(BackupManifestName))
+    else:
+        fp = open(os.path.join(snapshot, BackupManifestName), 'r')
+        try:
+            manifest = json.load(fp)
+        finally:
+            fp.close()
+    try:
+        for record in manifest['files']:
+            # json loads the paths as unicode, they were saved from utf-8 byte strings
+            fileFullPath = record['path'].encode('utf-8')
+            relPath = record['file'].encode('utf-8')
+            folder = os.path.dirname(fileFullPath)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            tempFile = fileFullPath + 'temp'
+            if isArchive:
+                srcFp = archive.extractfile(relPath)
+                destFp = open(tempFile, 'wb')
+                try:
+                    shutil.copyfileobj(srcFp, destFp)
+                finally:
+                    destFp.close()
+                    srcFp.close()
+            else:
+                shutil.move(os.path.join(snapshot, relPath), tempFile)
+            replaceWithTempFile(tempFile, fileFullPath)
+            addLog(' restore file ' + fileFullPath)
+            addReport('restored', file=fileFullPath, snapshot=snapshot)
+    finally:
+        if archive is not None:
+            archive.close()
+    if not isArchive:
+        shutil.rmtree(snapshot)
+    addLog('%d files restored' % len(manifest['files']))
+
+
+# Get the folder of the backup snapshots
+def getBackupDir(configParser):
+    return getConfigOption(configParser, 'Backup', 'Dir', 'AndroidResCleaner.backup')
+
+
+# Restore the latest snapshot in the backup folder, or the snapshot given on the command line
+def restoreProject(configParser, snapshot):
+    if snapshot == '':
+        snapshot = findLatestBackup(getBackupDir(configParser))
+        if snapshot is None:
+            addLog('no backup found in ' + getBackupDir(configParser))
+            return
+    restoreBackup(snapshot)
+
+
+# The name of the journal of a write-back, in the staging folder
+WriteJournalName = 'journal.json'
+# The name of the staging folder, and of the marker file which tells that a folder is a staging folder.
+# Only the folders with the marker or a journal are recovered and removed, so no other folder is ever touched.
+StagingFolderName = '.AndroidResCleaner.staging'
+WriteMarkerName = 'staging.marker'
+# The write-back of this run. The new contents of the changed files are staged in the staging folder first,
+# and all files are replaced and removed in one batch by commitWriteBack(). ops is the list of staged changes,
+# at most one for every file, indexes has the position of every file in the list, staged is the number of
+# staged files.
+writeBackState = {'dir': None, 'ops': [], 'indexes': {}, 'staged': 0, 'isCommitting': False}
+
+
+# Get the staging folder of the write-back, in the folder StagingDir or in the project dir. It should be on the same
+# file system as the project, so the staged files are moved into the project by rename.
+def getStagingDir(configParser, projectDir):
+    parentDir = getConfigOption(configParser, 'WriteBack', 'StagingDir', '')
+    if parentDir == '':
+        parentDir = projectDir
+    return os.path.join(parentDir, StagingFolderName)
+
+
+# Check whether the folder is a staging folder created by openWriteBack()
+def isStagingDir(stagingDir):
+    return os.path.isfile(os.path.join(stagingDir, WriteMarkerName)) \
+        or os.path.isfile(os.path.join(stagingDir, WriteJournalName))
+
+
+# Start the write-back of this run in a new staging folder, marked as a staging folder
+def openWriteBack(stagingDir):
+    if isStagingDir(stagingDir):
+        raise RuntimeError('the staging folder %s is in use, recover it with --recover first' % stagingDir)
+    if os.path.exists(stagingDir):
+        raise RuntimeError('%s is not a staging folder of AndroidResCleaner, move it away first' % stagingDir)
+    os.makedirs(stagingDir)
+    fp = open(os.path.join(stagingDir, WriteMarkerName), 'w')
+    try:
+        fp.write('%s %d\n' % (getReadableTime(), os.getpid()))
+    finally:
+        fp.close()
+    writeBackState.update({'dir': stagingDir, 'ops': [], 'indexes': {}, 'staged': 0, 'isCommitting': False})
+
+
+# Get a new file in the staging folder for the new content of a file
+def getStagedFile():
+    stagingDir = writeBackState['dir']
+    if stagingDir is None:
+        raise RuntimeError('no write-back is open')
+    writeBackState['staged'] += 1
+    return os.path.join(stagingDir, '%d.new' % writeBackState['staged'])
+
+
+# Stage a change of the file of an inventory entry: 'replace' by the staged file, or 'remove'.
+# A later change of the same file replaces the earlier one, e.g. a rewritten file which has become empty is removed.
+def stageWriteOp(entry, opType, stagedFile=None):
+    fileFullPath = entry['path']
+    ops = writeBackState['ops']
+    index = writeBackState['indexes'].get(fileFullPath)
+    if index is None:
+        index = writeBackState['indexes'][fileFullPath] = len(ops)
+        ops.append(None)
+    ops[index] = {'op': opType, 'path': fileFullPath, 'root': entry['root'], 'relPath': entry['relPath'],
+                  'staged': None if stagedFile is None else os.path.basename(stagedFile),
+                  'original': '%d.orig' % index}
+
+
+# Save the journal of the write-back. The journal is the commit point: once it is saved, an interrupted write-back
+# is rolled forward by recoverWriteBack(), before that nothing has been changed.
+def saveWriteJournal(stagingDir, ops):
+    journalFile = os.path.join(stagingDir, WriteJournalName)
+    tempFile = journalFile + 'temp'
+    fp = open(tempFile, 'w')
+    try:
+        # dumps() uses the C encoder without indent, which is much faster for a big journal
+        fp.write(json.dumps({'time': getReadableTime(), 'ops': ops}, separators=(',', ':'), sort_keys=True))
+        fp.flush()
+        os.fsync(fp.fileno())
+    finally:
+        fp.close()
+    os.rename(tempFile, journalFile)
+
+
+# Apply the ops of a journal, or put the originals back if isRollBack is True. Every op can be applied again:
+# a staged file is gone once it is moved into the project, and an original is gone once it is put back.
+def applyWriteOps(stagingDir, ops, isRollBack):
+    if isRollBack:
+        for op in reversed(ops):
+            originalFile = os.path.join(stagingDir, op['original'])
+            if os.path.exists(originalFile):
+                replaceWithTempFile(originalFile, op['path'])
+        return
+    for op in ops:
+        if op['op'] == 'replace':
+            stagedFile = os.path.join(stagingDir, op['staged'])
+            if os.path.exists(stagedFile):
+                replaceWithTempFile(stagedFile, op['path'])
+        elif os.path.exists(op['path']):
+            os.remove(op['path'])
+
+
+# Apply all staged changes in one batch. The originals are linked into the staging folder and kept in the backup
+# snapshot, then the journal is saved, then the files are replaced and removed.
+def commitWriteBack():
+    stagingDir = writeBackState['dir']
+    ops = writeBackState['ops']
+    if stagingDir is None or len(ops) == 0:
+        return
+    for op in ops:
+        linkFile(op['path'], os.path.join(stagingDir, op['original']))
+        backupFile(op)
+    saveWriteJournal(stagingDir, ops)
+    writeBackState['isCommitting'] = True
+    applyWriteOps(stagingDir, ops, False)
+    writeBackState['isCommitting'] = False
+    replacedCount = len([op for op in ops if op['op'] == 'replace'])
+    addLog('write-back: %d files replaced, %d files removed' % (replacedCount, len(ops) - replacedCount))
+    writeBackState.update({'ops': [], 'indexes': {}})
+
+
+# Finish the write-back of this run and remove the staging folder. If the write-back is interrupted after its
+# journal is saved, the staging folder is kept for recoverWriteBack().
+def closeWriteBack():
+    stagingDir = writeBackState['dir']
+    if stagingDir is None:
+        return
+    writeBackState['dir'] = None
+    if writeBackState['isCommitting']:
+        addLog('the write-back is interrupted, run with --recover to finish it or --recover back to undo it')
+        return
+    shutil.rmtree(stagingDir)
+
+
+# Finish a write-back interrupted by an error or a kill. If its journal was saved, the changes are rolled forward,
+# or rolled back to the originals if isRollBack is True. Otherwise nothing was changed, and the staged files are
+# dropped. A folder which is not a staging folder is left alone. Return True if a write-back was rolled forward
+# or back.
+def recoverWriteBack(stagingDir, isRollBack=False):
+    if not os.path.isdir(stagingDir):
+        return False
+    if not isStagingDir(stagingDir):
+        addLog('warning: %s is not a staging folder of AndroidResCleaner, it is left alone' % stagingDir)
+        return False
+    journalFile = os.path.join(stagingDir, WriteJournalName)
+    isRecovered = os.path.isfile(journalFile)
+    if isRecovered:
+        fp = open(journalFile, 'r')
+        try:
+            journal = json.load(fp)
+        finally:
+            fp.close()
+        ops = [loadPlanEntry(op) for op in journal['ops']]
+        applyWriteOps(stagingDir, ops, isRollBack)
+        direction = 'back' if isRollBack else 'forward'
+        addLog('the write-back of %d files interrupted at %s is rolled %s' % (len(ops), journal['time'], direction))
+        addReport('recovered', files=len(ops), direction=direction, journal=journal['time'])
+    shutil.rmtree(stagingDir)
+    return isRecovered
+
+
+# Get the bytes of '<' and '>' in the encoding of the content, every declaration starts and ends with them.
+# UTF-16 files have two bytes for every character.
+def getTagMarks(content):
+    if content.startswith(codecs.BOM_UTF16_LE):
+        return '<\x00', '>\x00'
+    if content.startswith(codecs.BOM_UTF16_BE):
+        return '\x00<', '\x00>'
+    return '<', '>'
+
+
+# Remove the byte ranges from the file content. If nothing else than whitespace is left on the lines of a range,
+# the whole lines are removed, including the newline. Ranges on the same line separated only by spaces are
+# removed together. Everything else in the file is kept byte for byte.
+def removeByteRanges(content, ranges):
+    # UTF-16 files have two bytes for every character, the ranges are removed from the decoded text
+    for (bom, encoding) in ((codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')):
+        if not content.startswith(bom):
+            continue
+        # the offsets of the ranges are at character boundaries, so the text between them is decoded by itself
+        offsets = sorted(set([len(bom), len(content)] + [offset for (start, end) in ranges for offset in (start, end)]))
+        textOffsets = {len(bom): 0}
+        pieces = []
+        for (start, end) in zip(offsets, offsets[1:]):
+            pieces.append(content[start:end].decode(encoding))
+            textOffsets[end] = textOffsets[start] + len(pieces[-1])
+        text = removeTextRanges(u''.join(pieces), [(textOffsets[start], textOffsets[end]) for (start, end) in ranges])
+        return bom + text.encode(encoding)
+    return removeTextRanges(content, ranges)
+
+
+# Remove the ranges from the text, see removeByteRanges()
+def removeTextRanges(content, ranges):
+    mergedRanges = []
+    for (start, end) in sorted(ranges):
+        if len(mergedRanges) != 0:
+            gap = content[mergedRanges[-1][1]:start]
+            if gap.strip(' \t') == '':
+                mergedRanges[-1][1] = max(end, mergedRanges[-1][1])
+                continue
+        mergedRanges.append([start, end])
+    pieces = []
+    lastEnd = 0
+    for (start, end) in mergedRanges:
+        lineStart = start
+        while lineStart > 0 and content[lineStart - 1] in ' \t':
+            lineStart -= 1
+        lineEnd = end
+        while lineEnd < len(content) and content[lineEnd] in ' \t':
+            lineEnd += 1
+        isLineStart = lineStart == 0 or content[lineStart - 1] in '\r\n'
+        isLineEnd = lineEnd == len(content) or content[lineEnd] in '\r\n'
+        if isLineStart and isLineEnd:
+            start = max(lineStart, lastEnd)
+            if content.startswith('\r\n', lineEnd):
+                end = lineEnd + 2
+            elif lineEnd < len(content):
+                end = lineEnd + 1
+            else:
+                end = lineEnd
+        pieces.append(content[lastEnd:start])
+        lastEnd = end
+    pieces.append(content[lastEnd:])
+    return ''.join(pieces)
+
+
+# Get the unused declarations of every values file, recorded by getConfiguredValueRes,
+# as a list of (entry, list of (type, name, start, end)). Only the files with unused declarations are in the list.
+def getRemovedDeclarations(inventory, unusedDict):
+    symbolTable = inventory['symbols']
+    removedFiles = []
+    for entry in inventory['res']:
+        declarations = entry.get('declarations')
+        if not declarations:
+            continue
+        removedItems = []
+        for (resType, itemName, start, end) in declarations:
+            mergedType = getMergedResType(resType)
+            if findSymbol(symbolTable, mergedType, itemName) in unusedDict.get(mergedType, ()):
+                removedItems.append((mergedType, itemName, start, end))
+        if len(removedItems) != 0:
+            removedFiles.append((entry, removedItems))
+    return removedFiles
+
+
+# Remove the unused value resources by the byte ranges of their declarations, recorded by getConfiguredValueRes.
+# Only the files which contain unused declarations are read and rewritten, and they are not parsed again.
+# If readers is greater than 0, the files are read by that many reader threads ahead of rewriting them.
+def removeUnusedValueRes(inventory, unusedDict, readers=0, workers=1):
+    removeDeclarations(getRemovedDeclarations(inventory, unusedDict), readers, workers)
+
+
+# Write the values files without the removed declarations to their staged files, used as the task of a worker
+# process. The files of the task are (path, size, hash, ranges, staged file), so every chunk only carries the ranges
+# of its own files. Return (state, bytes read, seconds) for every file, the state is 'stale' if the file is not
+# the file that was scanned, 'empty' if nothing is left in it, or 'rewritten'.
+# If the entry has the hash of the content, e.g. in a plan, the content must have the same hash.
+def stageRewrites(task):
+    stagedResults = []
+    for ((fileFullPath, size, fileHash, ranges, stagedFile), content) in getTaskFiles(task):
+        startTime = time.time()
+        if content is None:
+            fp = open(fileFullPath, 'rb')
+            content = fp.read()
+            fp.close()
+        # The ranges are only valid for the content that was scanned
+        isStale = len(content) != size
+        (openMark, closeMark) = getTagMarks(content)
+        for (start, end) in ranges:
+            if isStale or end is None or not content.startswith(openMark, start) \
+                    or content[end - len(closeMark):end] != closeMark:
+                isStale = True
+                break
+        if not isStale and fileHash is not None:
+            isStale = hashlib.sha1(content).hexdigest() != fileHash
+        if isStale:
+            stagedResults.append(('stale', len(content), time.time() - startTime))
+            continue
+        fp = open(stagedFile, 'wb')
+        fp.write(removeByteRanges(content, ranges))
+        fp.close()
+        state = 'empty' if isEmptyXML(stagedFile) else 'rewritten'
+        stagedResults.append((state, len(content), time.time() - startTime))
+    return stagedResults
+
+
+# Remove the declarations of getRemovedDeclarations() from the values files by their byte ranges.
+# The new contents are written to the staging folder of the write-back by worker processes if workers is greater
+# than 1, the files are replaced when the write-back is committed. A file is skipped if it is not the file that was
+# scanned, and a file with nothing left in it is removed. If readers is greater than 0 and there are no worker
+# processes, the files are read by that many reader threads ahead of rewriting them.
+def removeDeclarations(removedFiles, readers=0, workers=1):
+    rewrites = [(entry['path'], entry['size'], entry.get('hash'), [(start, end) for (_, _, start, end) in removedItems],
+                 getStagedFile()) for (entry, removedItems) in removedFiles]
+    if readers > 0 and workers <= 1:
+        contents = prefetchFiles([entry['path'] for (entry, _) in removedFiles],
+                                 [entry['size'] for (entry, _) in removedFiles], readers)
+        stagedResults = []
+        for (rewrite, content) in itertools.izip(rewrites, contents):
+            stagedResults.extend(stageRewrites((None, [rewrite], [content])))
+    else:
+        stagedResults = mapFileChunks(stageRewrites, None, rewrites, workers)
+    for ((entry, removedItems), rewrite, (state, bytesRead, seconds)) in zip(removedFiles, rewrites, stagedResults):
+        addLog('processing file ' + entry['relPath'])
+        if state == 'stale':
+            addLog(' file has been changed since it was scanned, skipped')
+            addReport('skipped', file=entry['relPath'], root=entry['root'], reason='changed since it was scanned')
+            continue
+        for (resType, itemName, _, _) in removedItems:
+            addLog(' remove item ' + itemName)
+            addReport('removed', type=resType, name=itemName, file=entry['relPath'], root=entry['root'])
+        stageWriteOp(entry, 'replace', rewrite[4])
+        addFileMetrics(entry, seconds, bytesRead)
+        addLog(' save file')
+        # If the file is empty, remove the file
+        if state == 'empty':
+            stageWriteOp(entry, 'remove')
+            addLog(entry['relPath'] + ' is empty and has been removed')
+            addReport('fileRemoved', file=entry['relPath'], root=entry['root'], reason='empty')
+
+
+# Remove the unused value resources by rewriting the files with minidom, the old way to remove value resources.
+def removeUnusedValueResByDom(inventory, unusedDict):
+    symbolTable = inventory['symbols']
+    # Iterate through all xml files in the resource folders
+    for entry in inventory['res']:
+        # Ignore non xml file
+        if not entry['fileName'].endswith('.xml'):
+            continue
+        isChanged = False
+        # Parser xml file
+        fileFullPath = entry['path']
+        startTime = time.time()
+        dom = xml.dom.minidom.parse(fileFullPath)
+        root = dom.documentElement
+        for (unusedType, unusedList) in unusedDict.items():
+            # Find all nodes in xml with specific types
+            dimenItems = root.getElementsByTagName(unusedType)
+            for item in dimenItems:
+                itemName = item.getAttribute('name')
+                if itemName is not None and findSymbol(symbolTable, unusedType, itemName) in unusedList:
+                    root.removeChild(item)
+                    if not isChanged:
+                        addLog('processing file ' + entry['relPath'])
+                        isChanged = True
+                    addLog(' remove item ' + itemName)
+                    addReport('removed', type=unusedType, name=itemName, file=entry['relPath'], root=entry['root'])
+            # Find all item nodes in xml
+            itemItems = root.getElementsByTagName('item')
+            for item in itemItems:
+                # record the name if the type equals with the resource type
+                if item.getAttribute('type') == unusedType:
+                    itemName = item.getAttribute('name')
+                    if itemName is not None and findSymbol(symbolTable, unusedType, itemName) in unusedList:
+                        root.removeChild(item)
+                        if not isChanged:
+                            addLog('processing file ' + entry['relPath'])
+                            isChanged = True
+                        addLog(' remove item ' + itemName)
+                        addReport('removed', type=unusedType, name=itemName, file=entry['relPath'], root=entry['root'])
+        # If the file is changed, we should save it.
+        if isChanged:
+            # Three steps:
+            # 1. save the changed xml to a staged file
+            # 2. format the staged file
+            # 3. replace the orginal file by the staged file when the write-back is committed
+            tempFile = getStagedFile()
+            destFile = codecs.open(tempFile, 'w', 'utf-8')
+            dom.writexml(destFile, encoding='utf-8')
+            destFile.close()
+            dom.unlink()
+            replaceNewline(fileFullPath, tempFile)
+            stageWriteOp(entry, 'replace', tempFile)
+            addLog(' save file')
+        else:
+            tempFile = fileFullPath
+            dom.unlink()
+        addFileMetrics(entry, time.time() - startTime, xmlParses=1)
+        # If the file is empty, remove the file
+        if isEmptyXML(tempFile):
+            stageWriteOp(entry, 'remove')
+            addLog(entry['relPath'] + ' is empty and has been removed')
+            addReport('fileRemoved', file=entry['relPath'], root=entry['root'], reason='empty')
+
+
+# Get the files to remove, as a list of (entry, type). The files with invalid names of the types are also removed.
+def getRemovedFiles(inventory, unusedDict):
+    symbolTable = inventory['symbols']
+    removedFiles = []
+    for (unusedType, unusedList) in unusedDict.items():
+        # Iterate through all files in the folders of the type
+        for entry in getTypedResEntries(inventory, unusedType):
+            # Remove if the file is invalid or unused
+            if not entry['isValid'] or findSymbol(symbolTable, unusedType, entry['name']) in unusedList:
+                removedFiles.append((entry, unusedType))
+    return removedFiles
+
+
+def removeUnusedFileRes(inventory, unusedDict):
+    removeResFiles(getRemovedFiles(inventory, unusedDict))
+
+
+# Remove the files of getRemovedFiles() when the write-back is committed. If the entry of a file has the hash of
+# the content, e.g. in a plan, the file is skipped if it doesn't have the same content any more.
+def removeResFiles(removedFiles):
+    for (entry, unusedType) in removedFiles:
+        fileName = entry['fileName']
+        if entry.get('hash') is not None:
+            if not os.path.isfile(entry['path']) or os.path.getsize(entry['path']) != entry['size'] \
+                    or getFileHash(entry['path']) != entry['hash']:
+                addLog(fileName + ' has been changed since it was scanned, skipped')
+                addReport('skipped', file=entry['relPath'], root=entry['root'], reason='changed since it was scanned')
+                continue
+        stageWriteOp(entry, 'remove')
+        if not entry['isValid']:
+            addLog(fileName + ' is invalid ' + unusedType + ', and has been removed')
+            addReport('fileRemoved', file=entry['relPath'], root=entry['root'], reason='invalid ' + unusedType)
+        else:
+            addLog(fileName + ' is unused drawable, and has been removed')
+            addReport('removed', type=unusedType, name=entry['name'], file=entry['relPath'], root=entry['root'])
+
+
+# The version of the plan format. Increase it when the content of the plan changes.
+PlanVersion = 1
+
+
+# Get the part of an inventory entry kept in the plan, with the hash of the content of the file
+# The entries merged from shards already have the hash of the content when the file was scanned.
+def getPlanEntry(entry):
+    planEntry = dict([(key, entry[key]) for key in ('path', 'root', 'relPath', 'fileName', 'folder', 'size')])
+    planEntry['hash'] = entry['hash'] if 'hash' in entry else getFileHash(entry['path'])
+    return planEntry
+
+
+# Save the removal plan: the unused declarations of every values file with their byte ranges, and the files to remove.
+# Every file has the hash of its content, so applying the plan later skips the files changed since the scan.
+def savePlan(inventory, unusedValueDict, unusedFileDict, projectDir, planFile):
+    valueFiles = []
+    for (entry, removedItems) in getRemovedDeclarations(inventory, unusedValueDict):
+        planEntry = getPlanEntry(entry)
+        planEntry['declarations'] = [{'type': resType, 'name': itemName, 'start': start, 'end': end}
+                                     for (resType, itemName, start, end) in removedItems]
+        valueFiles.append(planEntry)
+    resFiles = []
+    for (entry, unusedType) in getRemovedFiles(inventory, unusedFileDict):
+        planEntry = getPlanEntry(entry)
+        planEntry.update({'type': unusedType, 'name': entry['name'], 'isValid': entry['isValid']})
+        resFiles.append(planEntry)
+    plan = {'version': PlanVersion, 'time': getReadableTime(), 'projectDir': projectDir, 'valueFiles': valueFiles,
+            'resFiles': resFiles}
+    fp = open(planFile, 'w')
+    try:
+        fp.write(json.dumps(plan, indent=2, sort_keys=True))
+    finally:
+        fp.close()
+    addLog('plan: %d declarations in %d values files, %d files to remove, saved to %s' % (
+        sum([len(planEntry['declarations']) for planEntry in valueFiles]), len(valueFiles), len(resFiles), planFile))
+
+
+# Convert the strings of a plan entry loaded by json from unicode back to the utf-8 byte strings of the inventory
+def loadPlanEntry(planEntry):
+    entry = {}
+    for (key, value) in planEntry.items():
+        entry[key.encode('utf-8')] = value.encode('utf-8') if isinstance(value, unicode) else value
+    return entry
+
+
+# Apply a removal plan saved by an earlier run, without scanning the project again. Only the files in the plan are
+# read, and the files changed since the plan was saved are skipped.
+def applyPlan(configParser, planFile):
+    if planFile == '' or not os.path.isfile(planFile):
+        raise RuntimeError('no plan file to apply: ' + planFile)
+    fp = open(planFile, 'r')
+    try:
+        plan = json.load(fp)
+    finally:
+        fp.close()
+    if plan.get('version') != PlanVersion:
+        raise RuntimeError('%s is not a plan of this version of AndroidResCleaner, run it again to save a new plan'
+                           % planFile)
+    projectDir = plan['projectDir'].encode('utf-8')
+    isBackup = getConfigOption(configParser, 'AndroidClean', 'Backup', 'false').lower() == 'true'
+    addLog('apply plan %s of %s, saved at %s' % (planFile, projectDir, plan['time']))
+    addReport('project', projectDir=projectDir, plan=planFile, remove=True)
+    stagingDir = getStagingDir(configParser, projectDir)
+    recoverWriteBack(stagingDir)
+    beginPhase('removal')
+    if isBackup:
+        openBackup(getBackupDir(configParser), projectDir,
+                   getConfigOption(configParser, 'Backup', 'Archive', 'false').lower() == 'true')
+    try:
+        openWriteBack(stagingDir)
+        removedFiles = []
+        for planEntry in plan['valueFiles']:
+            removedItems = [(item['type'].encode('utf-8'), item['name'].encode('utf-8'), item['start'], item['end'])
+                            for item in planEntry['declarations']]
+            removedFiles.append((loadPlanEntry(planEntry), removedItems))
+        removeDeclarations(removedFiles, getReaderCount(configParser), getWorkerCount(configParser))
+        removeResFiles([(loadPlanEntry(planEntry), planEntry['type'].encode('utf-8'))
+                        for planEntry in plan['resFiles']])
+        commitWriteBack()
+    finally:
+        closeWriteBack()
+        closeBackup()
+    endPhase()
+
+
+# Match the tag and the name attribute of a line, such as <string name="app_name">
+alignNameRegex = re.compile(r'<([\w:.-]+)\s[^>]*?\bname\s*=\s*["\']([^"\']*)["\']')
+
+
+# Get the key of a line to align the original file with the file written by minidom.
+# minidom may reorder the attributes and change the escaping, so a line with a name attribute is keyed
+# by its tag and name, and the other lines are keyed by the unescaped text.
+def getAlignKey(line):
+    match = alignNameRegex.match(line)
+    if match is not None:
+        return match.group(1), match.group(2)
+    return xml.sax.saxutils.unescape(line, {'&quot;': '"', '&apos;': "'"})
+
+
+# Find the unique keys in a range of a key list, return a dict of key -> position
+def getUniqueKeys(keys, lo, hi):
+    positions = {}
+    for pos in range(lo, hi):
+        key = keys[pos]
+        if key in positions:
+            positions[key] = None
+        else:
+            positions[key] = pos
+    return positions
+
+
+# Get the longest increasing subsequence of the pairs by the first item, the pairs are sorted by the second item
+def getLongestIncreasing(pairs):
+    tails = []
+    tailValues = []
+    previous = [None] * len(pairs)
+    for (index, pair) in enumerate(pairs):
+        pos = bisect.bisect_left(tailValues, pair[0])
+        if pos > 0:
+            previous[index] = tails[pos - 1]
+        if pos == len(tails):
+            tails.append(index)
+            tailValues.append(pair[0])
+        else:
+            tails[pos] = index
+            tailValues[pos] = pair[0]
+    result = []
+    index = tails[-1] if len(tails) != 0 else None
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+
+# Align two key lists with the patience diff algorithm, return the list of matched (srcPos, destPos).
+# The common prefix is matched first, then the keys that are unique in both ranges are used as anchors,
+# and the ranges between the anchors are aligned in the same way. A range without any anchor is matched greedily.
+# Like the old forward scan, the earliest lines are preferred, so common suffixes are not matched first.
+# The names of value resources are unique, so almost every range is split by anchors, and the time is O(n log n).
+def alignKeys(srcKeys, destKeys):
+    matches = []
+    ranges = [(0, len(srcKeys), 0, len(destKeys))]
+    while len(ranges) != 0:
+        (srcLo, srcHi, destLo, destHi) = ranges.pop()
+        while srcLo < srcHi and destLo < destHi and srcKeys[srcLo] == destKeys[destLo]:
+            matches.append((srcLo, destLo))
+            srcLo += 1
+            destLo += 1
+        if srcLo >= srcHi or destLo >= destHi:
+            continue
+        srcUnique = getUniqueKeys(srcKeys, srcLo, srcHi)
+        destUnique = getUniqueKeys(destKeys, destLo, destHi)
+        anchors = []
+        for (key, destPos) in destUnique.items():
+            srcPos = srcUnique.get(key)
+            if destPos is not None and srcPos is not None:
+                anchors.append((srcPos, destPos))
+        anchors.sort(key=lambda anchor: anchor[1])
+        anchors = getLongestIncreasing(anchors)
+        if len(anchors) == 0:
+            # No anchor, match every dest key with the next equal src key
+            srcPos = srcLo
+            for destPos in range(destLo, destHi):
+                while srcPos < srcHi and srcKeys[srcPos] != destKeys[destPos]:
+                    srcPos += 1
+                if srcPos == srcHi:
+                    break
+                matches.append((srcPos, destPos))
+                srcPos += 1
+            continue
+        matches.extend(anchors)
+        lastSrc = srcLo
+        lastDest = destLo
+        for (srcPos, destPos) in anchors:
+            ranges.append((lastSrc, srcPos, lastDest, destPos))
+            lastSrc = srcPos + 1
+            lastDest = destPos + 1
+        ranges.append((lastSrc, srcHi, lastDest, destHi))
+    matches.sort()
+    return matches
+
+
+# Get the dest lines to remove in a gap between two aligned lines. All lines in the dest gap are empty lines,
+# some of them are left by the removed nodes, and the others are the empty lines of the original file.
+# If the two files have the same line count, every removed node was a single line and left an empty line at its
+# place. Otherwise the empty lines at the beginning of the gap and before the next aligned line are kept.
+def getRemovedGapLines(srcGap, destGap, destStart, isSameLineCount):
+    removedLines = []
+    if isSameLineCount and len(srcGap) == len(destGap):
+        for index in range(len(srcGap)):
+            if srcGap[index].strip() != "":
+                removedLines.append(destStart + index)
+        return removedLines
+    leadCount = 0
+    while leadCount < len(srcGap) and leadCount < len(destGap) and srcGap[leadCount].strip() == "":
+        leadCount += 1
+    trailCount = 0
+    while trailCount < len(srcGap) - leadCount and srcGap[len(srcGap) - 1 - trailCount].strip() == "":
+        trailCount += 1
+    for index in range(leadCount, len(destGap) - trailCount):
+        removedLines.append(destStart + index)
+    return removedLines
+
+
+# minidom have three problems after removeChild and writexml
+# 1. the file encoding statement and the first item are at the same line
+# 2. the file newline would be \n, no matter what the original file newline is
+# 3. the position at the remove node would retain an empty line
+# this function is used to solve the three problems
+# The lines of the two files are aligned by alignKeys(), every not empty line in the dest file
+# must be aligned to a line of the original file, and the empty lines between them are fixed by getRemovedGapLines().
+def replaceNewline(srcFile, destFile):
+    if os.path.exists(srcFile) and os.path.exists(destFile):
+        srcfp = open(srcFile, 'rU')
+        srcLines = srcfp.readlines()
+        srcNewl = srcfp.newlines
+        srcfp.close()
+
+        destfp = open(destFile, 'rU')
+        destLines = destfp.readlines()
+        destfp.close()
+        # split the first line at ?> to two lines，or remove the encoding part if the original file haven't this
+        if len(destLines) != 0:
+            line0 = destLines[0]
+            index = line0.find('?>')
+            if index != -1 and index != len(line0) - 2:
+                assert len(srcLines) != 0
+                if srcLines[0].strip().startswith('<?xml version'):
+                    destLines[0] = line0[:index+2] + '\n'
+                    destLines.insert(1, line0[index+2:])
+                else:
+                    destLines[0] = line0[index+2:]
+        if len(destLines) > len(srcLines):
+            raise RuntimeError('%s: the rewritten file has %d lines, more than the %d lines of the original file'
+                               % (srcFile, len(destLines), len(srcLines)))
+
+        # align the not empty lines
+        srcPositions = [index for index in range(len(srcLines)) if srcLines[index].strip() != ""]
+        destPositions = [index for index in range(len(destLines)) if destLines[index].strip() != ""]
+        srcKeys = [getAlignKey(srcLines[index].strip()) for index in srcPositions]
+        destKeys = [getAlignKey(destLines[index].strip()) for index in destPositions]
+        matches = alignKeys(srcKeys, destKeys)
+        if len(matches) != len(destKeys):
+            matchedDest = set([destPos for (_, destPos) in matches])
+            for destPos in range(len(destKeys)):
+                if destPos not in matchedDest:
+                    raise RuntimeError('%s: line %d of the rewritten file cannot be found in the original file: %s'
+                                       % (srcFile, destPositions[destPos] + 1, destLines[destPositions[destPos]].strip()))
+
+        # fix the empty lines between the aligned lines
+        isSameLineCount = len(srcLines) == len(destLines)
+        removedLines = []
+        lastSrc = -1
+        lastDest = -1
+        anchors = [(srcPositions[srcPos], destPositions[destPos]) for (srcPos, destPos) in matches]
+        anchors.append((len(srcLines), len(destLines)))
+        for (srcIndex, destIndex) in anchors:
+            srcGap = srcLines[lastSrc + 1:srcIndex]
+            destGap = destLines[lastDest + 1:destIndex]
+            removedLines.extend(getRemovedGapLines(srcGap, destGap, lastDest + 1, isSameLineCount))
+            lastSrc = srcIndex
+            lastDest = destIndex
+
+        for lineNum in removedLines[::-1]:
+            del destLines[lineNum]
+
+        # restore the newline of the original file, if it has only one kind of newline
+        if srcNewl is None or not isinstance(srcNewl, str):
+            srcNewl = '\n'
+        destLines = [lineStr[:-1] + srcNewl if lineStr.endswith('\n') else lineStr for lineStr in destLines]
+
+        destfp = open(destFile, 'wb')
+        destfp.writelines(destLines)
+        destfp.close()
+
+
+def isEmptyXML(xmlFileName):
+    fp = open(xmlFileName, 'r')
+    isEmpty = True
+    for fileLine in fp:
+        stripedLine = fileLine.strip()
+        if stripedLine != "" \
+                and not stripedLine.startswith('<?xml version')\
+                and not stripedLine.startswith('<resources')\
+                and not stripedLine.startswith('</resources>')\
+                and not stripedLine.startswith('<!--'):
+            isEmpty = False
+            break
+    return isEmpty
+
+
+# Remove the duplicated paths from a list, two paths are the same if they have the same real path.
+# The first path is kept, in the order of the list.
+def dedupePaths(pathList):
+    realPaths = set()
+    uniquePaths = []
+    for path in pathList:
+        realPath = os.path.realpath(path)
+        if realPath not in realPaths:
+            realPaths.add(realPath)
+            uniquePaths.append(path)
+    return uniquePaths
+
+
+# The folders which are never modules, they are not searched for modules
+NonModuleFolders = ('build', 'bin', 'gen', 'src', 'res', 'assets', 'libs', 'node_modules')
+# A quoted module path in an include of settings.gradle, such as ':app' or ':libs:core'
+includeRegex = re.compile(r'''['"](:?[\w.-]+(?::[\w.-]+)*)['"]''')
+# The folder of a module set in settings.gradle, such as project(':core').projectDir = new File('libs/core')
+projectDirRegex = re.compile(r'''project\(\s*['"](:?[\w.:-]+)['"]\s*\)\.projectDir\s*=\s*(?:new\s+File|file)\(\s*'''
+                             r'''(?:(?:rootDir|settingsDir|rootProject\.projectDir)\s*,\s*)?['"]([^'"]+)['"]\s*\)''')
+
+
+# Find the module folders of a workspace, the workspace folder itself is the first one. The modules are read from
+# the includes of settings.gradle, or found by searching the folders for projects if there is no settings.gradle.
+def getWorkspaceModules(workspaceDir):
+    moduleDirs = [workspaceDir]
+    settingsFile = os.path.join(workspaceDir, 'settings.gradle')
+    if not os.path.exists(settingsFile):
+        settingsFile += '.kts'
+    if os.path.exists(settingsFile):
+        fp = open(settingsFile, 'r')
+        try:
+            settingsLines = [settingsLine.split('//')[0].strip() for settingsLine in fp]
+        finally:
+            fp.close()
+        projectDirs = {}
+        moduleNames = []
+        # an include goes on in the next line after a ',' or an open '(', e.g. include ':app',\n    ':lib'
+        isInclude = False
+        for settingsLine in settingsLines:
+            for (moduleName, moduleDir) in projectDirRegex.findall(settingsLine):
+                projectDirs[':' + moduleName.lstrip(':')] = moduleDir
+            if settingsLine.startswith('include'):
+                isInclude = True
+                openCount = 0
+            if isInclude:
+                moduleNames.extend([':' + moduleName.lstrip(':') for moduleName in includeRegex.findall(settingsLine)])
+                openCount += settingsLine.count('(') - settingsLine.count(')')
+                isInclude = settingsLine.endswith(',') or settingsLine.endswith('(') or openCount > 0
+        for moduleName in moduleNames:
+            moduleDir = projectDirs.get(moduleName, moduleName[1:].replace(':', '/'))
+            moduleDirs.append(os.path.normpath(os.path.join(workspaceDir, moduleDir.replace('/', os.path.sep))))
+        return moduleDirs
+    for (parent, folders, _) in os.walk(workspaceDir):
+        folders[:] = sorted([folder for folder in folders
+                             if not folder.startswith('.') and folder not in NonModuleFolders])
+        if parent != workspaceDir and (isEclipseProject(parent) or isAndroidStudioProject(parent)):
+            moduleDirs.append(parent)
+    return moduleDirs
+
+
+# Get the resource folders, source code folders and manifest files of all modules in a workspace.
+# The modules without resource or source code folders, e.g. the root project, are fine, only the existing folders
+# are used. A folder shared by several modules, or linked into them, is only in the lists once.
+def getWorkspacePaths(workspaceDir):
+    resPathList = []
+    srcPathList = []
+    manifestPathList = []
+    for moduleDir in dedupePaths(getWorkspaceModules(workspaceDir)):
+        isEclipse = isEclipseProject(moduleDir)
+        if not isEclipse and not isAndroidStudioProject(moduleDir):
+            continue
+        addLog('module: ' + moduleDir)
+        resPathList.extend([resPath for resPath in getResPathList(isEclipse, moduleDir) if os.path.isdir(resPath)])
+        srcPathList.extend([srcPath for srcPath in getSrcPathList(isEclipse, moduleDir) if os.path.isdir(srcPath)])
+        manifestPathList.extend(getManifestPathList(isEclipse, moduleDir))
+    if len(resPathList) == 0:
+        raise RuntimeError('Cannot find any module with resources in the workspace ' + workspaceDir)
+    return dedupePaths(resPathList), dedupePaths(srcPathList), dedupePaths(manifestPathList)
+
+
+# Check the project, and get its resource folders, source code folders and manifest files.
+# If isWorkspace is True, the project dir is a workspace, and the folders of all its modules are returned.
+def getProjectPaths(projectDir, isWorkspace=False):
+    # project dir is not exist, raise exception
+    if not os.path.exists(projectDir):
+        raise RuntimeError('Invalid project directory')
+    if isWorkspace:
+        return getWorkspacePaths(projectDir)
+    # Check whether the project is Eclipse or Android Studio
+    isEclipse = isEclipseProject(projectDir)
+    isAndroidStudio = isAndroidStudioProject(projectDir)
+    # not Eclipse project，and not Android Studio project, raise exception
+    if not isEclipse and not isAndroidStudio:
+        raise RuntimeError('Unknown project type')
+
+    # get the resource folder and source code folder in the project
+    resPathList = getResPathList(isEclipse, projectDir)
+    srcPathList = getSrcPathList(isEclipse, projectDir)
+    manifestPathList = getManifestPathList(isEclipse, projectDir)
+    for resPath in resPathList:
+        if not os.path.exists(resPath):
+            raise RuntimeError('Cannot find resPath ' + resPath)
+    for srcPath in srcPathList:
+        if not os.path.exists(srcPath):
+            raise RuntimeError('Cannot find src path ' + srcPath)
+    # sourceSets may list a folder twice
+    return dedupePaths(resPathList), dedupePaths(srcPathList), manifestPathList
+
+
+# Check whether the project dir in the config is a workspace of several modules
+def isWorkspaceProject(configParser):
+    return getConfigOption(configParser, 'Dir', 'Workspace', 'false').lower() == 'true'
+
+
+# Get the number of worker processes from the config, 1 means scanning in this process
+def getWorkerCount(configParser):
+    workers = int(getConfigOption(configParser, 'Performance', 'Workers', '1'))
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    return workers
+
+
+# Check whether the usage scan is demand-driven, it only works without deep search
+def isDemandDriven(configParser):
+    return getConfigOption(configParser, 'Performance', 'DemandDriven', 'false').lower() == 'true'
+
+
+# Get the number of reader threads which prefetch the files, 0 reads every file where it is processed
+def getReaderCount(configParser):
+    return max(int(getConfigOption(configParser, 'Performance', 'Readers', '0')), 0)
+
+
+# Get the signature of the scan index, which describes how the files are scanned
+def getScanIndexSignature():
+    return '%s|%s|%s' % (RClassName, ','.join(sorted(ValueTypes)), ','.join(sorted(AllTypes)))
+
+
+# Find the unused resources in the inventory, return the unused value resources and the unused file resources
+# In demand-driven mode without deep search, the usage scan stops when all declared resources are used.
+def findUnusedRes(inventory, workers, scanIndex, isDeepSearch, readers=0, isDemandDriven=False):
+    beginPhase('declarations')
+    configuredValueRes = getConfiguredValueRes(inventory, ValueTypes, workers, scanIndex, readers)
+    configuredFileRes = getConfiguredFileRes(inventory, FileTypes)
+
+    # merge integer-array list and string-array list with array list
+    mergeArrayRes(configuredValueRes)
+    endPhase()
+
+    # get use resource
+    beginPhase('usage')
+    if isDemandDriven and not isDeepSearch:
+        usedResDict = getUsedResOnDemand(inventory, AllTypes, (configuredValueRes, configuredFileRes), workers,
+                                         scanIndex, readers)
+    else:
+        usedResDict = getUsedRes(inventory, AllTypes, workers, scanIndex, isDeepSearch, readers)
+    endPhase()
+
+    # get unused resources
+    beginPhase('diff')
+    unusedValueResDict = getUnusedRes(configuredValueRes, usedResDict)
+    unusedFileResDict = getUnusedRes(configuredFileRes, usedResDict)
+    endPhase()
+    return unusedValueResDict, unusedFileResDict
+
+
+# An index of the resources of a project, for using AndroidResCleaner from other python code, e.g.
+#     index = ResourceIndex('/path/to/project')
+#     for name in index.unused('drawable'):
+#         print name, index.declarations('drawable', name)
+# Nothing is scanned until it is asked for, and the results are kept for the next questions.
+# Without deep search, the references are scanned for every type separately, so a question about one type
+# only scans the references of that type. Deep search needs the references of all types at once.
+# The index doesn't see the changes of the project after the files are scanned.
+class ResourceIndex(object):
+    def __init__(self, projectDir, isDeepSearch=False, workers=1, readers=0, isWorkspace=False):
+        self.isDeepSearch = isDeepSearch
+        self.workers = workers
+        self.readers = readers
+        (resPathList, srcPathList, manifestPathList) = getProjectPaths(projectDir, isWorkspace)
+        self.inventory = buildInventory(resPathList, srcPathList, manifestPathList)
+        self.isValueScanned = False
+        # {type: {name: set of files}} for every type whose references are scanned
+        self.typeRefs = {}
+        # The used resources of all types, found by deep search
+        self.deepUsedRes = None
+
+    # Parse the values files for declarations, the files are parsed only once for all value types
+    def scanValueDeclarations(self):
+        if not self.isValueScanned:
+            getConfiguredValueRes(self.inventory, ValueTypes, self.workers, None, self.readers)
+            self.isValueScanned = True
+
+    # Get the declarations of a resource, as a list of dicts with the file, its qualifier,
+    # and the byte range of the declaration in the values file
+    def declarations(self, resType, name):
+        declarationList = []
+        if resType in FileTypes:
+            for entry in getTypedResEntries(self.inventory, resType):
+                if entry['isValid'] and entry['name'] == name:
+                    declarationList.append({'file': entry['path'], 'qualifier': entry['qualifier']})
+            return declarationList
+        self.scanValueDeclarations()
+        for entry in self.inventory['res']:
+            for (declaredType, itemName, start, end) in entry.get('declarations', ()):
+                if itemName == name and getMergedResType(declaredType) == resType:
+                    declarationList.append({'file': entry['path'], 'qualifier': entry['qualifier'],
+                                            'start': start, 'end': end})
+        return declarationList
+
+    # Get the names of the declared resources of a type
+    def getDeclaredNames(self, resType):
+        if resType in FileTypes:
+            return set([entry['name'] for entry in getTypedResEntries(self.inventory, resType) if entry['isValid']])
+        self.scanValueDeclarations()
+        declaredNames = set()
+        for entry in self.inventory['res']:
+            for (declaredType, itemName, _, _) in entry.get('declarations', ()):
+                if getMergedResType(declaredType) == resType:
+                    declaredNames.add(itemName)
+        return declaredNames
+
+    # Scan the xml files, the manifest and the java files for the references of a type.
+    # Return {name: set of files which reference it}.
+    def getTypeRefs(self, resType):
+        refDic = self.typeRefs.get(resType)
+        if refDic is not None:
+            return refDic
+        refDic = {}
+        inventory = self.inventory
+        xmlEntries = [entry for entry in inventory['res'] if entry['fileName'].endswith('.xml')] + inventory['manifest']
+        javaEntries = [entry for entry in inventory['src'] if entry['fileName'].endswith('.java')]
+        for (func, entryList) in ((scanXmlFiles, xmlEntries), (scanJavaFiles, javaEntries)):
+            fileResults = getFileResults(func, (resType,), entryList, self.workers, None, 'used', self.readers)
+            for (entry, fileResult) in zip(entryList, fileResults):
+                # the xml results are {name: offsets}, the java results are lists of names
+                for resName in fileResult.get(resType, ()):
+                    refDic.setdefault(resName, set()).add(entry['path'])
+        self.typeRefs[resType] = refDic
+        return refDic
+
+    # Get the files which reference a resource, sorted by path
+    def references(self, resType, name):
+        return sorted(self.getTypeRefs(resType).get(name, ()))
+
+    # Get the names of the unused resources of a type, sorted by name
+    def unused(self, resType):
+        declaredNames = self.getDeclaredNames(resType)
+        if not self.isDeepSearch:
+            return sorted(declaredNames - set(self.getTypeRefs(resType).keys()))
+        if self.deepUsedRes is None:
+            self.scanValueDeclarations()
+            self.deepUsedRes = getUsedRes(self.inventory, AllTypes, self.workers, None, True, self.readers)
+        symbolTable = self.inventory['symbols']
+        usedNames = set([getSymbolName(symbolTable, symbolId) for symbolId in self.deepUsedRes.get(resType, ())])
+        return sorted(declaredNames - usedNames)
+
+
+# Write the unused resources to the log and the report, and save the removal plan if nothing is removed by this run
+def addUnusedResults(configParser, inventory, unusedValueResDict, unusedFileResDict, projectDir, isRemove):
+    # append the unused resources to log
+    addUnsedToLog(inventory['symbols'], unusedValueResDict)
+    addUnsedToLog(inventory['symbols'], unusedFileResDict)
+    addUnusedToReport(inventory, unusedValueResDict, unusedFileResDict)
+    unusedCounts = {}
+    for unusedDict in (unusedValueResDict, unusedFileResDict):
+        for (resType, idSet) in unusedDict.items():
+            unusedCounts[resType] = len(idSet)
+    addReport('summary', unused=unusedCounts)
+    # save what would be removed, it can be reviewed and applied later with --apply. A run which removes the
+    # resources doesn't save it, the plan would be stale as soon as it is saved and hashing every file is not free.
+    planFile = getConfigOption(configParser, 'Plan', 'File', '')
+    if planFile != '' and not isRemove:
+        savePlan(inventory, unusedValueResDict, unusedFileResDict, projectDir, planFile)
+
+
+def process():
+    configParser = getConfigParser()
+    if configParser is None:
+        return
+    # Get the configurations
+    projectDir = configParser.get('Dir', 'ProjectDir')
+    isRemove = configParser.get('AndroidClean', 'RemoveUnused')
+    isBackup = configParser.get('AndroidClean', 'Backup')
+    if isRemove.lower() == 'true':
+        isRemove = True
+    else:
+        isRemove = False
+    if isBackup.lower() == 'true':
+        isBackup = True
+    else:
+        isBackup = False
+    # offset removes the declarations from the original bytes, dom rewrites the files with minidom
+    removeMode = getConfigOption(configParser, 'AndroidClean', 'RemoveMode', 'offset').lower()
+    # Remove the resources which are only referenced by unused resources in the same run
+    isDeepSearch = getConfigOption(configParser, 'AndroidClean', 'DeepSearch', 'true').lower() == 'true'
+    workers = getWorkerCount(configParser)
+    readers = getReaderCount(configParser)
+    # Keep the scan results of every file in an index, so the next run only rescans the changed files
+    useIndex = getConfigOption(configParser, 'Index', 'Enabled', 'false').lower() == 'true'
+    indexCacheDir = getConfigOption(configParser, 'Index', 'CacheDir', '')
+    useIndexHash = getConfigOption(configParser, 'Index', 'ContentHash', 'false').lower() == 'true'
+    # finish the write-back of an interrupted run before the project is scanned, a dry run leaves it as it is
+    stagingDir = getStagingDir(configParser, projectDir)
+    if isRemove:
+        recoverWriteBack(stagingDir)
+    elif isStagingDir(stagingDir):
+        addLog('warning: the write-back in %s is interrupted, run with --recover to finish it' % stagingDir)
+
+    (resPathList, srcPathList, manifestPathList) = getProjectPaths(projectDir, isWorkspaceProject(configParser))
+    addLog('Project dir: ' + projectDir)
+    for resPath in resPathList:
+        addLog('res dir: ' + resPath)
+    for srcPath in srcPathList:
+        addLog('src dir: ' + srcPath)
+    for manifestFile in manifestPathList:
+        addLog('manifest: ' + manifestFile)
+    addReport('project', projectDir=projectDir, resDirs=resPathList, srcDirs=srcPathList, manifests=manifestPathList,
+              deepSearch=isDeepSearch, remove=isRemove)
+
+    # get configed resource
+    scanIndex = None
+    if useIndex:
+        indexFile = getScanIndexFile(indexCacheDir, projectDir)
+        scanIndex = loadScanIndex(indexFile, getScanIndexSignature(), useIndexHash)
+    # walk through the resource folders and source code folders only once
+    beginPhase('inventory')
+    inventory = buildInventory(resPathList, srcPathList, manifestPathList)
+    endPhase()
+    (unusedValueResDict, unusedFileResDict) = findUnusedRes(inventory, workers, scanIndex, isDeepSearch, readers,
+                                                            isDemandDriven(configParser))
+    refGraph = inventory['refGraph']
+    addLog('reference graph: %d roots, %d edges' % (
+        len(refGraph['roots']), sum([len(targetIds) for targetIds in refGraph['edges'].values()])))
+    if scanIndex is not None:
+        saveScanIndex(scanIndex, indexFile)
+        addLog('scan index: %d files, %d rescanned' % (len(scanIndex['files']), len(scanIndex['changed'])))
+    addUnusedResults(configParser, inventory, unusedValueResDict, unusedFileResDict, projectDir, isRemove)
+
+    # remove unused resources in the project
+    if isRemove:
+        beginPhase('removal')
+        # keep the originals of the changed and removed files in a snapshot of this run
+        if isBackup:
+            openBackup(getBackupDir(configParser), projectDir,
+                       getConfigOption(configParser, 'Backup', 'Archive', 'false').lower() == 'true')
+        try:
+            # the changes are staged and applied in one batch
+            openWriteBack(stagingDir)
+            tempDict = {}
+            for (unusedType, unusedList) in unusedValueResDict.items():
+                if len(unusedList) != 0:
+                    tempDict[unusedType] = unusedList
+            if len(tempDict) != 0:
+                if removeMode == 'dom':
+                    removeUnusedValueResByDom(inventory, unusedValueResDict)
+                else:
+                    removeUnusedValueRes(inventory, unusedValueResDict, readers, workers)
+
+            tempDict.clear()
+            for (unusedType, unusedList) in unusedFileResDict.items():
+                if len(unusedList) != 0:
+                    tempDict[unusedType] = unusedList
+            if len(tempDict) != 0:
+                removeUnusedFileRes(inventory, unusedFileResDict)
+            commitWriteBack()
+        finally:
+            closeWriteBack()
+            closeBackup()
+        endPhase()
+
+
+# The current result of watch mode, it is replaced after every change and read by the query socket
+watchState = {'json': '{}', 'declared': {}, 'unused': {}}
+
+
+# Get the fingerprint of the inventory, it changes if any file is added, removed or modified
+def getInventoryFingerprint(inventory):
+    return [(entry['path'], entry['size'], entry['mtime'])
+            for entry in inventory['res'] + inventory['src'] + inventory['manifest']]
+
+
+# Get the names of the resources for every type from the sets of symbol ids
+def getTypedNames(symbolTable, resDicList):
+    typedNames = {}
+    for resDic in resDicList:
+        for (resType, idSet) in resDic.items():
+            typedNames.setdefault(resType, set()).update([getSymbolName(symbolTable, symbolId) for symbolId in idSet])
+    return typedNames
+
+
+# Update the result of watch mode, and save it to the state file
+def updateWatchState(inventory, unusedValueResDict, unusedFileResDict, stateFile, updateCount, rescanCount):
+    symbolTable = inventory['symbols']
+    declared = getDeclaredNames(inventory)
+    unused = getTypedNames(symbolTable, (unusedValueResDict, unusedFileResDict))
+    state = {'time': getReadableTime(), 'updates': updateCount, 'rescanned': rescanCount,
+             'unused': dict([(resType, sorted(names)) for (resType, names) in unused.items()])}
+    stateJson = json.dumps(state, sort_keys=True)
+    # the whole state is replaced at once, the query socket never sees a half updated state
+    watchState.update({'json': stateJson, 'declared': declared, 'unused': unused})
+    if stateFile != '':
+        tempFile = stateFile + 'temp'
+        fp = open(tempFile, 'w')
+        fp.write(stateJson)
+        fp.close()
+        if os.path.exists(stateFile):
+            os.remove(stateFile)
+        os.rename(tempFile, stateFile)
+
+
+# Answer a query of the watch socket. A query is one line: 'unused' returns the current state,
+# '<type> <name>' returns whether the resource is used, unused or not declared.
+# It is called by SocketServer as the request handler.
+def handleWatchQuery(request, clientAddress, server):
+    query = request.makefile('r').readline().strip()
+    if query == '' or query == 'unused':
+        answer = watchState['json']
+    else:
+        (resType, _, resName) = query.partition(' ')
+        if resName in watchState['unused'].get(resType, ()):
+            resState = 'unused'
+        elif resName in watchState['declared'].get(resType, ()):
+            resState = 'used'
+        else:
+            resState = 'undeclared'
+        answer = json.dumps({'type': resType, 'name': resName, 'state': resState}, sort_keys=True)
+    request.sendall(answer + '\n')
+
+
+# Start the query socket on a local port in a background thread
+def startWatchServer(port):
+    server = SocketServer.ThreadingTCPServer(('127.0.0.1', port), handleWatchQuery)
+    server.daemon_threads = True
+    serverThread = threading.Thread(target=server.serve_forever)
+    serverThread.daemon = True
+    serverThread.start()
+    return server
+
+
+# Watch the project and keep the unused resources up to date, until it is interrupted.
+# The scan results are kept in memory, so only the changed files are scanned again after the first scan.
+# Nothing is removed in watch mode.
+def watchProject(configParser):
+    projectDir = configParser.get('Dir', 'ProjectDir')
+    isDeepSearch = getConfigOption(configParser, 'AndroidClean', 'DeepSearch', 'true').lower() == 'true'
+    workers = getWorkerCount(configParser)
+    readers = getReaderCount(configParser)
+    # The seconds between two polls of the project folders
+    interval = float(getConfigOption(configParser, 'Watch', 'Interval', '2'))
+    stateFile = getConfigOption(configParser, 'Watch', 'StateFile', '')
+    port = int(getConfigOption(configParser, 'Watch', 'Port', '0'))
+    (resPathList, srcPathList, manifestPathList) = getProjectPaths(projectDir, isWorkspaceProject(configParser))
+    addLog('watch project dir: ' + projectDir)
+    # start from the scan index of the last run if it is enabled
+    indexFile = None
+    if getConfigOption(configParser, 'Index', 'Enabled', 'false').lower() == 'true':
+        indexFile = getScanIndexFile(getConfigOption(configParser, 'Index', 'CacheDir', ''), projectDir)
+    scanIndex = loadScanIndex(indexFile, getScanIndexSignature(), False)
+    server = None
+    if port != 0:
+        server = startWatchServer(port)
+        addLog('watch query port: %d' % port)
+    lastFingerprint = None
+    updateCount = 0
+    try:
+        while True:
+            inventory = buildInventory(resPathList, srcPathList, manifestPathList)
+            fingerprint = getInventoryFingerprint(inventory)
+            if fingerprint != lastFingerprint:
+                # the metrics would grow forever, only the metrics of the last update are kept
+                resetMetrics()
+                scanIndex['seen'] = set()
+                scanIndex['changed'] = set()
+                (unusedValueResDict, unusedFileResDict) = findUnusedRes(inventory, workers, scanIndex, isDeepSearch,
+                                                                        readers, isDemandDriven(configParser))
+                evictScanIndex(scanIndex)
+                updateCount += 1
+                rescanCount = len(scanIndex['changed'])
+                updateWatchState(inventory, unusedValueResDict, unusedFileResDict, stateFile, updateCount,
+                                 rescanCount)
+                unusedCount = sum([len(idSet) for idSet in unusedValueResDict.values() + unusedFileResDict.values()])
+                addLog('%s update %d: %d files rescanned, %d unused resources' % (
+                    getReadableTime(), updateCount, rescanCount, unusedCount))
+                print 'update %d: %d files rescanned, %d unused resources' % (updateCount, rescanCount, unusedCount)
+                lastFingerprint = fingerprint
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        addLog('watch stopped')
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if indexFile is not None:
+            saveScanIndex(scanIndex, indexFile)
+
+
+# Run git in the folder and return its output
+def runGit(folder, args):
+    return subprocess.check_output(['git'] + args, cwd=folder)
+
+
+# Get the key of a path, to compare the paths from git with the paths of the inventory
+def getPathKey(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+# Get the blob ids of all files of the revision, as {path key: blob id}
+def getRevisionBlobs(gitTop, revision):
+    revisionBlobs = {}
+    for item in runGit(gitTop, ['ls-tree', '-r', '-z', '--full-tree', revision]).split('\0'):
+        if item == '':
+            continue
+        (info, _, path) = item.partition('\t')
+        (_, objectType, blobId) = info.split(' ')
+        # submodules are commits, not blobs
+        if objectType == 'blob':
+            revisionBlobs[getPathKey(os.path.join(gitTop, path))] = blobId
+    return revisionBlobs
+
+
+# Get the files which are changed since the revision, including the uncommitted and the untracked files,
+# as a set of path keys
+def getChangedPaths(gitTop, revision):
+    changedPaths = set()
+    for args in (['diff', '--name-only', '--no-renames', '-z', revision, '--'],
+                 ['ls-files', '--others', '--exclude-standard', '-z']):
+        for path in runGit(gitTop, args).split('\0'):
+            if path != '':
+                changedPaths.add(getPathKey(os.path.join(gitTop, path)))
+    return changedPaths
+
+
+# Build the inventory of the project at the revision from the blobs of the revision.
+# The files which are not changed since the revision are the same files as in the head inventory,
+# the changed files are written from git to the temp folder, every one in its own numbered folder.
+def buildRevisionInventory(gitTop, headInventory, revisionBlobs, changedPaths, projectPaths, tempDir):
+    (resPathList, srcPathList, manifestPathList) = projectPaths
+    headEntries = {}
+    for entry in headInventory['res'] + headInventory['src'] + headInventory['manifest']:
+        headEntries[getPathKey(entry['path'])] = entry
+    roots = [(getPathKey(root), root, 'res') for root in resPathList]
+    roots.extend([(getPathKey(root), root, 'src') for root in srcPathList])
+    roots.extend([(getPathKey(manifestFile), os.path.dirname(manifestFile), 'manifest')
+                  for manifestFile in manifestPathList])
+    # a file in nested roots belongs to the innermost root, like in buildInventory()
+    roots.sort(key=lambda root: -len(root[0]))
+    inventory = {'res': [], 'src': [], 'manifest': [], 'symbols': newSymbolTable()}
+    writtenCount = 0
+    for (pathKey, blobId) in sorted(revisionBlobs.items()):
+        for (rootKey, root, kind) in roots:
+            if kind == 'manifest':
+                if pathKey != rootKey:
+                    continue
+                relPath = os.path.basename(pathKey)
+            elif pathKey.startswith(rootKey + os.path.sep):
+                relPath = pathKey[len(rootKey) + 1:]
+            else:
+                continue
+            headEntry = headEntries.get(pathKey)
+            if headEntry is not None and pathKey not in changedPaths:
+                (filePath, size, mtime) = (headEntry['path'], headEntry['size'], headEntry['mtime'])
+            else:
+                filePath = os.path.join(tempDir, str(writtenCount), os.path.basename(pathKey))
+                writtenCount += 1
+                os.makedirs(os.path.dirname(filePath))
+                fp = open(filePath, 'wb')
+                fp.write(runGit(gitTop, ['cat-file', 'blob', blobId]))
+                fp.close()
+                fileStat = os.stat(filePath)
+                (size, mtime) = (fileStat.st_size, fileStat.st_mtime)
+            entry = {'path': filePath, 'root': root, 'relPath': relPath, 'fileName': os.path.basename(pathKey),
+                     'size': size, 'mtime': mtime, 'blob': blobId}
+            if kind == 'res':
+                classifyResEntry(entry)
+            inventory[kind].append(entry)
+            break
+    return inventory
+
+
+# Get the names of the declared resources of the inventory, as a set of names for every type
+def getDeclaredNames(inventory):
+    declared = {}
+    for entry in inventory['res']:
+        for (resType, itemName, _, _) in entry.get('declarations', ()):
+            declared.setdefault(getMergedResType(resType), set()).add(itemName)
+        if entry['isResFile'] and entry['isValid'] and entry['folderType'] in FileTypes:
+            declared.setdefault(entry['folderType'], set()).add(entry['name'])
+    return declared
+
+
+# Get the status of a resource, used, unused or undeclared
+def getResStatus(declaredNames, unusedNames, resType, name):
+    if name in unusedNames.get(resType, ()):
+        return 'unused'
+    if name in declaredNames.get(resType, ()):
+        return 'used'
+    return 'undeclared'
+
+
+# Check which resources have become used or unused since the git revision, only the files changed since the
+# revision are scanned. The scan results of the other files are taken from the blob cache, which keeps the
+# scan results of every file content by its git blob id, so it stays valid for any revision.
+# Nothing is removed. Return the number of resources which are unused now but were not unused at the revision.
+def checkSinceRevision(configParser, revision):
+    projectDir = configParser.get('Dir', 'ProjectDir')
+    isDeepSearch = getConfigOption(configParser, 'AndroidClean', 'DeepSearch', 'true').lower() == 'true'
+    workers = getWorkerCount(configParser)
+    readers = getReaderCount(configParser)
+    projectPaths = getProjectPaths(projectDir, isWorkspaceProject(configParser))
+    gitTop = runGit(projectDir, ['rev-parse', '--show-toplevel']).strip()
+    revisionBlobs = getRevisionBlobs(gitTop, revision)
+    changedPaths = getChangedPaths(gitTop, revision)
+    addLog('Project dir: ' + projectDir)
+    addLog('changes since %s: %d files' % (revision, len(changedPaths)))
+
+    headInventory = buildInventory(*projectPaths)
+    for entry in headInventory['res'] + headInventory['src'] + headInventory['manifest']:
+        pathKey = getPathKey(entry['path'])
+        if pathKey not in changedPaths and pathKey in revisionBlobs:
+            entry['blob'] = revisionBlobs[pathKey]
+    tempDir = tempfile.mkdtemp(prefix='AndroidResCleaner')
+    try:
+        revisionInventory = buildRevisionInventory(gitTop, headInventory, revisionBlobs, changedPaths, projectPaths,
+                                                   tempDir)
+        # The blob cache is a scan index whose files are the blob ids
+        blobCacheFile = getScanIndexFile(getConfigOption(configParser, 'Index', 'CacheDir', ''), projectDir) + '.blobs'
+        blobCache = loadScanIndex(blobCacheFile, getScanIndexSignature(), False)
+        # Fill a scan index with the cached results, the files with cached results are not scanned
+        scanIndex = loadScanIndex(None, getScanIndexSignature(), False)
+        blobEntries = []
+        for inventory in (headInventory, revisionInventory):
+            for entry in inventory['res'] + inventory['src'] + inventory['manifest']:
+                if 'blob' not in entry:
+                    continue
+                blobEntries.append(entry)
+                cached = blobCache['files'].get(entry['blob'])
+                if cached is not None:
+                    indexEntry = dict(cached)
+                    indexEntry.update({'size': entry['size'], 'mtime': entry['mtime']})
+                    scanIndex['files'][entry['path']] = indexEntry
+
+        results = []
+        for inventory in (headInventory, revisionInventory):
+            (unusedValueResDict, unusedFileResDict) = findUnusedRes(inventory, workers, scanIndex, isDeepSearch,
+                                                                    readers, isDemandDriven(configParser))
+            unusedNames = getTypedNames(inventory['symbols'], (unusedValueResDict, unusedFileResDict))
+            results.append((getDeclaredNames(inventory), unusedNames))
+        addLog('scanned: %d files' % len(scanIndex['changed']))
+
+        # Keep the results of the blobs of this run in the blob cache, the other blobs are evicted
+        for entry in blobEntries:
+            blobCache['seen'].add(entry['blob'])
+            if entry['blob'] not in blobCache['files']:
+                indexEntry = scanIndex['files'].get(entry['path'], {})
+                blobCache['files'][entry['blob']] = dict([(field, indexEntry[field])
+                                                          for field in ('declared', 'used') if field in indexEntry])
+                blobCache['changed'].add(entry['blob'])
+        saveScanIndex(blobCache, blobCacheFile)
+    finally:
+        shutil.rmtree(tempDir)
+
+    ((headDeclared, headUnused), (revisionDeclared, revisionUnused)) = results
+    newUnusedCount = 0
+    for resType in AllTypes:
+        names = set()
+        for typedNames in (headDeclared, headUnused, revisionDeclared, revisionUnused):
+            names.update(typedNames.get(resType, ()))
+        for name in sorted(names):
+            headStatus = getResStatus(headDeclared, headUnused, resType, name)
+            revisionStatus = getResStatus(revisionDeclared, revisionUnused, resType, name)
+            # The removed resources don't matter
+            if headStatus == revisionStatus or headStatus == 'undeclared':
+                continue
+            if headStatus == 'unused':
+                newUnusedCount += 1
+            addLog('%s %s: %s -> %s' % (resType, name, revisionStatus, headStatus))
+            addReport('statusChanged', type=resType, name=name, revision=revisionStatus, head=headStatus)
+    addLog('%d resources have become unused since %s' % (newUnusedCount, revision))
+    return newUnusedCount
+
+
+# The version of the shard format. Increase it when the content of a shard changes.
+ShardVersion = 2
+# The keys of an inventory entry kept in a shard, and the keys kept for the files in the resource folders
+ShardEntryKeys = ('path', 'root', 'relPath', 'fileName', 'size', 'mtime')
+ShardResEntryKeys = ('name', 'ext', 'folder', 'folderType', 'qualifier', 'isResFile', 'isValid')
+
+
+# Check whether a file is in the shards: the files which are scanned, and the files of the file resources
+def isShardEntry(kind, entry):
+    if kind == 'res':
+        return entry['fileName'].endswith('.xml') or (entry['isResFile'] and entry['folderType'] in FileTypes)
+    if kind == 'src':
+        return entry['fileName'].endswith('.java')
+    return True
+
+
+# Get the path of a file in a shard, relative to the project dir with '/' separators,
+# so the shards scanned from different checkouts of the project can be merged
+def getShardPath(projectDir, fileFullPath):
+    return os.path.relpath(fileFullPath, projectDir).replace(os.path.sep, '/')
+
+
+# Get the full path of a file in a shard, in the checkout of the project which merges the shards
+def getShardFullPath(projectDir, shardPath):
+    if shardPath == '.':
+        return projectDir
+    return os.path.join(projectDir, shardPath.replace('/', os.path.sep))
+
+
+# Get the shard number of a file, the hash of its path relative to the project dir modulo the shard count,
+# so the project is split the same way wherever it is checked out
+def getShardNumber(projectDir, fileFullPath, shardCount):
+    return int(hashlib.sha1(getShardPath(projectDir, fileFullPath)).hexdigest()[:8], 16) % shardCount
+
+
+# Get the files of a slice of the inventory, as a list of (kind, order, entry), where order is the position of the
+# file among the files of its kind in the whole inventory. The slice is 'INDEX/COUNT', the files whose shard number
+# is INDEX, or '@LISTFILE', the files listed in LISTFILE, one path relative to the project dir on every line.
+def getSliceEntries(inventory, projectDir, shardSlice):
+    listedKeys = None
+    if shardSlice.startswith('@'):
+        fp = open(shardSlice[1:], 'r')
+        try:
+            listedKeys = set([getPathKey(os.path.join(projectDir, line.strip())) for line in fp if line.strip() != ''])
+        finally:
+            fp.close()
+    else:
+        (shardIndex, _, shardCount) = shardSlice.partition('/')
+        if not shardIndex.isdigit() or not shardCount.isdigit() or int(shardIndex) >= int(shardCount):
+            raise RuntimeError('invalid shard slice: %s, it should be INDEX/COUNT or @LISTFILE' % shardSlice)
+        (shardIndex, shardCount) = (int(shardIndex), int(shardCount))
+    sliceEntries = []
+    for kind in ('res', 'src', 'manifest'):
+        for (order, entry) in enumerate([entry for entry in inventory[kind] if isShardEntry(kind, entry)]):
+            if listedKeys is not None:
+                isInSlice = getPathKey(entry['path']) in listedKeys
+            else:
+                isInSlice = getShardNumber(projectDir, entry['path'], shardCount) == shardIndex
+            if isInSlice:
+                sliceEntries.append((kind, order, entry))
+    return sliceEntries
+
+
+# Save a shard
+def saveShard(shard, shardFile):
+    fp = open(shardFile, 'w')
+    try:
+        fp.write(json.dumps(shard, separators=(',', ':'), sort_keys=True))
+    finally:
+        fp.close()
+
+
+# Load a shard saved by scanShard() or mergeShardFiles()
+def loadShard(shardFile):
+    fp = open(shardFile, 'r')
+    try:
+        shard = json.load(fp)
+    finally:
+        fp.close()
+    if shard.get('version') != ShardVersion or shard.get('signature') != getScanIndexSignature():
+        raise RuntimeError('%s is not a shard of this version of AndroidResCleaner, scan it again' % shardFile)
+    return shard
+
+
+# Scan a slice of the project, see getSliceEntries(), and save its partial index to the shard file.
+# The shard keeps the inventory entries and the scan results of the files in the slice, like a scan index, and the
+# hash of the files which may be removed. The paths are relative to the project dir. Nothing is removed.
+def scanShard(configParser, shardSlice, shardFile):
+    projectDir = configParser.get('Dir', 'ProjectDir')
+    workers = getWorkerCount(configParser)
+    readers = getReaderCount(configParser)
+    projectPaths = getProjectPaths(projectDir, isWorkspaceProject(configParser))
+    addLog('Project dir: ' + projectDir)
+    beginPhase('inventory')
+    fullInventory = buildInventory(*projectPaths)
+    fileCount = sum([len([entry for entry in fullInventory[kind] if isShardEntry(kind, entry)])
+                     for kind in ('res', 'src', 'manifest')])
+    sliceEntries = getSliceEntries(fullInventory, projectDir, shardSlice)
+    inventory = {'res': [], 'src': [], 'manifest': [], 'symbols': newSymbolTable()}
+    for (kind, _, entry) in sliceEntries:
+        inventory[kind].append(entry)
+    endPhase()
+    # The scan results are collected by an empty scan index
+    scanIndex = loadScanIndex(None, getScanIndexSignature(), False)
+    beginPhase('declarations')
+    getConfiguredValueRes(inventory, ValueTypes, workers, scanIndex, readers)
+    endPhase()
+    beginPhase('usage')
+    getUsedRes(inventory, AllTypes, workers, scanIndex, False, readers)
+    endPhase()
+    files = {}
+    for (kind, order, entry) in sliceEntries:
+        shardEntry = dict([(key, entry[key]) for key in ShardEntryKeys])
+        if kind == 'res':
+            shardEntry.update([(key, entry[key]) for key in ShardResEntryKeys])
+            if entry.get('declarations') or (entry['isResFile'] and entry['folderType'] in FileTypes):
+                shardEntry['hash'] = getFileHash(entry['path'])
+        indexEntry = scanIndex['files'].get(entry['path'], {})
+        shardEntry.update([(field, indexEntry[field]) for field in ('declared', 'used') if field in indexEntry])
+        shardEntry.update({'kind': kind, 'order': order, 'path': getShardPath(projectDir, entry['path']),
+                           'root': getShardPath(projectDir, entry['root'])})
+        files[shardEntry['path']] = shardEntry
+    shard = {'version': ShardVersion, 'signature': getScanIndexSignature(), 'fileCount': fileCount,
+             'slices': [shardSlice], 'files': files}
+    saveShard(shard, shardFile)
+    addLog('shard %s: %d of %d files, saved to %s' % (shardSlice, len(files), fileCount, shardFile))
+
+
+# Merge shards into one shard. A file in several shards is the same file, so the files are a union,
+# and the merged shard is the same whatever the order and the grouping of the shards.
+def mergeShards(shards):
+    merged = {'version': ShardVersion, 'signature': getScanIndexSignature(), 'fileCount': shards[0]['fileCount'],
+              'slices': [], 'files': {}}
+    for shard in shards:
+        if shard['fileCount'] != merged['fileCount']:
+            raise RuntimeError('the shards are not scanned from the same project')
+        merged['slices'] = sorted(set(merged['slices']) | set(shard['slices']))
+        merged['files'].update(shard['files'])
+    return merged
+
+
+# Find the unused resources of a shard which has all files of the project, like a run on the whole project,
+# and save the removal plan. The files are not read, the results come from the shard like from a scan index.
+# The paths of the shard are resolved against the project dir of the config, the checkout which merges the shards.
+def processShard(configParser, shard):
+    projectDir = configParser.get('Dir', 'ProjectDir')
+    if len(shard['files']) != shard['fileCount']:
+        raise RuntimeError('the shards only have %d of the %d files of %s' % (
+            len(shard['files']), shard['fileCount'], projectDir))
+    isDeepSearch = getConfigOption(configParser, 'AndroidClean', 'DeepSearch', 'true').lower() == 'true'
+    addLog('Project dir: ' + projectDir)
+    addReport('project', projectDir=projectDir, shards=shard['slices'], deepSearch=isDeepSearch, remove=False)
+    inventory = {'res': [], 'src': [], 'manifest': [], 'symbols': newSymbolTable()}
+    scanIndex = loadScanIndex(None, getScanIndexSignature(), False)
+    # The files are in the order of the inventory, so the symbols get the same ids as in a run on the whole project
+    for shardEntry in sorted(shard['files'].values(), key=lambda shardEntry: shardEntry['order']):
+        entry = loadPlanEntry(shardEntry)
+        entry['path'] = getShardFullPath(projectDir, entry['path'])
+        entry['root'] = getShardFullPath(projectDir, entry['root'])
+        inventory[entry['kind']].append(entry)
+        scanIndex['files'][entry['path']] = dict([(field, entry[field])
+                                                  for field in ('size', 'mtime', 'declared', 'used') if field in entry])
+    (unusedValueResDict, unusedFileResDict) = findUnusedRes(inventory, 1, scanIndex, isDeepSearch, 0,
+                                                            isDemandDriven(configParser))
+    addUnusedResults(configParser, inventory, unusedValueResDict, unusedFileResDict, projectDir, False)
+
+
+# Merge the shard files. The merged shard is saved to the output file if it is set, it can be merged again.
+# Otherwise the shards must have all files of the project, their unused resources are found and the plan is saved.
+def mergeShardFiles(configParser, shardFiles, outputFile):
+    shard = mergeShards([loadShard(shardFile) for shardFile in shardFiles])
+    addLog('merged %d shards: %s, %d of %d files' % (
+        len(shardFiles), ' '.join(shard['slices']), len(shard['files']), shard['fileCount']))
+    if outputFile:
+        saveShard(shard, outputFile)
+        addLog('merged shard saved to ' + outputFile)
+    else:
+        processShard(configParser, shard)
+
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description='Find and remove the unused resources of an Android project')
+    argParser.add_argument('--watch', action='store_true',
+                           help='watch the project and keep the unused resources up to date, nothing is removed')
+    argParser.add_argument('--since', metavar='REVISION',
+                           help='only report the resources which have become used or unused since the git revision, '
+                                'nothing is removed')
+    argParser.add_argument('--apply', metavar='PLAN', nargs='?', const='',
+                           help='remove the resources in a plan saved by an earlier run without scanning the project, '
+                                'the plan file in config.ini if it is not given')
+    argParser.add_argument('--restore', metavar='SNAPSHOT', nargs='?', const='',
+                           help='put back the files of a backup snapshot, the latest snapshot if it is not given')
+    argParser.add_argument('--shard', metavar='SLICE',
+                           help='only scan a slice of the files, INDEX/COUNT or @LISTFILE, and save the results to a '
+                                'shard file, nothing is removed')
+    argParser.add_argument('--merge', metavar='SHARD', nargs='+',
+                           help='merge the shard files into the unused resources and the removal plan, '
+                                'or into one shard file if --output is given')
+    argParser.add_argument('--output', metavar='FILE',
+                           help='the shard file of --shard and --merge, '
+                                'the shard file in config.ini if it is not given')
+    argParser.add_argument('--recover', metavar='DIRECTION', nargs='?', const='forward', choices=('forward', 'back'),
+                           help='finish the write-back of an interrupted run, or undo it with "back"')
+    cmdArgs = argParser.parse_args()
+    resetMetrics()
+    mainConfigParser = getConfigParser()
+    openLog('AndroidResCleaner.log')
+    profiler = None
+    exitCode = 0
+    try:
+        # start clean process
+        addLog('------------------------------ ' + getReadableTime() + ' ------------------------------')
+        if mainConfigParser is not None:
+            reportFile = getConfigOption(mainConfigParser, 'Report', 'File', '')
+            if reportFile != '':
+                openReport(reportFile)
+        addReport('run', time=getReadableTime())
+        profiler = startProfiler(mainConfigParser)
+        if cmdArgs.watch:
+            if mainConfigParser is not None:
+                watchProject(mainConfigParser)
+        elif cmdArgs.since is not None:
+            # fail the build if a change has left unused resources
+            if mainConfigParser is not None and checkSinceRevision(mainConfigParser, cmdArgs.since) != 0:
+                exitCode = 1
+        elif cmdArgs.apply is not None:
+            if mainConfigParser is not None:
+                applyPlan(mainConfigParser, cmdArgs.apply or getConfigOption(mainConfigParser, 'Plan', 'File', ''))
+        elif cmdArgs.restore is not None:
+            if mainConfigParser is not None:
+                restoreProject(mainConfigParser, cmdArgs.restore)
+        elif cmdArgs.recover is not None:
+            if mainConfigParser is not None:
+                stagingDir = getStagingDir(mainConfigParser, mainConfigParser.get('Dir', 'ProjectDir'))
+                if not recoverWriteBack(stagingDir, cmdArgs.recover == 'back'):
+                    addLog('no interrupted write-back found in ' + stagingDir)
+        elif cmdArgs.shard is not None:
+            if mainConfigParser is not None:
+                shardFile = getConfigOption(mainConfigParser, 'Shard', 'File', 'AndroidResCleaner.shard.json')
+                scanShard(mainConfigParser, cmdArgs.shard, cmdArgs.output or shardFile)
+        elif cmdArgs.merge is not None:
+            if mainConfigParser is not None:
+                mergeShardFiles(mainConfigParser, cmdArgs.merge, cmdArgs.output)
+        else:
+            process()
     except Exception, e:
         # append the exception message to log
-        logContent.append(e.message)
+        addLog(e.message)
+        addReport('error', message=e.message)
+        # the check of a CI build must not pass if it has failed
+        if cmdArgs.since is not None:
+            exitCode = 2
     finally:
-        # save log to file
-        saveToLog()
+        # end the phase interrupted by an exception
+        endPhase()
+        if profiler is not None:
+            stopProfiler(profiler, getConfigOption(mainConfigParser, 'Performance', 'ProfileFile', ''))
+        addMetricsToLog()
+        if mainConfigParser is not None:
+            metricsFile = getConfigOption(mainConfigParser, 'Performance', 'MetricsFile', '')
+            if metricsFile != '':
+                saveMetrics(metricsFile)
+        closeOutputs()
         print 'done'
+    sys.exit(exitCode)
@@ -0,0 +1,765 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import codecs
+import hashlib
+import ConfigParser
+import shutil
+import tempfile
+import unittest
+
+import ResCleaner
+
+
+# Write a file of the test project
+def writeFile(fileFullPath, content):
+    folder = os.path.dirname(fileFullPath)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    fp = open(fileFullPath, 'wb')
+    fp.write(content)
+    fp.close()
+
+
+# Read a file of the test project
+def readFile(fileFullPath):
+    fp = open(fileFullPath, 'rb')
+    content = fp.read()
+    fp.close()
+    return content
+
+
+# Get an inventory entry of a file in the res folder of the test project, like buildInventory()
+def getResEntry(resDir, relPath, **fields):
+    fileFullPath = os.path.join(resDir, relPath)
+    entry = {'path': fileFullPath, 'root': resDir, 'relPath': relPath, 'fileName': os.path.basename(relPath),
+             'folder': os.path.dirname(relPath), 'size': os.path.getsize(fileFullPath)}
+    entry.update(fields)
+    return entry
+
+
+# Get a config like config.ini, options is {(section, option): value}
+def getConfig(projectDir, options=None):
+    configParser = ConfigParser.ConfigParser()
+    configParser.optionxform = str
+    for ((section, option), value) in [(('Dir', 'ProjectDir'), projectDir), (('AndroidClean', 'RemoveUnused'), 'false'),
+                                       (('AndroidClean', 'Backup'), 'false')] + (options or {}).items():
+        if not configParser.has_section(section):
+            configParser.add_section(section)
+        configParser.set(section, option, value)
+    return configParser
+
+
+# Run process() with the config, return the lines of the log
+def runProcess(configParser):
+    getConfigParser = ResCleaner.getConfigParser
+    ResCleaner.getConfigParser = lambda: configParser
+    (logFd, logFile) = tempfile.mkstemp()
+    os.close(logFd)
+    try:
+        ResCleaner.openLog(logFile)
+        ResCleaner.process()
+    finally:
+        ResCleaner.closeOutputs()
+        ResCleaner.getConfigParser = getConfigParser
+    logLines = readFile(logFile).splitlines()
+    os.remove(logFile)
+    return logLines
+
+
+# Write an Eclipse project, a drawable and a string are used by the java file, the others are unused
+def writeProject(projectDir):
+    writeFile(os.path.join(projectDir, 'AndroidManifest.xml'), '<manifest/>\n')
+    writeFile(os.path.join(projectDir, 'res/values/strings.xml'),
+              '<resources>\n    <string name="used">U</string>\n    <string name="unused">N</string>\n</resources>\n')
+    writeFile(os.path.join(projectDir, 'res/drawable/used.png'), 'PNG')
+    writeFile(os.path.join(projectDir, 'res/drawable/unused.png'), 'PNG')
+    writeFile(os.path.join(projectDir, 'src/a/A.java'),
+              'class A {\n    int a = NewR.string.used;\n    int b = NewR.drawable.used;\n}\n')
+
+
+# Remove the declarations of the names from a values file, with the byte ranges found by parseValueDeclarations()
+def removeNames(content, names):
+    ranges = [(start, end) for (_, itemName, start, end) in
+              ResCleaner.parseValueDeclarations(None, ResCleaner.ValueTypes, content) if itemName in names]
+    return ResCleaner.removeByteRanges(content, ranges)
+
+
+class TestCaseWithProject(unittest.TestCase):
+
+    def setUp(self):
+        self.projectDir = tempfile.mkdtemp()
+        self.resDir = os.path.join(self.projectDir, 'res')
+        self.stagingDir = os.path.join(self.projectDir, '.AndroidResCleaner.staging')
+        ResCleaner.resetMetrics()
+
+    def tearDown(self):
+        ResCleaner.writeBackState['dir'] = None
+        shutil.rmtree(self.projectDir)
+
+
+class WriteBackTest(TestCaseWithProject):
+
+    def setUp(self):
+        TestCaseWithProject.setUp(self)
+        self.originals = {'values/a.xml': '<resources>\n    <string name="a">A</string>\n</resources>\n',
+                          'values/b.xml': '<resources>\n    <color name="b">#fff</color>\n</resources>\n',
+                          'drawable/c.png': 'PNG'}
+        for (relPath, content) in self.originals.items():
+            writeFile(os.path.join(self.resDir, relPath), content)
+        self.changed = {'values/a.xml': '<resources>\n</resources>\n', 'values/b.xml': '<resources/>\n'}
+        self.replaceWithTempFile = ResCleaner.replaceWithTempFile
+
+    def tearDown(self):
+        ResCleaner.replaceWithTempFile = self.replaceWithTempFile
+        TestCaseWithProject.tearDown(self)
+
+    # Stage the changes of the test project: both values files are rewritten and the drawable is removed
+    def stageChanges(self):
+        ResCleaner.openWriteBack(self.stagingDir)
+        for relPath in sorted(self.changed):
+            stagedFile = ResCleaner.getStagedFile()
+            writeFile(stagedFile, self.changed[relPath])
+            ResCleaner.stageWriteOp(getResEntry(self.resDir, relPath), 'replace', stagedFile)
+        ResCleaner.stageWriteOp(getResEntry(self.resDir, 'drawable/c.png'), 'remove')
+
+    # Commit the staged changes, the second file replaced by the write-back crashes it
+    def crashCommit(self):
+        calls = []
+
+        def crashingReplace(tempFile, fileFullPath):
+            calls.append(fileFullPath)
+            if len(calls) == 2:
+                raise RuntimeError('simulated crash')
+            self.replaceWithTempFile(tempFile, fileFullPath)
+
+        ResCleaner.replaceWithTempFile = crashingReplace
+        self.assertRaises(RuntimeError, ResCleaner.commitWriteBack)
+        ResCleaner.closeWriteBack()
+        ResCleaner.replaceWithTempFile = self.replaceWithTempFile
+        # the first file is replaced, the others are not changed yet
+        self.assertEqual(readFile(os.path.join(self.resDir, 'values/a.xml')), self.changed['values/a.xml'])
+        self.assertEqual(readFile(os.path.join(self.resDir, 'values/b.xml')), self.originals['values/b.xml'])
+        self.assertTrue(os.path.isfile(os.path.join(self.resDir, 'drawable/c.png')))
+        self.assertTrue(os.path.isdir(self.stagingDir))
+
+    def assertOriginals(self):
+        for (relPath, content) in self.originals.items():
+            self.assertEqual(readFile(os.path.join(self.resDir, relPath)), content)
+
+    def testCommit(self):
+        self.stageChanges()
+        ResCleaner.commitWriteBack()
+        ResCleaner.closeWriteBack()
+        for (relPath, content) in self.changed.items():
+            self.assertEqual(readFile(os.path.join(self.resDir, relPath)), content)
+        self.assertFalse(os.path.exists(os.path.join(self.resDir, 'drawable/c.png')))
+        self.assertFalse(os.path.exists(self.stagingDir))
+
+    def testCrashThenRollForward(self):
+        self.stageChanges()
+        self.crashCommit()
+        self.assertTrue(ResCleaner.recoverWriteBack(self.stagingDir))
+        for (relPath, content) in self.changed.items():
+            self.assertEqual(readFile(os.path.join(self.resDir, relPath)), content)
+        self.assertFalse(os.path.exists(os.path.join(self.resDir, 'drawable/c.png')))
+        self.assertFalse(os.path.exists(self.stagingDir))
+
+    def testCrashThenRollBack(self):
+        self.stageChanges()
+        self.crashCommit()
+        self.assertTrue(ResCleaner.recoverWriteBack(self.stagingDir, True))
+        self.assertOriginals()
+        self.assertFalse(os.path.exists(self.stagingDir))
+
+    def testCrashBeforeJournal(self):
+        self.stageChanges()
+        # the write-back is interrupted while staging, nothing has been changed and the staged files are dropped
+        ResCleaner.writeBackState['dir'] = None
+        self.assertFalse(ResCleaner.recoverWriteBack(self.stagingDir))
+        self.assertOriginals()
+        self.assertFalse(os.path.exists(self.stagingDir))
+
+    def testStagingDirInUse(self):
+        self.stageChanges()
+        self.crashCommit()
+        self.assertRaises(RuntimeError, ResCleaner.openWriteBack, self.stagingDir)
+
+    def testUnrelatedFolderLeftAlone(self):
+        keepFile = os.path.join(self.stagingDir, 'keep.txt')
+        writeFile(keepFile, 'keep')
+        self.assertFalse(ResCleaner.recoverWriteBack(self.stagingDir))
+        self.assertFalse(ResCleaner.recoverWriteBack(self.stagingDir, True))
+        self.assertRaises(RuntimeError, ResCleaner.openWriteBack, self.stagingDir)
+        self.assertEqual(os.listdir(self.stagingDir), ['keep.txt'])
+
+    def testStagingDirOption(self):
+        writeFile(os.path.join(self.projectDir, 'AndroidManifest.xml'), '<manifest/>\n')
+        os.makedirs(os.path.join(self.projectDir, 'src'))
+        parentDir = os.path.join(self.projectDir, 'shared')
+        writeFile(os.path.join(parentDir, 'keep.txt'), 'keep')
+        configParser = getConfig(self.projectDir, {('WriteBack', 'StagingDir'): parentDir})
+        self.assertEqual(ResCleaner.getStagingDir(configParser, self.projectDir),
+                         os.path.join(parentDir, ResCleaner.StagingFolderName))
+        for isRemove in ('false', 'true'):
+            configParser.set('AndroidClean', 'RemoveUnused', isRemove)
+            runProcess(configParser)
+            self.assertEqual(os.listdir(parentDir), ['keep.txt'])
+        # the drawable is unused, the values files only declare unused resources
+        self.assertEqual(sorted(os.listdir(self.resDir)), ['drawable', 'values'])
+        self.assertEqual(os.listdir(os.path.join(self.resDir, 'drawable')), [])
+
+    def testDryRunLeavesInterruptedWriteBack(self):
+        writeFile(os.path.join(self.projectDir, 'AndroidManifest.xml'), '<manifest/>\n')
+        os.makedirs(os.path.join(self.projectDir, 'src'))
+        self.stageChanges()
+        self.crashCommit()
+        runProcess(getConfig(self.projectDir))
+        self.assertTrue(os.path.isdir(self.stagingDir))
+        self.assertEqual(readFile(os.path.join(self.resDir, 'values/b.xml')), self.originals['values/b.xml'])
+        self.assertTrue(ResCleaner.recoverWriteBack(self.stagingDir, True))
+        self.assertOriginals()
+
+
+class StalePlanTest(TestCaseWithProject):
+
+    def setUp(self):
+        TestCaseWithProject.setUp(self)
+        self.content = '<resources>\n    <string name="a">A</string>\n    <string name="b">B</string>\n</resources>\n'
+        writeFile(os.path.join(self.resDir, 'values/strings.xml'), self.content)
+        writeFile(os.path.join(self.resDir, 'drawable/icon.png'), 'PNG')
+        ResCleaner.openWriteBack(self.stagingDir)
+
+    # Get the plan entry of the values file and its declaration of a
+    def getRemovedDeclaration(self):
+        entry = getResEntry(self.resDir, 'values/strings.xml', hash=hashlib.sha1(self.content).hexdigest())
+        (start, end) = [(start, end) for (_, itemName, start, end) in
+                        ResCleaner.parseValueDeclarations(entry['path'], ResCleaner.ValueTypes) if itemName == 'a'][0]
+        return (entry, [('string', 'a', start, end)])
+
+    def getRemovedFile(self):
+        entry = getResEntry(self.resDir, 'drawable/icon.png', name='icon', isValid=True,
+                            hash=hashlib.sha1('PNG').hexdigest())
+        return (entry, 'drawable')
+
+    def testDeclarationRemoved(self):
+        ResCleaner.removeDeclarations([self.getRemovedDeclaration()])
+        ResCleaner.commitWriteBack()
+        self.assertEqual(readFile(os.path.join(self.resDir, 'values/strings.xml')),
+                         '<resources>\n    <string name="b">B</string>\n</resources>\n')
+
+    def testChangedValuesFileSkipped(self):
+        removedFile = self.getRemovedDeclaration()
+        # the same size, so only the hash tells the file has changed
+        writeFile(removedFile[0]['path'], self.content.replace('"b">B', '"b">C'))
+        ResCleaner.removeDeclarations([removedFile])
+        self.assertEqual(ResCleaner.writeBackState['ops'], [])
+
+    def testResizedValuesFileSkipped(self):
+        removedFile = self.getRemovedDeclaration()
+        writeFile(removedFile[0]['path'], self.content.replace('"b">B', '"b">Bb'))
+        ResCleaner.removeDeclarations([removedFile])
+        self.assertEqual(ResCleaner.writeBackState['ops'], [])
+
+    def testFileRemoved(self):
+        ResCleaner.removeResFiles([self.getRemovedFile()])
+        ResCleaner.commitWriteBack()
+        self.assertFalse(os.path.exists(os.path.join(self.resDir, 'drawable/icon.png')))
+
+    def testChangedFileSkipped(self):
+        removedFile = self.getRemovedFile()
+        writeFile(removedFile[0]['path'], 'GIF')
+        ResCleaner.removeResFiles([removedFile])
+        self.assertEqual(ResCleaner.writeBackState['ops'], [])
+
+    def testMissingFileSkipped(self):
+        removedFile = self.getRemovedFile()
+        os.remove(removedFile[0]['path'])
+        ResCleaner.removeResFiles([removedFile])
+        self.assertEqual(ResCleaner.writeBackState['ops'], [])
+
+
+class PlanFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.projectDir = tempfile.mkdtemp()
+        writeProject(self.projectDir)
+        self.planFile = os.path.join(self.projectDir, 'plan.json')
+        ResCleaner.resetMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.projectDir)
+
+    def testPlanOnlySavedByDryRun(self):
+        configParser = getConfig(self.projectDir, {('Plan', 'File'): self.planFile})
+        runProcess(configParser)
+        self.assertTrue(os.path.isfile(self.planFile))
+        os.remove(self.planFile)
+        configParser.set('AndroidClean', 'RemoveUnused', 'true')
+        runProcess(configParser)
+        self.assertFalse(os.path.exists(self.planFile))
+        self.assertFalse(os.path.exists(os.path.join(self.projectDir, 'res/drawable/unused.png')))
+
+
+class RemoveByteRangesTest(unittest.TestCase):
+
+    def testWholeLines(self):
+        content = '<resources>\r\n    <string name="a">A</string>\r\n' \
+                  '    <string name="b">B</string>\r\n</resources>\r\n'
+        self.assertEqual(removeNames(content, ['a']),
+                         '<resources>\r\n    <string name="b">B</string>\r\n</resources>\r\n')
+
+    def testSameLineAsOtherElement(self):
+        content = '<resources>\n    <string name="a">A</string> <string name="b">B</string>\n</resources>\n'
+        # the space between the elements is kept, only whole lines are removed with their whitespace
+        self.assertEqual(removeNames(content, ['a']),
+                         '<resources>\n     <string name="b">B</string>\n</resources>\n')
+        self.assertEqual(removeNames(content, ['b']), '<resources>\n    <string name="a">A</string> \n</resources>\n')
+        self.assertEqual(removeNames(content, ['a', 'b']), '<resources>\n</resources>\n')
+
+    def testSameLineAsOtherElementWithText(self):
+        content = '<resources>\n    <string name="a">A</string><!-- a --><string name="b">B</string>\n</resources>\n'
+        self.assertEqual(removeNames(content, ['b']),
+                         '<resources>\n    <string name="a">A</string><!-- a -->\n</resources>\n')
+
+    def testSameLineAsResourcesEnd(self):
+        content = '<resources>\n    <string name="a">A</string>\n    <string name="b">B</string></resources>\n'
+        self.assertEqual(removeNames(content, ['b']),
+                         '<resources>\n    <string name="a">A</string>\n    </resources>\n')
+        self.assertEqual(removeNames(content, ['a', 'b']), '<resources>\n    </resources>\n')
+
+    def testSameLineAsResources(self):
+        content = '<resources><string name="a">A</string><string name="b">B</string></resources>'
+        self.assertEqual(removeNames(content, ['a']), '<resources><string name="b">B</string></resources>')
+        self.assertEqual(removeNames(content, ['a', 'b']), '<resources></resources>')
+
+    def testUtf16(self):
+        text = u'<?xml version="1.0" encoding="utf-16"?>\r\n<resources>\r\n    <string name="a">ä\U0001f600</string>' \
+               u'\r\n    <string name="b">B</string> <string name="c">C</string></resources>\r\n'
+        expected = u'<?xml version="1.0" encoding="utf-16"?>\r\n<resources>\r\n    </resources>\r\n'
+        for (bom, encoding) in ((codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')):
+            content = bom + text.encode(encoding)
+            self.assertEqual(removeNames(content, ['a', 'b', 'c']), bom + expected.encode(encoding))
+            self.assertEqual(removeNames(content, ['b']), bom + text.replace(u'<string name="b">B</string>', u'')
+                             .encode(encoding))
+
+    def testUtf16FileRewritten(self):
+        text = u'<resources>\r\n    <string name="a">A</string>\r\n    <string name="b">B</string>\r\n</resources>\r\n'
+        projectDir = tempfile.mkdtemp()
+        try:
+            for (bom, encoding) in ((codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')):
+                resDir = os.path.join(projectDir, encoding)
+                writeFile(os.path.join(resDir, 'values/strings.xml'), bom + text.encode(encoding))
+                entry = getResEntry(resDir, 'values/strings.xml')
+                removedItems = [(resType, itemName, start, end) for (resType, itemName, start, end) in
+                                ResCleaner.parseValueDeclarations(entry['path'], ResCleaner.ValueTypes)
+                                if itemName == 'a']
+                ResCleaner.openWriteBack(os.path.join(projectDir, 'staging'))
+                try:
+                    ResCleaner.removeDeclarations([(entry, removedItems)])
+                    ResCleaner.commitWriteBack()
+                finally:
+                    ResCleaner.closeWriteBack()
+                self.assertEqual(readFile(entry['path']),
+                                 bom + text.replace(u'    <string name="a">A</string>\r\n', u'').encode(encoding))
+        finally:
+            shutil.rmtree(projectDir)
+
+    def testUtf16TagMarks(self):
+        content = codecs.BOM_UTF16_LE + u'<resources/>'.encode('utf-16-le')
+        self.assertEqual(ResCleaner.getTagMarks(content), ('<\x00', '>\x00'))
+        content = codecs.BOM_UTF16_BE + u'<resources/>'.encode('utf-16-be')
+        self.assertEqual(ResCleaner.getTagMarks(content), ('\x00<', '\x00>'))
+        self.assertEqual(ResCleaner.getTagMarks('<resources/>'), ('<', '>'))
+
+
+# Find the unused resources of the project, as {type: sorted names}
+def getUnusedNames(projectDir, isDeepSearch):
+    inventory = ResCleaner.buildInventory(*ResCleaner.getProjectPaths(projectDir))
+    unusedNames = {}
+    for unusedDict in ResCleaner.findUnusedRes(inventory, 1, None, isDeepSearch):
+        for (resType, idSet) in unusedDict.items():
+            if len(idSet) != 0:
+                unusedNames[resType] = sorted([ResCleaner.getSymbolName(inventory['symbols'], symbolId)
+                                               for symbolId in idSet])
+    return unusedNames
+
+
+# Write an Eclipse project with chains of references, see ReferenceGraphTest
+def writeReferenceProject(projectDir):
+    writeFile(os.path.join(projectDir, 'AndroidManifest.xml'),
+              '<manifest>\n    <application android:icon="@drawable/launcher"/>\n</manifest>\n')
+    writeFile(os.path.join(projectDir, 'src/a/A.java'), 'class A {\n    int a = NewR.layout.main;\n}\n')
+    # main is used by the java file, orphan is not used by anything
+    writeFile(os.path.join(projectDir, 'res/layout/main.xml'),
+              '<LinearLayout android:background="@drawable/icon">\n'
+              '    <TextView android:text="@string/title" android:textColor="@color/text"/>\n'
+              '</LinearLayout>\n')
+    writeFile(os.path.join(projectDir, 'res/layout/orphan.xml'),
+              '<LinearLayout android:background="@drawable/orphan_icon">\n'
+              '    <TextView android:textSize="@dimen/orphan_size"/>\n'
+              '</LinearLayout>\n')
+    for name in ('launcher', 'icon', 'orphan_icon'):
+        writeFile(os.path.join(projectDir, 'res/drawable/%s.png' % name), 'PNG')
+    # text is used through the layout, shade only by the unused style, loop_a and loop_b only by each other
+    writeFile(os.path.join(projectDir, 'res/values/values.xml'),
+              '<resources>\n'
+              '    <string name="title">Title</string>\n'
+              '    <string name="loop_a">@string/loop_b</string>\n'
+              '    <string name="loop_b">@string/loop_a</string>\n'
+              '    <color name="text">@color/base</color>\n'
+              '    <color name="base">#000</color>\n'
+              '    <color name="shade">#111</color>\n'
+              '    <dimen name="orphan_size">1dp</dimen>\n'
+              '    <style name="Unused">\n'
+              '        <item name="android:textColor">@color/shade</item>\n'
+              '    </style>\n'
+              '</resources>\n')
+
+
+class ReferenceGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.projectDir = tempfile.mkdtemp()
+        ResCleaner.resetMetrics()
+        writeReferenceProject(self.projectDir)
+
+    def tearDown(self):
+        shutil.rmtree(self.projectDir)
+
+    def testDeepSearch(self):
+        # the resources which are only reachable from unused resources are unused, a cycle doesn't keep itself
+        self.assertEqual(getUnusedNames(self.projectDir, True),
+                         {'layout': ['orphan'], 'drawable': ['orphan_icon'], 'dimen': ['orphan_size'],
+                          'color': ['shade'], 'string': ['loop_a', 'loop_b'], 'style': ['Unused']})
+
+    def testReferencedResourcesUsed(self):
+        # without deep search every referenced resource is used, whoever references it
+        self.assertEqual(getUnusedNames(self.projectDir, False), {'layout': ['orphan'], 'style': ['Unused']})
+
+
+# Find the references in java code with the per-type regexes which were used before the lexer pattern
+def getOldJavaRefs(fileContent, resTypes):
+    resDic = {}
+    for resType in resTypes:
+        resUsedList = resDic[resType] = []
+        regex = re.compile(r'[(+,=.?:]\s*%s\.%s\.(\S+?)\s*[+),;:]' % (ResCleaner.RClassName, resType))
+        resUsedList.extend(regex.findall(fileContent))
+        regex = re.compile(r'\?\s*%s\.%s\.\S+\s*:\s*%s\.%s\.(\S+?)\s*[+),;:]' % (
+            ResCleaner.RClassName, resType, ResCleaner.RClassName, resType))
+        resUsedList.extend(regex.findall(fileContent))
+        for findItem in re.findall(r'new\s+int\s*\[\s*\]\s*\{(.+)\}', fileContent):
+            for arrayItem in findItem.split(','):
+                resUsedList.extend(re.findall(r'%s\.%s\.(\S+)' % (ResCleaner.RClassName, resType), arrayItem))
+    return ResCleaner.compactResDic(resDic)
+
+
+# Find the references in java code with the lexer pattern
+def getJavaRefs(fileContent, resTypes):
+    resDic = {resType: [] for resType in resTypes}
+    ResCleaner.scanJavaRefs(ResCleaner.compileRefPatterns(resTypes), fileContent, resDic)
+    return ResCleaner.compactResDic(resDic)
+
+
+class JavaLexerTest(unittest.TestCase):
+
+    def testSameAsOldRegexes(self):
+        fileContent = '''class A {
+    int a = NewR.layout.main;
+    int b = flag ? NewR.layout.with_image : NewR.layout.no_image;
+    int c = flag ? NewR.string.yes : NewR.color.no;
+    int[] d = new int[]{NewR.drawable.first, NewR.drawable.second };
+    void f() {
+        setText(NewR.string.title);
+        setSize(getDimen(NewR.dimen.size) + NewR.dimen.margin, NewR.integer.count);
+        String s = "" + getString(NewR.string.concat) + ":";
+        int e = x.y(NewR.style.Theme_Main);
+    }
+}
+'''
+        newRefs = getJavaRefs(fileContent, ResCleaner.AllTypes)
+        self.assertEqual(newRefs, getOldJavaRefs(fileContent, ResCleaner.AllTypes))
+        self.assertEqual(newRefs['layout'], ['main', 'no_image', 'with_image'])
+        self.assertEqual(newRefs['drawable'], ['first', 'second'])
+
+    def testDifferencesFromOldRegexes(self):
+        fileContent = '''class A {
+    // int a = NewR.layout.line_comment;
+    /* int b = NewR.layout.block_comment;
+       int c = NewR.layout.block_comment2; */
+    String d = "d=NewR.string.in_string;";
+    char e = ';';
+    String f = """
+        f = NewR.string.in_text_block;
+        """;
+    @Annotation(NewR.layout.annotated)
+    int g() {
+        return NewR.string.returned;
+    }
+    int[] h = new int[]{NewR.drawable.first, NewR.drawable.last};
+    int i = OtherNewR.layout.other_class;
+    int j = NewR . bool . spaced ;
+}
+'''
+        oldRefs = getOldJavaRefs(fileContent, ResCleaner.AllTypes)
+        # the old regexes found the references in comments and strings, missed the return statement and the spaces
+        # around the dots, and found a bogus name with the brace of the array initializer
+        self.assertEqual(oldRefs['layout'], ['annotated', 'block_comment', 'block_comment2', 'line_comment'])
+        self.assertEqual(oldRefs['string'], ['in_string', 'in_text_block'])
+        self.assertEqual(oldRefs['drawable'], ['first', 'last', 'last}'])
+        self.assertEqual(getJavaRefs(fileContent, ResCleaner.AllTypes),
+                         {'layout': ['annotated'], 'string': ['returned'], 'drawable': ['first', 'last'],
+                          'bool': ['spaced']})
+
+    def testPrefilter(self):
+        self.assertFalse(ResCleaner.scanJavaRefs(ResCleaner.compileRefPatterns(ResCleaner.AllTypes),
+                                                 'class A {\n    int a = R.layout.main;\n}\n', {}))
+
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.projectDir = os.path.join(self.tempDir, 'project')
+        writeReferenceProject(self.projectDir)
+        writeFile(os.path.join(self.projectDir, 'res/values-fr/values.xml'),
+                  '<resources>\n    <string name="title">Titre</string>\n    <string name="loop_a">A</string>\n'
+                  '</resources>\n')
+        # the shards are scanned from checkouts at other paths
+        self.checkouts = [os.path.join(self.tempDir, 'ci1/project'), os.path.join(self.tempDir, 'ci2/deep/checkout')]
+        for checkout in self.checkouts:
+            shutil.copytree(self.projectDir, checkout)
+        ResCleaner.resetMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    # Load a plan without its time
+    def loadPlan(self, planFile):
+        plan = json.loads(readFile(planFile))
+        del plan['time']
+        return plan
+
+    # Scan the slices, every one from its checkout, and return the shard files
+    def scanShards(self, slices):
+        shardFiles = []
+        for (index, shardSlice) in enumerate(slices):
+            shardFiles.append(os.path.join(self.tempDir, 'shard%d.json' % index))
+            ResCleaner.scanShard(getConfig(self.checkouts[index % 2]), shardSlice, shardFiles[-1])
+        return shardFiles
+
+    def testSameAsSerialRun(self):
+        serialPlan = os.path.join(self.tempDir, 'serial.json')
+        runProcess(getConfig(self.projectDir, {('Plan', 'File'): serialPlan}))
+        shardFiles = self.scanShards(['0/3', '1/3', '2/3'])
+        # the shards are merged in another order and grouping, the result is the same
+        for (groups, name) in (([[0, 1, 2]], 'flat'), ([[2, 0], [1]], 'grouped')):
+            mergedPlan = os.path.join(self.tempDir, name + '.json')
+            configParser = getConfig(self.projectDir, {('Plan', 'File'): mergedPlan})
+            groupFiles = []
+            for group in groups:
+                groupFiles.append(os.path.join(self.tempDir, '%s%d.json' % (name, len(groupFiles))))
+                ResCleaner.mergeShardFiles(configParser, [shardFiles[index] for index in group], groupFiles[-1])
+            ResCleaner.mergeShardFiles(configParser, groupFiles, None)
+            self.assertEqual(self.loadPlan(mergedPlan), self.loadPlan(serialPlan))
+        plan = self.loadPlan(serialPlan)
+        self.assertEqual(sorted([planEntry['relPath'] for planEntry in plan['resFiles']]),
+                         [os.path.join('drawable', 'orphan_icon.png'), os.path.join('layout', 'orphan.xml')])
+
+    def testListedSlices(self):
+        listFile = os.path.join(self.tempDir, 'list.txt')
+        writeFile(listFile, 'res/values/values.xml\nsrc/a/A.java\n')
+        shardFiles = self.scanShards(['@' + listFile, '0/1'])
+        shard = ResCleaner.mergeShards([ResCleaner.loadShard(shardFile) for shardFile in shardFiles])
+        self.assertEqual(ResCleaner.loadShard(shardFiles[1])['files'], shard['files'])
+        self.assertEqual(sorted(ResCleaner.loadShard(shardFiles[0])['files'].keys()),
+                         ['res/values/values.xml', 'src/a/A.java'])
+
+    def testMissingShard(self):
+        shardFiles = self.scanShards(['0/2'])
+        self.assertRaises(RuntimeError, ResCleaner.mergeShardFiles, getConfig(self.projectDir), shardFiles, None)
+
+
+class WorkspaceModulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workspaceDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workspaceDir)
+
+    # Get the module folders relative to the workspace
+    def getModules(self):
+        return [os.path.relpath(moduleDir, self.workspaceDir).replace(os.path.sep, '/')
+                for moduleDir in ResCleaner.getWorkspaceModules(self.workspaceDir)]
+
+    def testIncludes(self):
+        writeFile(os.path.join(self.workspaceDir, 'settings.gradle'),
+                  "rootProject.name = 'demo'\n"
+                  "include ':app', ':libs:core'\n"
+                  "include 'feature'  // the feature module\n"
+                  "// include ':old'\n"
+                  "include ':moved', ':linked'\n"
+                  "project(':moved').projectDir = new File('modules/moved')\n"
+                  "project(':linked').projectDir = new File(rootDir, '../shared/linked')\n")
+        self.assertEqual(self.getModules(), ['.', 'app', 'libs/core', 'feature', 'modules/moved', '../shared/linked'])
+
+    def testMultiLineIncludes(self):
+        writeFile(os.path.join(self.workspaceDir, 'settings.gradle'),
+                  "include ':app',\n"
+                  "        ':lib'\n"
+                  "include ':last'\n")
+        self.assertEqual(self.getModules(), ['.', 'app', 'lib', 'last'])
+
+    def testKotlinScript(self):
+        writeFile(os.path.join(self.workspaceDir, 'settings.gradle.kts'),
+                  'include(":app")\n'
+                  'include(\n'
+                  '    ":lib",\n'
+                  '    ":feature:home"\n'
+                  ')\n'
+                  'project(":lib").projectDir = file("libraries/lib")\n')
+        self.assertEqual(self.getModules(), ['.', 'app', 'libraries/lib', 'feature/home'])
+
+    def testNoSettings(self):
+        writeFile(os.path.join(self.workspaceDir, 'app/build.gradle'), '')
+        writeFile(os.path.join(self.workspaceDir, 'libs/old/AndroidManifest.xml'), '<manifest/>\n')
+        writeFile(os.path.join(self.workspaceDir, 'modules/lib/AndroidManifest.xml'), '<manifest/>\n')
+        writeFile(os.path.join(self.workspaceDir, 'app/build/generated/build.gradle'), '')
+        self.assertEqual(self.getModules(), ['.', 'app', 'modules/lib'])
+
+
+class InventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.projectDir = tempfile.mkdtemp()
+        writeProject(self.projectDir)
+        ResCleaner.resetMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.projectDir)
+
+    def testInventoryMetrics(self):
+        ResCleaner.beginPhase('inventory')
+        inventory = ResCleaner.buildInventory(*ResCleaner.getProjectPaths(self.projectDir))
+        ResCleaner.endPhase()
+        phase = ResCleaner.runMetrics['phases'][0]
+        entries = inventory['res'] + inventory['src'] + inventory['manifest']
+        self.assertEqual(phase['files'], 5)
+        self.assertEqual(phase['bytes'], sum([os.path.getsize(entry['path']) for entry in entries]))
+        # the files are listed, not read
+        self.assertEqual(ResCleaner.runMetrics['roots'], {})
+
+    @unittest.skipIf(not hasattr(os, 'symlink'), 'no symlinks')
+    def testDanglingSymlinkSkipped(self):
+        drawableDir = os.path.join(self.projectDir, 'res/drawable')
+        os.symlink(os.path.join(self.projectDir, 'gone.png'), os.path.join(drawableDir, 'gone.png'))
+        self.assertEqual(sorted([entry[0] for entry in ResCleaner.listFolderEntries(drawableDir)]),
+                         ['unused.png', 'used.png'])
+        logLines = runProcess(getConfig(self.projectDir))
+        self.assertTrue('skip %s, it cannot be read: No such file or directory' % os.path.join(drawableDir, 'gone.png')
+                        in logLines)
+        self.assertTrue('  unused' in logLines)
+
+
+class ScanIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        ResCleaner.resetMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    # Get the line of the scan index in the log
+    def getIndexLine(self, logLines):
+        return [line for line in logLines if line.startswith('scan index:')][0]
+
+    # Write a file and get its inventory entry
+    def writeEntry(self, name, content):
+        fileFullPath = os.path.join(self.tempDir, name)
+        writeFile(fileFullPath, content)
+        fileStat = os.stat(fileFullPath)
+        return {'path': fileFullPath, 'size': fileStat.st_size, 'mtime': fileStat.st_mtime}
+
+    # Save the index and load it again, like the next run
+    def reloadIndex(self, scanIndex, signature='types', useHash=False):
+        indexFile = os.path.join(self.tempDir, 'scan.index')
+        ResCleaner.saveScanIndex(scanIndex, indexFile)
+        return ResCleaner.loadScanIndex(indexFile, signature, useHash)
+
+    # Look up the entry and save a result for it if it is not in the index, like a scan
+    def scanEntry(self, scanIndex, entry, result):
+        cached = ResCleaner.lookupScanIndex(scanIndex, entry, 'used')
+        if cached is None:
+            ResCleaner.updateScanIndex(scanIndex, entry['path'], 'used', result)
+        return cached
+
+    def testUnchangedFile(self):
+        entry = self.writeEntry('a.xml', '<a/>')
+        scanIndex = ResCleaner.loadScanIndex(None, 'types', False)
+        self.assertEqual(self.scanEntry(scanIndex, entry, ['a']), None)
+        scanIndex = self.reloadIndex(scanIndex)
+        self.assertEqual(self.scanEntry(scanIndex, entry, ['b']), ['a'])
+        self.assertEqual(scanIndex['changed'], set())
+
+    def testChangedFile(self):
+        entry = self.writeEntry('a.xml', '<a/>')
+        scanIndex = ResCleaner.loadScanIndex(None, 'types', False)
+        self.scanEntry(scanIndex, entry, ['a'])
+        scanIndex = self.reloadIndex(scanIndex)
+        for changedEntry in (dict(entry, size=entry['size'] + 1), dict(entry, mtime=entry['mtime'] + 1)):
+            self.assertEqual(self.scanEntry(scanIndex, changedEntry, ['b']), None)
+            self.assertEqual(scanIndex['changed'], set([entry['path']]))
+            self.assertEqual(self.scanEntry(scanIndex, changedEntry, ['c']), ['b'])
+
+    def testTouchedFileWithContentHash(self):
+        entry = self.writeEntry('a.xml', '<a/>')
+        scanIndex = ResCleaner.loadScanIndex(None, 'types', True)
+        self.scanEntry(scanIndex, entry, ['a'])
+        scanIndex = self.reloadIndex(scanIndex, useHash=True)
+        # a checkout changes the mtime, the content is the same
+        self.assertEqual(self.scanEntry(scanIndex, dict(entry, mtime=entry['mtime'] + 1), ['b']), ['a'])
+        entry = self.writeEntry('a.xml', '<b/>')
+        self.assertEqual(self.scanEntry(scanIndex, dict(entry, mtime=entry['mtime'] + 2), ['c']), None)
+
+    def testOtherSignature(self):
+        entry = self.writeEntry('a.xml', '<a/>')
+        scanIndex = ResCleaner.loadScanIndex(None, 'types', False)
+        self.scanEntry(scanIndex, entry, ['a'])
+        scanIndex = self.reloadIndex(scanIndex, 'other types')
+        self.assertEqual(scanIndex['files'], {})
+        self.assertEqual(self.scanEntry(scanIndex, entry, ['b']), None)
+
+    def testDeletedFileEvicted(self):
+        (entryA, entryB) = (self.writeEntry('a.xml', '<a/>'), self.writeEntry('b.xml', '<b/>'))
+        scanIndex = ResCleaner.loadScanIndex(None, 'types', False)
+        self.scanEntry(scanIndex, entryA, ['a'])
+        self.scanEntry(scanIndex, entryB, ['b'])
+        scanIndex = self.reloadIndex(scanIndex)
+        # b.xml is deleted, only a.xml is seen in this run
+        self.scanEntry(scanIndex, entryA, ['a'])
+        scanIndex = self.reloadIndex(scanIndex)
+        self.assertEqual(scanIndex['files'].keys(), [entryA['path']])
+
+    def testUnchangedIndexNotSaved(self):
+        entry = self.writeEntry('a.xml', '<a/>')
+        scanIndex = ResCleaner.loadScanIndex(None, 'types', False)
+        self.scanEntry(scanIndex, entry, ['a'])
+        scanIndex = self.reloadIndex(scanIndex)
+        self.scanEntry(scanIndex, entry, ['a'])
+        self.assertFalse(ResCleaner.evictScanIndex(scanIndex))
+
+    def testNonAsciiProjectDir(self):
+        projectDir = os.path.join(self.tempDir, '项目')
+        writeProject(projectDir)
+        configParser = getConfig(projectDir, {('Index', 'Enabled'): 'true', ('Index', 'CacheDir'): self.tempDir})
+        self.assertEqual(self.getIndexLine(runProcess(configParser)), 'scan index: 3 files, 3 rescanned')
+        self.assertEqual(self.getIndexLine(runProcess(configParser)), 'scan index: 3 files, 0 rescanned')
+
+
+if __name__ == '__main__':
+    unittest.main()